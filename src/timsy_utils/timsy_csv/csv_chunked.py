@@ -0,0 +1,199 @@
+""" Byte-range chunking of CSV files at record boundaries, and the chunked parallel quote rewriter """
+import csv
+import io
+import locale
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+DEFAULT_CHUNK_SIZE = 64 * 2 ** 20
+_SCAN_BLOCK = 8 * 2 ** 20
+_WRITE_BUFFER = 4 * 2 ** 20
+
+
+def _count_quotes(csvfile, start: int, end: int, quote: bytes) -> int:
+    csvfile.seek(start)
+    count = 0
+    while start < end:
+        block = csvfile.read(min(_SCAN_BLOCK, end - start))
+        if not block:
+            break
+        count += block.count(quote)
+        start += len(block)
+    return count
+
+
+def _next_record_start(csvfile, position: int, quotes: int, quote: bytes) -> Tuple[Optional[int], int]:
+    """
+    First offset after position that starts a record: just past a newline with an even number of quotes
+    before it (quotes is the count before position). Escaped quotes are doubled, so they keep the parity.
+    Returns (offset or None at end of file, quotes before offset).
+    """
+    csvfile.seek(position)
+    while True:
+        block = csvfile.read(_SCAN_BLOCK)
+        if not block:
+            return None, quotes
+        index = 0
+        while True:
+            newline = block.find(b'\n', index)
+            if newline < 0:
+                quotes += block.count(quote, index)
+                break
+            quotes += block.count(quote, index, newline)
+            if quotes % 2 == 0:
+                return position + newline + 1, quotes
+            index = newline + 1
+        position += len(block)
+
+
+def count_records(input_file_path: str, quotechar: str = '"') -> int:
+    """
+    Number of records (header included) without parsing fields: newlines are counted only outside quotes,
+    tracking quote parity across blocks. A last record without a trailing newline still counts.
+    """
+    quote = quotechar.encode()
+    records, in_quotes, last = 0, False, b''
+    with open(input_file_path, 'rb') as csvfile:
+        while True:
+            block = csvfile.read(_SCAN_BLOCK)
+            if not block:
+                break
+            if quote not in block and not in_quotes:
+                records += block.count(b'\n')
+            else:
+                # Even pieces of the split lie outside quotes when the block starts outside them.
+                pieces = block.split(quote)
+                start = 1 if in_quotes else 0
+                records += sum(piece.count(b'\n') for piece in pieces[start::2])
+                in_quotes = (len(pieces) - 1 + in_quotes) % 2 == 1
+            last = block[-1:]
+    return records + (1 if last and last != b'\n' else 0)
+
+
+def header_end(input_file_path: str, quotechar: str = '"') -> int:
+    """ Byte offset just past the first (header) record. """
+    with open(input_file_path, 'rb') as csvfile:
+        end, _ = _next_record_start(csvfile, 0, 0, quotechar.encode())
+    return os.path.getsize(input_file_path) if end is None else end
+
+
+def record_boundaries(input_file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, start: int = 0,
+                      quotechar: str = '"') -> List[int]:
+    """
+    Offsets splitting the file from start (a record start) to its end into byte ranges of about chunk_size
+    that each hold whole records, so newlines inside quoted fields never split a record.
+    Consecutive pairs are the (start, end) ranges.
+    """
+    quote = quotechar.encode()
+    size = os.path.getsize(input_file_path)
+    boundaries = [start]
+    with open(input_file_path, 'rb') as csvfile:
+        position, quotes = start, 0
+        while boundaries[-1] + chunk_size < size:
+            target = boundaries[-1] + chunk_size
+            quotes += _count_quotes(csvfile, position, target, quote)
+            boundary, quotes = _next_record_start(csvfile, target, quotes, quote)
+            if boundary is None or boundary >= size:
+                break
+            boundaries.append(boundary)
+            position = boundary
+    boundaries.append(size)
+    return boundaries
+
+
+@dataclass
+class QuoteProgress:
+    bytes_done: int
+    total_bytes: int
+    rows: int
+    chunks_done: int
+    chunks: int
+    seconds: float
+
+    @property
+    def fraction(self) -> float:
+        return self.bytes_done / self.total_bytes if self.total_bytes else 1.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes_done / 2 ** 20 / self.seconds if self.seconds else 0.0
+
+
+def _quote_range(input_file_path: str, start: int, end: int, part_path: str, encoding: str,
+                 delimiter: str, quotechar: str) -> Tuple[int, int]:
+    """ Rewrite the records in [start, end) with every field quoted. Returns (rows, bytes read). """
+    with open(input_file_path, 'rb') as csvfile:
+        csvfile.seek(start)
+        data = csvfile.read(end - start)
+    reader = csv.reader(io.StringIO(data.decode(encoding), newline=''), delimiter=delimiter, quotechar=quotechar)
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=delimiter, quotechar=quotechar, quoting=csv.QUOTE_ALL)
+    rows = 0
+    for row in reader:
+        writer.writerow(row)
+        rows += 1
+    with open(part_path, 'w', newline='', encoding=encoding, buffering=_WRITE_BUFFER) as part:
+        part.write(output.getvalue())
+    return rows, len(data)
+
+
+def quote_csv_chunked(input_file_path: str, output_file_path: str, processes: Optional[int] = None,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE, encoding: Optional[str] = None, delimiter: str = ',',
+                      quotechar: str = '"', progress: Optional[Callable[[QuoteProgress], None]] = None,
+                      temp_dir: Optional[str] = None) -> QuoteProgress:
+    """
+    Parallel csv_add_quotes: the body is split into byte ranges at record boundaries, each range is quoted
+    in a process pool into a temporary part file, and the parts are appended to the output in order after
+    the unquoted header. progress is called after the header and each finished chunk.
+    The encoding must be ASCII compatible (UTF-8, cp1252, ...) so ranges can split on newline bytes.
+    """
+    encoding = encoding or locale.getpreferredencoding(False)
+    start_time = time.perf_counter()
+    total_bytes = os.path.getsize(input_file_path)
+    body_start = header_end(input_file_path, quotechar)
+    boundaries = record_boundaries(input_file_path, chunk_size, body_start, quotechar)
+    ranges = [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+    with open(input_file_path, 'rb') as csvfile:
+        header_bytes = csvfile.read(body_start)
+    status = QuoteProgress(len(header_bytes), total_bytes, 0, 0, len(ranges), 0.0)
+
+    def report() -> None:
+        status.seconds = time.perf_counter() - start_time
+        if progress is not None:
+            progress(status)
+
+    output_dir = os.path.dirname(os.path.abspath(output_file_path))
+    with tempfile.TemporaryDirectory(prefix='csv_quote_', dir=temp_dir or output_dir) as part_dir:
+        with open(output_file_path, 'w+', newline='', encoding=encoding) as quoted_csv:
+            header = next(csv.reader(io.StringIO(header_bytes.decode(encoding), newline=''),
+                                     delimiter=delimiter, quotechar=quotechar), None)
+            if header is not None:
+                csv.writer(quoted_csv, delimiter=delimiter, quotechar=quotechar,
+                           quoting=csv.QUOTE_NONE).writerow(header)
+        report()
+
+        part_paths = [os.path.join(part_dir, f'part{index:05d}.csv') for index in range(len(ranges))]
+        with ProcessPoolExecutor(max_workers=processes or os.cpu_count() or 1) as executor:
+            futures = [executor.submit(_quote_range, input_file_path, start, end, part_path, encoding,
+                                       delimiter, quotechar)
+                       for (start, end), part_path in zip(ranges, part_paths)]
+            for future in as_completed(futures):
+                rows, bytes_read = future.result()
+                status.rows += rows
+                status.bytes_done += bytes_read
+                status.chunks_done += 1
+                report()
+
+        with open(output_file_path, 'ab') as quoted_csv:
+            for part_path in part_paths:
+                with open(part_path, 'rb') as part:
+                    shutil.copyfileobj(part, quoted_csv, _WRITE_BUFFER)
+                os.remove(part_path)
+    report()
+    return status
@@ -0,0 +1,293 @@
+""" Keyed diff of two CSV files for the CSV Comparison App """
+import csv
+import math
+import os
+import pickle
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .csv_reader import DEFAULT_BATCH_SIZE, CsvBatchReader
+
+DEFAULT_MEMORY_BUDGET = 512 * 2 ** 20
+# Bytes on disk to bytes as Python tuples of str, roughly; used to size partitions up front.
+_OBJECT_OVERHEAD = 4
+_MAX_PARTITIONS = 4096
+
+LEFT, RIGHT = 0, 1
+
+
+@dataclass
+class RowChange:
+    key: Tuple
+    # Column name -> (left value, right value) for every column that differs.
+    changes: Dict[str, Tuple[Optional[str], Optional[str]]]
+
+
+@dataclass
+class CsvDiffResult:
+    key_columns: List[str]
+    compare_columns: List[str]
+    added: List[Tuple] = field(default_factory=list)
+    removed: List[Tuple] = field(default_factory=list)
+    changed: List[RowChange] = field(default_factory=list)
+    unchanged: int = 0
+    column_changes: Counter = field(default_factory=Counter)
+    duplicate_keys: List[int] = field(default_factory=lambda: [0, 0])
+    left_only_columns: List[str] = field(default_factory=list)
+    right_only_columns: List[str] = field(default_factory=list)
+    partitions: int = 0
+    spilled: bool = False
+    processes: int = 1
+    seconds: float = 0.0
+
+    @property
+    def columns(self) -> List[str]:
+        """ Column order of the added and removed row tuples. """
+        return self.key_columns + self.compare_columns
+
+    @property
+    def has_differences(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def summary(self) -> str:
+        return (f'{len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed, '
+                f'{self.unchanged} unchanged in {self.seconds:.1f}s '
+                f'({self.partitions} partitions, {"spilled" if self.spilled else "in memory"}, '
+                f'{self.processes} process{"es" if self.processes > 1 else ""})')
+
+    def write_report(self, output_file_path: str) -> None:
+        """ One line per added/removed row and per changed column: status, key columns, column, left, right. """
+        n_keys = len(self.key_columns)
+        with open(output_file_path, 'w', newline='') as report:
+            writer = csv.writer(report, quoting=csv.QUOTE_ALL)
+            writer.writerow(['STATUS', *self.key_columns, 'COLUMN', 'LEFT', 'RIGHT'])
+            for row in self.removed:
+                writer.writerow(['REMOVED', *row[:n_keys], '', '', ''])
+            for row in self.added:
+                writer.writerow(['ADDED', *row[:n_keys], '', '', ''])
+            for change in self.changed:
+                for column, (left, right) in change.changes.items():
+                    writer.writerow(['CHANGED', *change.key, column, left, right])
+
+
+def _load_partition(rows: List[Tuple], path: Optional[str]) -> Iterator[Tuple]:
+    if path is not None and os.path.exists(path):
+        with open(path, 'rb') as spill:
+            while True:
+                try:
+                    yield from pickle.load(spill)
+                except EOFError:
+                    break
+    yield from rows
+
+
+def _diff_partition(left_rows: List[Tuple], left_path: Optional[str], right_rows: List[Tuple],
+                    right_path: Optional[str], n_keys: int):
+    """
+    Diff one partition: the left rows go in a dict by key and the right rows stream past it. On both sides
+    the first row of a key (in file order) is compared and later rows with that key are counted as duplicates.
+    Returns (added, removed, changed as (key, [(position, left, right)]), unchanged, duplicates).
+    """
+    single = n_keys == 1
+    left: Dict = {}
+    duplicates = [0, 0]
+    for row in _load_partition(left_rows, left_path):
+        key = row[0] if single else row[:n_keys]
+        if key in left:
+            duplicates[LEFT] += 1
+            continue
+        left[key] = row
+    added, changed, unchanged, seen = [], [], 0, set()
+    for row in _load_partition(right_rows, right_path):
+        key = row[0] if single else row[:n_keys]
+        if key in seen:
+            duplicates[RIGHT] += 1
+            continue
+        seen.add(key)
+        old = left.pop(key, None)
+        if old is None:
+            added.append(row)
+        elif old == row:
+            unchanged += 1
+        else:
+            changed.append((row[:n_keys], [(position, old[position], value) for position, value
+                                           in enumerate(row) if position >= n_keys and old[position] != value]))
+    return added, list(left.values()), changed, unchanged, duplicates
+
+
+def _diff_partition_files(left_path: str, right_path: str, n_keys: int):
+    return _diff_partition([], left_path, [], right_path, n_keys)
+
+
+class _PartitionStore:
+    """ Per side, per partition row buffers that are appended to pickle files once the memory budget is spent. """
+
+    def __init__(self, partitions: int, memory_budget: int, spill_dir: str):
+        self.partitions = partitions
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.buffers = [[[] for _ in range(partitions)] for _ in (LEFT, RIGHT)]
+        self.buffered_bytes = 0
+        self.spilled = False
+
+    def path(self, side: int, partition: int) -> str:
+        return os.path.join(self.spill_dir, f'{"lr"[side]}{partition:04d}.pkl')
+
+    def add(self, side: int, buckets: List[List[Tuple]], batch_bytes: int) -> None:
+        for buffer, bucket in zip(self.buffers[side], buckets):
+            buffer.extend(bucket)
+        self.buffered_bytes += batch_bytes
+        if self.buffered_bytes > self.memory_budget:
+            self.spill()
+
+    def spill(self) -> None:
+        for side, buffers in enumerate(self.buffers):
+            for partition, buffer in enumerate(buffers):
+                if buffer:
+                    with open(self.path(side, partition), 'ab') as spill:
+                        pickle.dump(buffer, spill, protocol=pickle.HIGHEST_PROTOCOL)
+                    buffers[partition] = []
+        self.buffered_bytes = 0
+        self.spilled = True
+
+
+def _row_bytes(rows: Sequence[Tuple]) -> float:
+    """ Average in-memory size of a row tuple from a sample of the batch. """
+    sample = rows[:100]
+    if not sample:
+        return 0.0
+    return sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in sample) / len(sample)
+
+
+class CsvDiff:
+    """
+    Keyed comparison of two CSV files. Both files are streamed in batches and hash partitioned by key, so one
+    partition of each side is in memory at a time during the compare; partitions are spilled to disk once
+    memory_budget bytes are buffered. Large inputs (over parallel_threshold bytes together) are compared
+    partition by partition in a process pool.
+    Columns are compared by name; columns in only one file are listed, not compared. On both sides only the
+    first row of a duplicated key is compared; the later ones are counted in duplicate_keys.
+    """
+
+    def __init__(self, key_columns: Union[str, Sequence[str]], compare_columns: Optional[Sequence[str]] = None,
+                 memory_budget: int = DEFAULT_MEMORY_BUDGET, processes: Optional[int] = None,
+                 parallel_threshold: int = 64 * 2 ** 20, partitions: Optional[int] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE, spill_dir: Optional[str] = None, **reader_kwargs):
+        self.key_columns = [key_columns] if isinstance(key_columns, str) else list(key_columns)
+        if not self.key_columns:
+            raise ValueError('At least one key column is required')
+        self.compare_columns = list(compare_columns) if compare_columns is not None else None
+        self.memory_budget = memory_budget
+        self.processes = processes
+        self.parallel_threshold = parallel_threshold
+        self.partitions = partitions
+        self.batch_size = batch_size
+        self.spill_dir = spill_dir
+        self.reader_kwargs = reader_kwargs
+
+    def _columns(self, left: CsvBatchReader, right: CsvBatchReader, result: CsvDiffResult) -> List[str]:
+        for reader in (left, right):
+            missing = [column for column in self.key_columns if column not in reader.fieldnames]
+            if missing:
+                raise KeyError(f'Key columns {missing} are not in the header of {reader.input_file_path}')
+        result.left_only_columns = [column for column in left.fieldnames if column not in right.fieldnames]
+        result.right_only_columns = [column for column in right.fieldnames if column not in left.fieldnames]
+        if self.compare_columns is not None:
+            return self.compare_columns
+        return [column for column in left.fieldnames
+                if column in right.fieldnames and column not in self.key_columns]
+
+    def _process_count(self, input_bytes: int) -> int:
+        if self.processes is not None:
+            return max(1, self.processes)
+        return max(1, os.cpu_count() or 1) if input_bytes > self.parallel_threshold else 1
+
+    def _partition_count(self, input_bytes: int, processes: int) -> int:
+        if self.partitions:
+            return self.partitions
+        # Enough partitions that one partition of both sides fits the budget, and a few per process.
+        needed = math.ceil(input_bytes * _OBJECT_OVERHEAD / self.memory_budget) * 2
+        return min(_MAX_PARTITIONS, max(16, needed, processes * 4))
+
+    def _partition(self, reader: CsvBatchReader, side: int, store: _PartitionStore) -> None:
+        """
+        Hash partition one file by key. This runs in the calling process for both sides, before any worker
+        starts (CSV parsing is not spread over the pool), and keeps file order within each partition.
+        """
+        n_keys, partitions = len(self.key_columns), store.partitions
+        row_bytes = None
+        for batch in reader.iter_tuples():
+            if row_bytes is None:
+                row_bytes = _row_bytes(batch)
+            buckets = [[] for _ in range(partitions)]
+            if n_keys == 1:
+                for row in batch:
+                    buckets[hash(row[0]) % partitions].append(row)
+            else:
+                for row in batch:
+                    buckets[hash(row[:n_keys]) % partitions].append(row)
+            store.add(side, buckets, int(row_bytes * len(batch)))
+
+    def compare(self, left_file_path: str, right_file_path: str) -> CsvDiffResult:
+        start = time.perf_counter()
+        left_header = CsvBatchReader(left_file_path, self.batch_size, **self.reader_kwargs)
+        right_header = CsvBatchReader(right_file_path, self.batch_size, **self.reader_kwargs)
+        result = CsvDiffResult(self.key_columns, [])
+        result.compare_columns = self._columns(left_header, right_header, result)
+        projection = self.key_columns + result.compare_columns
+        left = CsvBatchReader(left_file_path, self.batch_size, projection, **self.reader_kwargs)
+        right = CsvBatchReader(right_file_path, self.batch_size, projection, **self.reader_kwargs)
+
+        input_bytes = os.path.getsize(left_file_path) + os.path.getsize(right_file_path)
+        result.processes = self._process_count(input_bytes)
+        result.partitions = self._partition_count(input_bytes, result.processes)
+        n_keys = len(self.key_columns)
+        with tempfile.TemporaryDirectory(prefix='csv_diff_', dir=self.spill_dir) as spill_dir:
+            store = _PartitionStore(result.partitions, self.memory_budget, spill_dir)
+            self._partition(left, LEFT, store)
+            self._partition(right, RIGHT, store)
+            if result.processes > 1:
+                # Workers read their partitions from disk rather than receiving them pickled through a pipe.
+                store.spill()
+                with ProcessPoolExecutor(max_workers=result.processes) as executor:
+                    partials = executor.map(_diff_partition_files,
+                                            [store.path(LEFT, partition) for partition in range(store.partitions)],
+                                            [store.path(RIGHT, partition) for partition in range(store.partitions)],
+                                            [n_keys] * store.partitions)
+                    for partial in partials:
+                        self._merge(result, partial)
+            else:
+                for partition in range(store.partitions):
+                    left_rows, right_rows = store.buffers[LEFT][partition], store.buffers[RIGHT][partition]
+                    store.buffers[LEFT][partition] = store.buffers[RIGHT][partition] = []
+                    self._merge(result, _diff_partition(
+                        left_rows, store.path(LEFT, partition) if store.spilled else None,
+                        right_rows, store.path(RIGHT, partition) if store.spilled else None, n_keys))
+            result.spilled = store.spilled
+        result.seconds = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def _merge(result: CsvDiffResult, partial) -> None:
+        added, removed, changed, unchanged, duplicates = partial
+        result.added.extend(added)
+        result.removed.extend(removed)
+        columns = result.columns
+        for key, deltas in changed:
+            changes = {columns[position]: (old, new) for position, old, new in deltas}
+            result.column_changes.update(changes.keys())
+            result.changed.append(RowChange(key, changes))
+        result.unchanged += unchanged
+        result.duplicate_keys[LEFT] += duplicates[LEFT]
+        result.duplicate_keys[RIGHT] += duplicates[RIGHT]
+
+
+def diff_csv_files(left_file_path: str, right_file_path: str, key_columns: Union[str, Sequence[str]],
+                   **kwargs) -> CsvDiffResult:
+    """ Shortcut for CsvDiff(key_columns, **kwargs).compare(left_file_path, right_file_path). """
+    return CsvDiff(key_columns, **kwargs).compare(left_file_path, right_file_path)
@@ -0,0 +1,230 @@
+""" Sidecar row offset index for random access into large CSV files """
+import csv
+import io
+import mmap
+import os
+import struct
+from hashlib import blake2b
+from itertools import islice
+from typing import Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .csv_chunked import header_end
+from .csv_reader import CsvBatchReader
+
+INDEX_SUFFIX = '.idx'
+DEFAULT_STEP = 1000
+_SCAN_BLOCK = 4 * 2 ** 20
+_KEY_SEPARATOR = '\x1f'
+
+# File layout, little-endian:
+#   header | key columns (UTF-8, joined by \x1f) | checkpoint offsets uint64 (one per step rows)
+#   | bucket starts uint64 (n_buckets + 1) | entry hashes uint64 (n_keys) | entry offsets uint64 (n_keys)
+# Key entries are grouped by bucket (hash & (n_buckets - 1)), so a lookup reads one small bucket.
+_MAGIC = b'TCIX'
+_VERSION = 1
+_HEADER = struct.Struct('<4sIQqQQQQQI')
+
+
+def index_path_for(input_file_path: str) -> str:
+    return input_file_path + INDEX_SUFFIX
+
+
+def _key_hash(key: str) -> int:
+    return int.from_bytes(blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def record_offsets(input_file_path: str, start: int, quotechar: str = '"') -> np.ndarray:
+    """
+    Byte offset of every record from start (a record start) to the end of the file: the positions just past
+    newlines with an even number of quotes before them, found with vectorized scans of each block.
+    """
+    quote = ord(quotechar)
+    size = os.path.getsize(input_file_path)
+    offsets = [np.array([start], dtype=np.uint64)] if start < size else []
+    quotes = 0
+    with open(input_file_path, 'rb') as csvfile:
+        csvfile.seek(start)
+        position = start
+        while True:
+            block = csvfile.read(_SCAN_BLOCK)
+            if not block:
+                break
+            data = np.frombuffer(block, dtype=np.uint8)
+            quote_counts = np.cumsum(data == quote, dtype=np.int64)
+            newlines = np.flatnonzero(data == 10)
+            outside = (quotes + quote_counts[newlines]) % 2 == 0
+            offsets.append((newlines[outside] + (position + 1)).astype(np.uint64))
+            quotes += int(quote_counts[-1])
+            position += len(block)
+    if not offsets:
+        return np.zeros(0, dtype=np.uint64)
+    result = np.concatenate(offsets)
+    # A newline ending the file does not start another record.
+    return result[result < size]
+
+
+def build_csv_index(input_file_path: str, step: int = DEFAULT_STEP, key_columns: Union[str, Sequence[str], None] = None,
+                    index_path: Optional[str] = None, encoding: Optional[str] = None, delimiter: str = ',',
+                    quotechar: str = '"') -> str:
+    """
+    Write the offset index of input_file_path: the byte offset of every step-th data row and, with key_columns,
+    a hash of each row's key to its offset. Returns the index path (input path + '.idx' by default).
+    Records must end in \\n or \\r\\n.
+    """
+    if step < 1:
+        raise ValueError('step must be at least 1')
+    index_path = index_path or index_path_for(input_file_path)
+    key_columns = [key_columns] if isinstance(key_columns, str) else list(key_columns or [])
+    stat = os.stat(input_file_path)
+    offsets = record_offsets(input_file_path, header_end(input_file_path, quotechar), quotechar)
+    checkpoints = offsets[::step]
+
+    hashes = np.zeros(0, dtype=np.uint64)
+    key_offsets = np.zeros(0, dtype=np.uint64)
+    n_buckets = 0
+    if key_columns:
+        reader = CsvBatchReader(input_file_path, columns=key_columns, encoding=encoding, delimiter=delimiter,
+                                quotechar=quotechar)
+        hash_list = [_key_hash(_KEY_SEPARATOR.join(value or '' for value in row)) for row in reader.iter_rows()]
+        if len(hash_list) != len(offsets):
+            raise ValueError(f'Found {len(offsets)} record offsets but parsed {len(hash_list)} rows; '
+                             f'records of {input_file_path} must end in a newline')
+        n_buckets = 1 << max(len(hash_list) - 1, 1).bit_length()
+        hashes = np.array(hash_list, dtype=np.uint64)
+        buckets = hashes & np.uint64(n_buckets - 1)
+        order = np.argsort(buckets, kind='stable')
+        hashes, key_offsets = hashes[order], offsets[order]
+        bucket_starts = np.concatenate(([0], np.cumsum(np.bincount(buckets[order].astype(np.int64),
+                                                                   minlength=n_buckets)))).astype(np.uint64)
+    else:
+        bucket_starts = np.zeros(0, dtype=np.uint64)
+
+    encoded_keys = _KEY_SEPARATOR.join(key_columns).encode('utf-8')
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'wb') as index_file:
+        index_file.write(_HEADER.pack(_MAGIC, _VERSION, stat.st_size, stat.st_mtime_ns, step, len(offsets),
+                                      len(checkpoints), n_buckets, len(hashes), len(encoded_keys)))
+        index_file.write(encoded_keys)
+        for section in (checkpoints, bucket_starts, hashes, key_offsets):
+            index_file.write(section.astype('<u8').tobytes())
+    os.replace(temp_path, index_path)
+    return index_path
+
+
+class CsvOffsetIndex:
+    """
+    Random access into a CSV file through its memory-mapped offset index: row(n) and page() seek to the
+    nearest checkpoint and parse at most step - 1 records forward; find() hashes the key, reads one bucket
+    and verifies candidate rows. Row numbers count data rows from 0, header excluded.
+    """
+
+    def __init__(self, input_file_path: str, index_path: Optional[str] = None, encoding: Optional[str] = None,
+                 delimiter: str = ',', quotechar: str = '"'):
+        self.input_file_path = input_file_path
+        self.index_path = index_path or index_path_for(input_file_path)
+        self.encoding = encoding
+        self.delimiter = delimiter
+        self.quotechar = quotechar
+        with open(self.index_path, 'rb') as index_file:
+            self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.source_size, self.source_mtime_ns, self.step, self.rows, n_checkpoints, self._n_buckets,
+         n_keys, key_length) = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._mmap.close()
+            raise ValueError(f'{self.index_path} is not a version {_VERSION} CSV offset index')
+        position = _HEADER.size
+        keys = self._mmap[position:position + key_length].decode('utf-8')
+        self.key_columns = keys.split(_KEY_SEPARATOR) if keys else []
+        position += key_length
+        self._checkpoints = np.frombuffer(self._mmap, '<u8', n_checkpoints, position)
+        position += n_checkpoints * 8
+        self._bucket_starts = np.frombuffer(self._mmap, '<u8', self._n_buckets + 1 if self._n_buckets else 0,
+                                            position)
+        position += len(self._bucket_starts) * 8
+        self._hashes = np.frombuffer(self._mmap, '<u8', n_keys, position)
+        self._key_offsets = np.frombuffer(self._mmap, '<u8', n_keys, position + n_keys * 8)
+        self._source = open(self.input_file_path, 'rb')
+        self.fieldnames = self._records_at(0, 1)[0] if os.path.getsize(self.input_file_path) else []
+        self._key_positions = [self.fieldnames.index(column) for column in self.key_columns]
+
+    @classmethod
+    def open(cls, input_file_path: str, step: int = DEFAULT_STEP, key_columns: Union[str, Sequence[str], None] = None,
+             index_path: Optional[str] = None, **kwargs) -> 'CsvOffsetIndex':
+        """ Open the index, (re)building it first when it is missing or the CSV changed since it was built. """
+        index_path = index_path or index_path_for(input_file_path)
+        if os.path.exists(index_path):
+            index = cls(input_file_path, index_path, **kwargs)
+            wanted = [key_columns] if isinstance(key_columns, str) else list(key_columns or [])
+            if not index.stale and (not wanted or wanted == index.key_columns):
+                return index
+            index.close()
+        build_csv_index(input_file_path, step, key_columns, index_path, **kwargs)
+        return cls(input_file_path, index_path, **kwargs)
+
+    @property
+    def stale(self) -> bool:
+        stat = os.stat(self.input_file_path)
+        return stat.st_size != self.source_size or stat.st_mtime_ns != self.source_mtime_ns
+
+    def _records_at(self, offset: int, count: Optional[int] = None) -> Iterator[List[str]]:
+        self._source.seek(offset)
+        text = io.TextIOWrapper(self._source, encoding=self.encoding, newline='')
+        reader = csv.reader(text, delimiter=self.delimiter, quotechar=self.quotechar)
+        try:
+            return list(islice(reader, count))
+        finally:
+            text.detach()
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def page(self, start: int, count: int) -> List[List[str]]:
+        """ Up to count rows from row start. """
+        if start < 0:
+            start += self.rows
+        if not 0 <= start < self.rows or count <= 0:
+            return []
+        checkpoint = start // self.step
+        skip = start - checkpoint * self.step
+        rows = self._records_at(int(self._checkpoints[checkpoint]), skip + min(count, self.rows - start))
+        return rows[skip:]
+
+    def row(self, number: int) -> List[str]:
+        rows = self.page(number, 1)
+        if not rows:
+            raise IndexError(number)
+        return rows[0]
+
+    def iter_pages(self, page_size: int, start: int = 0) -> Iterator[List[List[str]]]:
+        for page_start in range(start, self.rows, page_size):
+            yield self.page(page_start, page_size)
+
+    def find(self, *key: str) -> List[List[str]]:
+        """ Every row whose key columns equal key (one value per key column). """
+        if not self.key_columns:
+            raise ValueError(f'{self.index_path} was built without key columns')
+        if len(key) != len(self.key_columns):
+            raise ValueError(f'Expected {len(self.key_columns)} key values, got {len(key)}')
+        key_hash = _key_hash(_KEY_SEPARATOR.join(key))
+        bucket = key_hash & (self._n_buckets - 1)
+        start, end = int(self._bucket_starts[bucket]), int(self._bucket_starts[bucket + 1])
+        matches = []
+        for position in np.flatnonzero(self._hashes[start:end] == np.uint64(key_hash)):
+            row = self._records_at(int(self._key_offsets[start + position]), 1)[0]
+            if all((row[column] if column < len(row) else '') == value
+                   for column, value in zip(self._key_positions, key)):
+                matches.append(row)
+        return matches
+
+    def close(self) -> None:
+        self._checkpoints = self._bucket_starts = self._hashes = self._key_offsets = None
+        self._mmap.close()
+        self._source.close()
+
+    def __enter__(self) -> 'CsvOffsetIndex':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -0,0 +1,138 @@
+""" Streaming, batched CSV reading for files too large to hold as lists of dicts """
+import csv
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+DEFAULT_BATCH_SIZE = 50_000
+
+ColumnSelection = Optional[Sequence[Union[str, int]]]
+
+
+class CsvBatchReader:
+    """
+    Read a CSV file in fixed-size batches of tuples, NumPy structured arrays or pandas DataFrames.
+    The header is read once and shared by every batch; columns projects (and orders) the columns by name
+    or position. Only one batch is held at a time, so memory does not grow with the file.
+    Every output mode reads a field missing from a short row as '' (a blank field) and drops the extra
+    fields of a long row; an empty file yields no batches.
+    """
+
+    def __init__(self, input_file_path: str, batch_size: int = DEFAULT_BATCH_SIZE, columns: ColumnSelection = None,
+                 encoding: Optional[str] = None, delimiter: str = ',', quotechar: str = '"'):
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+        self.input_file_path = input_file_path
+        self.batch_size = batch_size
+        self.encoding = encoding
+        self.delimiter = delimiter
+        self.quotechar = quotechar
+        self.fieldnames = self._read_header()
+        self.positions = self._resolve(columns)
+        self.columns = [self.fieldnames[position] for position in self.positions]
+
+    def _open(self):
+        return open(self.input_file_path, newline='', encoding=self.encoding)
+
+    def _reader(self, csvfile):
+        return csv.reader(csvfile, delimiter=self.delimiter, quotechar=self.quotechar)
+
+    def _read_header(self) -> List[str]:
+        with self._open() as csvfile:
+            return next(self._reader(csvfile), [])
+
+    def _resolve(self, columns: ColumnSelection) -> List[int]:
+        if columns is None:
+            return list(range(len(self.fieldnames)))
+        positions = []
+        for column in columns:
+            if isinstance(column, int):
+                if not 0 <= column < len(self.fieldnames):
+                    raise IndexError(f'Column position {column} is outside the {len(self.fieldnames)} column header')
+                positions.append(column)
+            elif column in self.fieldnames:
+                positions.append(self.fieldnames.index(column))
+            else:
+                raise KeyError(f'Column {column} is not in the header of {self.input_file_path}')
+        return positions
+
+    def _row_getter(self) -> Callable[[List[str]], Tuple]:
+        if self.positions == list(range(len(self.fieldnames))):
+            return tuple
+        if len(self.positions) == 1:
+            position = self.positions[0]
+            return lambda row: (row[position],)
+        return itemgetter(*self.positions)
+
+    def _fit(self, row: List[str]) -> List[str]:
+        width = len(self.fieldnames)
+        return row[:width] if len(row) > width else row + [''] * (width - len(row))
+
+    def iter_tuples(self) -> Iterator[List[Tuple]]:
+        """ Batches of at most batch_size row tuples (projected columns only). """
+        getter = self._row_getter()
+        width = len(self.fieldnames)
+        with self._open() as csvfile:
+            reader = self._reader(csvfile)
+            next(reader, None)
+            while True:
+                rows = list(islice(reader, self.batch_size))
+                if not rows:
+                    break
+                # Checking the widths is a cheap pass compared to parsing; ragged rows take the slow path.
+                if any(len(row) != width for row in rows):
+                    rows = [self._fit(row) for row in rows]
+                yield list(map(getter, rows))
+
+    def iter_rows(self) -> Iterator[Tuple]:
+        for batch in self.iter_tuples():
+            yield from batch
+
+    def structured_dtype(self, dtypes: Optional[Dict[str, Union[str, np.dtype]]] = None) -> np.dtype:
+        """ Structured dtype of the projected columns; columns missing from dtypes stay Python str objects. """
+        dtypes = dtypes or {}
+        return np.dtype([(name, dtypes.get(name, object)) for name in self.columns])
+
+    def iter_arrays(self, dtypes: Optional[Dict[str, Union[str, np.dtype]]] = None) -> Iterator[np.ndarray]:
+        """
+        Batches as NumPy structured arrays. dtypes maps column names to NumPy types ('i8', 'f8', 'U20',
+        'datetime64[D]', ...), which NumPy parses from the field strings; other columns are object arrays.
+        """
+        dtype = self.structured_dtype(dtypes)
+        for batch in self.iter_tuples():
+            yield np.array(batch, dtype=dtype)
+
+    def iter_dataframes(self, dtypes: Optional[Dict[str, str]] = None):
+        """
+        Batches as pandas DataFrames parsed by pandas' C reader. Values stay strings (blank fields are '')
+        unless dtypes says otherwise, matching what get_csv_data returns; in dtypes columns blanks are missing.
+        """
+        import pandas as pd
+        if not self.fieldnames:
+            return
+        dtypes = dtypes or {}
+        column_dtypes = {name: str for name in self.columns}
+        column_dtypes.update(dtypes)
+        # NA detection is only needed (and only paid for) when some column is parsed to another type.
+        na_values = {name: [''] for name in dtypes}
+        with pd.read_csv(self.input_file_path, sep=self.delimiter, quotechar=self.quotechar, encoding=self.encoding,
+                         usecols=self.positions, dtype=column_dtypes, keep_default_na=False, na_values=na_values,
+                         na_filter=bool(na_values), chunksize=self.batch_size) as chunks:
+            for chunk in chunks:
+                if len(chunk):
+                    yield chunk[self.columns]
+
+
+def iter_csv_batches(input_file_path: str, batch_size: int = DEFAULT_BATCH_SIZE, columns: ColumnSelection = None,
+                     output: str = 'tuples', **kwargs) -> Iterator:
+    """ Shortcut for CsvBatchReader: output is 'tuples', 'numpy' or 'pandas'. """
+    reader = CsvBatchReader(input_file_path, batch_size, columns, **kwargs)
+    if output == 'tuples':
+        return reader.iter_tuples()
+    if output == 'numpy':
+        return reader.iter_arrays()
+    if output == 'pandas':
+        return reader.iter_dataframes()
+    raise ValueError(f"Unknown output {output!r}, expected 'tuples', 'numpy' or 'pandas'")
@@ -0,0 +1,339 @@
+""" Typed CSV ingestion with schema inference cached per file name pattern """
+import fnmatch
+import json
+import os
+import re
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .csv_reader import DEFAULT_BATCH_SIZE, CsvBatchReader
+
+DEFAULT_SAMPLE_ROWS = 10_000
+_CACHE_VERSION = 1
+
+INT, FLOAT, BOOL, DATE, DATETIME, STR = 'int', 'float', 'bool', 'date', 'datetime', 'str'
+
+_BOOL_VALUES = {'true': True, 'false': False, 'yes': True, 'no': False, 'y': True, 'n': False}
+# Tried in order; the first format that parses every non blank sample value wins. 8 digit dates are left to int.
+_DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S.%f',
+                 '%Y-%m-%dT%H:%M:%S.%f', '%m/%d/%Y %H:%M:%S', '%m/%d/%Y %I:%M:%S %p', '%d-%b-%Y')
+_LEADING_ZERO = re.compile(r'^-?0\d')
+
+
+@dataclass
+class ColumnSpec:
+    type: str = STR
+    nullable: bool = False
+    date_format: Optional[str] = None
+
+
+@dataclass
+class CsvSchema:
+    pattern: str
+    fieldnames: List[str]
+    columns: Dict[str, ColumnSpec] = field(default_factory=dict)
+    sample_rows: int = 0
+
+    def pandas_dtypes(self) -> Dict[str, str]:
+        """ Column dtypes the pandas C parser converts directly; bool and date columns are read as str first. """
+        dtypes = {}
+        for name, spec in self.columns.items():
+            if spec.type == INT:
+                # Always nullable: a blank past the inference sample must not fail the read.
+                dtypes[name] = 'Int64'
+            elif spec.type == FLOAT:
+                dtypes[name] = 'float64'
+            else:
+                dtypes[name] = str
+        return dtypes
+
+
+def pattern_for(file_name: str) -> str:
+    """ Default cache pattern of a file: digit runs (dates, sequence numbers) become *, e.g. members_*.csv. """
+    return re.sub(r'\d+', '*', os.path.basename(file_name))
+
+
+def infer_column(values: pd.Series) -> ColumnSpec:
+    """ Narrowest type that parses every non blank value of a column of strings. """
+    stripped = values.str.strip()
+    present = stripped[stripped != '']
+    nullable = len(present) != len(values)
+    if present.empty:
+        return ColumnSpec(STR, nullable)
+    numbers = pd.to_numeric(present, errors='coerce')
+    if numbers.notna().all():
+        # Codes such as 00123 would lose their zeros as numbers.
+        if present.str.match(_LEADING_ZERO).any():
+            return ColumnSpec(STR, nullable)
+        if not present.str.contains(r'[.eE]').any() and (numbers.abs() < 2 ** 63).all():
+            return ColumnSpec(INT, nullable)
+        return ColumnSpec(FLOAT, nullable)
+    if present.str.lower().isin(_BOOL_VALUES.keys()).all():
+        return ColumnSpec(BOOL, nullable)
+    for date_format in _DATE_FORMATS:
+        if pd.to_datetime(present, format=date_format, errors='coerce').notna().all():
+            is_date = not any(code in date_format for code in ('%H', '%I'))
+            return ColumnSpec(DATE if is_date else DATETIME, nullable, date_format)
+    return ColumnSpec(STR, nullable)
+
+
+def infer_schema(input_file_path: str, sample_rows: int = DEFAULT_SAMPLE_ROWS, pattern: Optional[str] = None,
+                 **reader_kwargs) -> CsvSchema:
+    """ Infer a schema from the first sample_rows rows, read as strings through CsvBatchReader. """
+    reader = CsvBatchReader(input_file_path, batch_size=sample_rows, **reader_kwargs)
+    sample = next(reader.iter_dataframes(), None)
+    if sample is None:
+        sample = pd.DataFrame({name: pd.Series([], dtype=object) for name in reader.fieldnames})
+    return CsvSchema(pattern or pattern_for(input_file_path), reader.fieldnames,
+                     {name: infer_column(sample[name].astype(str)) for name in reader.fieldnames}, len(sample))
+
+
+class SchemaCache:
+    """
+    Inferred schemas by file name pattern, kept in a JSON file. Explicit patterns registered with register()
+    are matched before the derived pattern_for() pattern. A cached schema is only reused while the file's
+    header is unchanged.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None):
+        self.cache_path = cache_path
+        self.schemas: Dict[str, CsvSchema] = {}
+        self.patterns: List[str] = []
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self) -> bool:
+        if not self.cache_path:
+            return False
+        try:
+            with open(self.cache_path, encoding='utf-8') as cache_file:
+                data = json.load(cache_file)
+        except (OSError, ValueError):
+            return False
+        if data.get('version') != _CACHE_VERSION:
+            return False
+        with self._lock:
+            self.patterns = data.get('patterns', [])
+            self.schemas = {pattern: CsvSchema(pattern, schema['fieldnames'],
+                                               {name: ColumnSpec(**spec) for name, spec in schema['columns'].items()},
+                                               schema.get('sample_rows', 0))
+                            for pattern, schema in data['schemas'].items()}
+        return True
+
+    def save(self) -> None:
+        if not self.cache_path:
+            return
+        with self._lock:
+            data = {'version': _CACHE_VERSION, 'patterns': self.patterns,
+                    'schemas': {pattern: {'fieldnames': schema.fieldnames, 'sample_rows': schema.sample_rows,
+                                          'columns': {name: asdict(spec) for name, spec in schema.columns.items()}}
+                                for pattern, schema in self.schemas.items()}}
+        temp_path = self.cache_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as cache_file:
+            json.dump(data, cache_file, indent=1)
+        os.replace(temp_path, self.cache_path)
+
+    def register(self, pattern: str) -> None:
+        """ Share one schema across files matching a glob pattern, e.g. 'members_*.csv'. """
+        with self._lock:
+            if pattern not in self.patterns:
+                self.patterns.append(pattern)
+
+    def pattern(self, input_file_path: str) -> str:
+        name = os.path.basename(input_file_path)
+        for pattern in self.patterns:
+            if fnmatch.fnmatch(name, pattern):
+                return pattern
+        return pattern_for(name)
+
+    def get(self, input_file_path: str, fieldnames: Sequence[str]) -> Optional[CsvSchema]:
+        schema = self.schemas.get(self.pattern(input_file_path))
+        hit = schema is not None and schema.fieldnames == list(fieldnames)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return schema if hit else None
+
+    def put(self, schema: CsvSchema) -> None:
+        with self._lock:
+            self.schemas[schema.pattern] = schema
+        self.save()
+
+    def schema_for(self, input_file_path: str, sample_rows: int = DEFAULT_SAMPLE_ROWS, refresh: bool = False,
+                   **reader_kwargs) -> CsvSchema:
+        """ The cached schema of the file's pattern, inferring (and caching) it on a miss or with refresh. """
+        if not refresh:
+            fieldnames = CsvBatchReader(input_file_path, **reader_kwargs).fieldnames
+            schema = self.get(input_file_path, fieldnames)
+            if schema is not None:
+                return schema
+        schema = infer_schema(input_file_path, sample_rows, self.pattern(input_file_path), **reader_kwargs)
+        self.put(schema)
+        return schema
+
+
+# Used when no cache is passed, so repeated reads in one process skip inference without a cache file.
+default_schema_cache = SchemaCache()
+
+
+def _convert(frame: pd.DataFrame, schema: CsvSchema) -> pd.DataFrame:
+    """ Vectorized conversion of the bool and date columns pandas read as strings. """
+    for name in frame.columns:
+        spec = schema.columns.get(name)
+        if spec is not None and spec.type in (BOOL, DATE, DATETIME):
+            frame[name] = _convert_column(frame[name], spec)
+    return frame
+
+
+def _widen(values: pd.Series, spec: ColumnSpec) -> ColumnSpec:
+    """ The spec of a column of strings that failed to convert as spec: re-inferred over the whole column. """
+    widened = infer_column(values)
+    if spec.type == INT and widened.type == INT:
+        # Parses as int, so the failure was the range; float keeps the values.
+        return ColumnSpec(FLOAT, widened.nullable)
+    return widened
+
+
+def _convert_strings(frame: pd.DataFrame, schema: CsvSchema) -> Tuple[pd.DataFrame, Dict[str, ColumnSpec]]:
+    """
+    Convert a frame read entirely as strings to the schema's types one column at a time. A column that does
+    not fit is re-inferred from all of its values (widened) instead of failing; returns the frame and the
+    widened specs.
+    """
+    widened = {}
+    for name in frame.columns:
+        spec = schema.columns.get(name)
+        if spec is None or spec.type == STR:
+            continue
+        values = frame[name]
+        for attempt in range(2):
+            try:
+                frame[name] = _convert_column(values, spec)
+                break
+            except (ValueError, TypeError, OverflowError):
+                if attempt:
+                    raise
+                spec = widened[name] = _widen(values, spec)
+                if spec.type == STR:
+                    break
+    return frame, widened
+
+
+def _convert_column(values: pd.Series, spec: ColumnSpec) -> pd.Series:
+    stripped = values.str.strip()
+    if spec.type in (INT, FLOAT):
+        present = stripped.replace('', None)
+        if spec.type == FLOAT:
+            return present.astype('float64')
+        return pd.to_numeric(present, errors='raise').astype('Int64')
+    if spec.type == BOOL:
+        converted = stripped.str.lower().map(_BOOL_VALUES)
+        if converted.isna().sum() != (stripped == '').sum():
+            raise ValueError('Column holds values other than booleans')
+        return converted.astype('boolean')
+    return pd.to_datetime(stripped.replace('', None), format=spec.date_format)
+
+
+def _read_csv_kwargs(schema: CsvSchema, columns: Optional[Sequence[str]], delimiter: str, quotechar: str,
+                     encoding: Optional[str]) -> Dict:
+    dtypes = schema.pandas_dtypes()
+    usecols = list(columns) if columns is not None else None
+    if usecols is not None:
+        dtypes = {name: dtype for name, dtype in dtypes.items() if name in usecols}
+    # Blanks are missing values in numeric columns only; string columns keep '' like get_csv_data.
+    na_values = {name: [''] for name, spec in schema.columns.items() if spec.type in (INT, FLOAT)}
+    return dict(sep=delimiter, quotechar=quotechar, encoding=encoding, dtype=dtypes, usecols=usecols,
+                keep_default_na=False, na_values=na_values)
+
+
+def to_numpy_columns(frame: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """ One NumPy array per column: nullable ints become float64 with NaN, nullable bools object arrays. """
+    arrays = {}
+    for name in frame.columns:
+        column = frame[name]
+        if isinstance(column.dtype, pd.Int64Dtype):
+            arrays[name] = column.to_numpy(dtype='float64', na_value=np.nan) if column.hasnans \
+                else column.to_numpy(dtype='int64')
+        elif isinstance(column.dtype, pd.BooleanDtype):
+            arrays[name] = column.to_numpy(dtype=object, na_value=None) if column.hasnans \
+                else column.to_numpy(dtype=bool)
+        else:
+            arrays[name] = column.to_numpy()
+    return arrays
+
+
+class TypedCsvReader:
+    """
+    Read CSV files straight into typed columns: ints and floats are parsed by the pandas C reader, bools and
+    dates are converted a whole column at a time. The schema comes from a SchemaCache (the in memory
+    default_schema_cache unless one is passed), so repeated loads of same shaped daily files skip inference.
+    Ints are always read as nullable Int64. If a file no longer fits its cached schema, e.g. text in a numeric
+    column past the inference sample, it is re-read as strings and only the failing columns are widened
+    (re-inferred from all of their values); the widened schema is cached.
+    """
+
+    def __init__(self, cache: Optional[SchemaCache] = None, sample_rows: int = DEFAULT_SAMPLE_ROWS,
+                 encoding: Optional[str] = None, delimiter: str = ',', quotechar: str = '"'):
+        self.cache = cache if cache is not None else default_schema_cache
+        self.sample_rows = sample_rows
+        self.encoding = encoding
+        self.delimiter = delimiter
+        self.quotechar = quotechar
+
+    def schema(self, input_file_path: str, refresh: bool = False) -> CsvSchema:
+        return self.cache.schema_for(input_file_path, self.sample_rows, refresh, encoding=self.encoding,
+                                     delimiter=self.delimiter, quotechar=self.quotechar)
+
+    def _read(self, input_file_path: str, schema: CsvSchema, columns: Optional[Sequence[str]]) -> pd.DataFrame:
+        kwargs = _read_csv_kwargs(schema, columns, self.delimiter, self.quotechar, self.encoding)
+        frame = pd.read_csv(input_file_path, **kwargs)
+        return _convert(frame[list(columns)] if columns is not None else frame, schema)
+
+    def read(self, input_file_path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        schema = self.schema(input_file_path)
+        try:
+            return self._read(input_file_path, schema, columns)
+        except (ValueError, TypeError, OverflowError):
+            return self._read_widening(input_file_path, schema, columns)
+
+    def _read_widening(self, input_file_path: str, schema: CsvSchema,
+                       columns: Optional[Sequence[str]]) -> pd.DataFrame:
+        """
+        Fallback when the file does not fit the schema, e.g. text past the inference sample: read everything
+        as strings, convert column by column, widen only the columns that fail and cache the widened schema.
+        """
+        frame = pd.read_csv(input_file_path, sep=self.delimiter, quotechar=self.quotechar, encoding=self.encoding,
+                            dtype=str, keep_default_na=False, usecols=list(columns) if columns is not None else None)
+        if columns is not None:
+            frame = frame[list(columns)]
+        frame, widened = _convert_strings(frame, schema)
+        if widened:
+            self.cache.put(CsvSchema(schema.pattern, schema.fieldnames, {**schema.columns, **widened},
+                                     schema.sample_rows))
+        return frame
+
+    def read_numpy(self, input_file_path: str, columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        return to_numpy_columns(self.read(input_file_path, columns))
+
+    def iter_batches(self, input_file_path: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                     columns: Optional[Sequence[str]] = None) -> Iterator[pd.DataFrame]:
+        """ Typed DataFrames of batch_size rows. Unlike read(), a batch that does not fit the schema raises. """
+        schema = self.schema(input_file_path)
+        kwargs = _read_csv_kwargs(schema, columns, self.delimiter, self.quotechar, self.encoding)
+        with pd.read_csv(input_file_path, chunksize=batch_size, **kwargs) as chunks:
+            for chunk in chunks:
+                yield _convert(chunk[list(columns)] if columns is not None else chunk, schema)
+
+
+def read_typed_csv(input_file_path: str, cache: Optional[SchemaCache] = None,
+                   columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """ Shortcut for TypedCsvReader(cache).read(input_file_path, columns). """
+    return TypedCsvReader(cache).read(input_file_path, columns)
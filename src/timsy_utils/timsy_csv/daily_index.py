@@ -0,0 +1,235 @@
+""" Persistent index of the daily/<date>/ CSV folders used by the CSV Comparison App """
+import fnmatch
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .csv_chunked import count_records
+
+INDEX_SUFFIX = '.index.json'
+_INDEX_VERSION = 1
+_DATE_FORMATS = ('%Y-%m-%d', '%Y%m%d', '%Y_%m_%d', '%m-%d-%Y', '%m-%d-%y')
+_MONTH_DAY = re.compile(r'^(\d{1,2})-(\d{1,2})$')
+
+
+@dataclass
+class CsvFileEntry:
+    name: str
+    size: int
+    mtime_ns: int
+    # Data rows, header excluded; None when row counting is off.
+    rows: Optional[int] = None
+
+
+@dataclass
+class DateFolderEntry:
+    name: str
+    mtime_ns: int
+    files: Dict[str, CsvFileEntry] = field(default_factory=dict)
+
+    @property
+    def sort_date(self) -> date:
+        """
+        The folder's date: parsed from the name, with the year of the folder's mtime for month-day names
+        such as '2-11' (the previous year if that would be after the mtime), else the mtime's date.
+        """
+        modified = datetime.fromtimestamp(self.mtime_ns / 1e9).date()
+        for date_format in _DATE_FORMATS:
+            try:
+                return datetime.strptime(self.name, date_format).date()
+            except ValueError:
+                pass
+        match = _MONTH_DAY.match(self.name)
+        if match:
+            try:
+                parsed = date(modified.year, int(match.group(1)), int(match.group(2)))
+                return parsed if parsed <= modified else parsed.replace(year=modified.year - 1)
+            except ValueError:
+                pass
+        return modified
+
+
+@dataclass
+class IndexChanges:
+    added_dates: List[str] = field(default_factory=list)
+    removed_dates: List[str] = field(default_factory=list)
+    # (date, file name) of new or modified files, and of files that disappeared.
+    changed_files: List[Tuple[str, str]] = field(default_factory=list)
+    removed_files: List[Tuple[str, str]] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def __bool__(self) -> bool:
+        return bool(self.added_dates or self.removed_dates or self.changed_files or self.removed_files)
+
+
+class DailyFolderIndex:
+    """
+    Index of date folder -> CSV files (size, mtime, row count) under the daily folder, saved as JSON next to it
+    (daily.index.json).
+    refresh() rescans with os.scandir but only lists folders whose mtime changed (adding, removing or renaming a
+    file changes it) and only recounts rows of files whose size or mtime changed; deep=True also restats files in
+    unchanged folders, for files rewritten in place. Queries read the index only and never touch the filesystem.
+    """
+
+    def __init__(self, daily_folder: str = 'daily', index_path: Optional[str] = None, count_rows: bool = True,
+                 accepted_extensions: Sequence[str] = ('csv',), auto_save: bool = True):
+        self.daily_folder = daily_folder
+        # Outside the daily folder: its entries are all taken for date folders.
+        self.index_path = index_path or os.path.normpath(daily_folder) + INDEX_SUFFIX
+        self.count_rows = count_rows
+        self.accepted_extensions = {extension.lower().lstrip('.') for extension in accepted_extensions}
+        self.auto_save = auto_save
+        self.folders: Dict[str, DateFolderEntry] = {}
+        self._lock = threading.RLock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.load()
+
+    # --- Persistence ---
+    def load(self) -> bool:
+        """ Read the saved index; a missing, unreadable or old format file leaves the index empty. """
+        try:
+            with open(self.index_path, encoding='utf-8') as index_file:
+                data = json.load(index_file)
+        except (OSError, ValueError):
+            return False
+        if data.get('version') != _INDEX_VERSION:
+            return False
+        with self._lock:
+            self.folders = {
+                name: DateFolderEntry(name, folder['mtime_ns'],
+                                      {file['name']: CsvFileEntry(**file) for file in folder['files']})
+                for name, folder in data['folders'].items()}
+        return True
+
+    def save(self) -> None:
+        with self._lock:
+            data = {'version': _INDEX_VERSION,
+                    'folders': {name: {'mtime_ns': folder.mtime_ns,
+                                       'files': [asdict(file) for file in folder.files.values()]}
+                                for name, folder in self.folders.items()}}
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as index_file:
+            json.dump(data, index_file)
+        os.replace(temp_path, self.index_path)
+
+    # --- Scanning ---
+    def _accepted(self, file_name: str) -> bool:
+        return os.path.splitext(file_name)[1].lower().lstrip('.') in self.accepted_extensions
+
+    def _scan_folder(self, folder_name: str, path: str, known_files: Dict[str, CsvFileEntry],
+                     changes: IndexChanges) -> Dict[str, CsvFileEntry]:
+        """ The folder's files, reusing known entries whose size and mtime are unchanged. """
+        files = {}
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if not entry.is_file() or not self._accepted(entry.name):
+                    continue
+                stat = entry.stat()
+                known = known_files.get(entry.name)
+                if known is not None and known.size == stat.st_size and known.mtime_ns == stat.st_mtime_ns:
+                    files[entry.name] = known
+                    continue
+                rows = max(count_records(entry.path) - 1, 0) if self.count_rows else None
+                files[entry.name] = CsvFileEntry(entry.name, stat.st_size, stat.st_mtime_ns, rows)
+                changes.changed_files.append((folder_name, entry.name))
+        changes.removed_files.extend((folder_name, name) for name in known_files if name not in files)
+        return files
+
+    def refresh(self, deep: bool = False) -> IndexChanges:
+        """
+        Bring the index up to date with the daily folder and return what changed. Folders are scanned and
+        rows counted against a snapshot of the index without holding the lock, so queries are not blocked;
+        the results are swapped in at the end.
+        """
+        start = time.perf_counter()
+        changes = IndexChanges()
+        with self._lock:
+            snapshot = dict(self.folders)
+        folders = {}
+        with os.scandir(self.daily_folder) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+                mtime_ns = entry.stat().st_mtime_ns
+                known = snapshot.get(entry.name)
+                if known is None:
+                    changes.added_dates.append(entry.name)
+                elif known.mtime_ns == mtime_ns and not deep:
+                    folders[entry.name] = known
+                    continue
+                files = self._scan_folder(entry.name, entry.path, known.files if known else {}, changes)
+                folders[entry.name] = DateFolderEntry(entry.name, mtime_ns, files)
+        changes.removed_dates.extend(name for name in snapshot if name not in folders)
+        with self._lock:
+            self.folders = folders
+        if changes and self.auto_save:
+            self.save()
+        changes.seconds = time.perf_counter() - start
+        return changes
+
+    # --- Watching ---
+    def watch(self, interval: float = 5.0, on_change: Optional[Callable[[IndexChanges], None]] = None,
+              deep_every: int = 12) -> threading.Thread:
+        """
+        Refresh every interval seconds on a daemon thread (polling works on network shares, where change
+        notifications are unreliable), with a deep refresh every deep_every polls. on_change gets each
+        non-empty IndexChanges. Stop with stop_watching().
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return self._watcher
+        self._stop.clear()
+
+        def poll() -> None:
+            polls = 0
+            while not self._stop.wait(interval):
+                polls += 1
+                try:
+                    changes = self.refresh(deep=deep_every > 0 and polls % deep_every == 0)
+                except OSError:
+                    continue
+                if changes and on_change is not None:
+                    on_change(changes)
+
+        self._watcher = threading.Thread(target=poll, name='DailyFolderIndex', daemon=True)
+        self._watcher.start()
+        return self._watcher
+
+    def stop_watching(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout)
+            self._watcher = None
+
+    # --- Queries (index only) ---
+    def dates(self) -> List[str]:
+        """ Date folders holding at least one CSV file, oldest first. """
+        with self._lock:
+            folders = [folder for folder in self.folders.values() if folder.files]
+        return [folder.name for folder in sorted(folders, key=lambda folder: (folder.sort_date, folder.name))]
+
+    def latest(self, count: int = 1) -> List[str]:
+        """ The newest count dates, newest first. """
+        return self.dates()[::-1][:count]
+
+    def files(self, date_name: str) -> List[CsvFileEntry]:
+        with self._lock:
+            folder = self.folders.get(date_name)
+            return sorted(folder.files.values(), key=lambda file: file.name) if folder else []
+
+    def file_path(self, date_name: str, file_name: str) -> str:
+        return os.path.join(self.daily_folder, date_name, file_name)
+
+    def find(self, pattern: str, dates: Optional[Sequence[str]] = None) -> List[Tuple[str, CsvFileEntry]]:
+        """ (date, file) for every indexed file whose name matches the glob pattern (case insensitive). """
+        pattern = pattern.lower()
+        return [(date_name, file) for date_name in (dates if dates is not None else self.dates())
+                for file in self.files(date_name) if fnmatch.fnmatchcase(file.name.lower(), pattern)]
+
+    def total_rows(self, date_name: str) -> int:
+        return sum(file.rows or 0 for file in self.files(date_name))
@@ -3,7 +3,6 @@ import os
 import csv
 import argparse
 
-
 """ Globals """
 daily_folder_name = 'daily'
 accepted_extensions = ['csv']
@@ -36,27 +35,29 @@ def check_for_daily_folder():
         raise MissingDailyCsvFolderException()
 
 
-def list_available_dates():
+def list_available_dates(index=None):
     """
     List available dates based on folders.
+    With a daily_index.DailyFolderIndex the answer comes from the index without rescanning the folders.
     """
-    date_folders = set(os.listdir(daily_folder_name))
+    if index is not None:
+        return set(index.dates()) or None
+    date_folders = set(entry.name for entry in os.scandir(daily_folder_name) if entry.is_dir())
     folders_to_discard = []
     for folder in date_folders:
         contained_files = os.listdir(f'{daily_folder_name}/{folder}')
         debug_print(f'All Contained dates in Folder {folder}: ', contained_files)
-        if any(file[-3:] not in accepted_extensions for file in contained_files):
+        csv_files = [file for file in contained_files if file[-3:] in accepted_extensions]
+        if len(csv_files) != len(contained_files):
             debug_print("There is a Non-Csv File. Removing from list.")
-            for file in contained_files:
-                if file[-3:] not in accepted_extensions:
-                    contained_files.remove(file)
-        if any(file[-3:] in accepted_extensions for file in contained_files[-3:]):
-            debug_print(f'Available CSV Files in {folder}: ', contained_files)
+        if csv_files:
+            debug_print(f'Available CSV Files in {folder}: ', csv_files)
         else:
             debug_print("No CSV Files.")
             folders_to_discard.append(folder)
     debug_print(f'Pre-Remove Date Folders: {date_folders}')
-    [date_folders.discard(folder) for folder in folders_to_discard]
+    for folder in folders_to_discard:
+        date_folders.discard(folder)
     debug_print(f'Post-Remove Date Folders: {date_folders}')
     if any(date_folders):
         return date_folders
@@ -64,29 +65,41 @@ def list_available_dates():
         return None
 
 
-
-def csv_add_quotes(input_file_path, output_file_path):
+def csv_add_quotes(input_file_path, output_file_path, processes=1, chunk_size=64 * 2 ** 20, progress=None):
     """
     This helps add Quotes around an existing CSV file
     when there are no existing quotes.
     Good when mocked data comes from external source without quotes.
     Header will not be quoted.
     NULL or blanks will be quoted.
+    With processes other than 1 (None for one per CPU) the file is quoted in chunk_size byte ranges
+    in parallel, see csv_chunked.quote_csv_chunked; progress receives a QuoteProgress per chunk.
+    Either way returns the number of data rows quoted.
     """
+    if processes != 1:
+        # Imported here so the sequential path and this module's __main__ run without the package.
+        from .csv_chunked import quote_csv_chunked
+        return quote_csv_chunked(input_file_path, output_file_path, processes, chunk_size, progress=progress).rows
+    rows = 0
     with open(input_file_path, newline='') as csvfile:
-        # reader = csv.DictReader(csvfile)
         simple_reader = csv.reader(csvfile, delimiter=',', quotechar='"')
-        with open(output_file_path, 'w+', newline='') as quoted_csv:
-            quote_writer = csv.writer(quoted_csv, delimiter=',', quotechar='"', quoting=csv.QUOTE_NONE)
+        with open(output_file_path, 'w+', newline='', buffering=4 * 2 ** 20) as quoted_csv:
+            header = next(simple_reader, None)
+            if header is None:
+                return rows
+            csv.writer(quoted_csv, delimiter=',', quotechar='"', quoting=csv.QUOTE_NONE).writerow(header)
+            quote_writer = csv.writer(quoted_csv, delimiter=',', quotechar='"', quoting=csv.QUOTE_ALL)
             for row in simple_reader:
-                if simple_reader.line_num == 1:
-                    quote_writer.writerow(row)
-                    quote_writer = csv.writer(quoted_csv, delimiter=',', quotechar='"', quoting=csv.QUOTE_ALL)
-                    continue
                 quote_writer.writerow(row)
+                rows += 1
+    return rows
 
 
 def get_csv_data(input_file_path):
+    """
+    Read the whole file as a list of dicts. For large files use csv_reader.CsvBatchReader,
+    which streams fixed-size batches instead.
+    """
     csv_dict = []
     csv_columns = []
     with open(input_file_path, newline='') as csvfile:
@@ -96,11 +109,10 @@ def get_csv_data(input_file_path):
             csv_dict.append(row)
 
     debug_print(f'Number of Items in CSV: {len(csv_dict)}')
-    debug_print(f'First Item: {csv_dict[0]}')
-    debug_print(f'Second Item: {csv_dict[1]}')
-    debug_print(f'Third Item: {csv_dict[2]}')
-    debug_print(f'Fourth Item: {csv_dict[3]}')
-    debug_print(f'Fourth Item Reconciliation Status: {csv_dict[3]["USERNAME"]}')
+    for label, row in zip(('First', 'Second', 'Third', 'Fourth'), csv_dict):
+        debug_print(f'{label} Item: {row}')
+    if len(csv_dict) > 3 and 'USERNAME' in csv_dict[3]:
+        debug_print(f'Fourth Item Reconciliation Status: {csv_dict[3]["USERNAME"]}')
     return csv_columns, csv_dict
 
 
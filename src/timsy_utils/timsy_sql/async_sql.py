@@ -0,0 +1,265 @@
+import asyncio
+import contextlib
+import functools
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Iterable, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+from .sql_instrumentation import instrument_cursor
+from .sql_pool import SqlConnectionPool, get_pool
+
+if TYPE_CHECKING:
+    from .timsy_sql_util import TimsySqlUtil
+
+Query = Union[str, Tuple[str, Optional[Sequence]]]
+
+
+def _cancel_running(conn, cursor) -> None:
+    """ Ask the driver to abort a running statement: pyodbc Cursor.cancel or sqlite Connection.interrupt. """
+    try:
+        if hasattr(cursor, 'cancel'):
+            cursor.cancel()
+        elif hasattr(conn, 'interrupt'):
+            conn.interrupt()
+    except Exception:
+        pass
+
+
+def _close_quietly(cursor) -> None:
+    with contextlib.suppress(Exception):
+        cursor.close()
+
+
+def _execute_fetch(cursor, sql_query: str, params: Optional[Sequence]) -> Tuple[List[str], List]:
+    if params:
+        cursor.execute(sql_query, params)
+    else:
+        cursor.execute(sql_query)
+    if cursor.description is None:
+        return [], []
+    columns = [column[0] for column in cursor.description]
+    return columns, cursor.fetchall()
+
+
+class AsyncSqlConnection:
+    """ A borrowed pool connection whose blocking calls run on the owning AsyncSqlUtil's executor. """
+
+    def __init__(self, owner: 'AsyncSqlUtil', conn):
+        self._owner = owner
+        self.conn = conn
+        # Statement left running on a worker thread after a timeout or cancellation.
+        self.abandoned: Optional[Future] = None
+
+    async def execute(self, sql_query: str, params: Optional[Sequence] = None,
+                      timeout: Optional[float] = None) -> Tuple[List[str], List]:
+        """
+        Run a statement and fetch all rows, returning (column names, rows).
+        On timeout or task cancellation the running statement is cancelled at the driver and the error is
+        raised at once; the worker thread finishes in the background, then closes the cursor and (through
+        AsyncSqlUtil.connection) discards the connection.
+        """
+        owner = self._owner
+        timeout = owner.default_timeout if timeout is None else timeout
+        cursor = instrument_cursor(await owner.run_blocking(self.conn.cursor), 'AsyncSqlUtil')
+        work = owner.submit(_execute_fetch, cursor, sql_query, params)
+        result = asyncio.wrap_future(work)
+        try:
+            return await asyncio.wait_for(asyncio.shield(result), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            _cancel_running(self.conn, cursor)
+            self.abandoned = work
+            # Nobody awaits the result any more; retrieve it so the driver's error is not logged as unhandled.
+            result.add_done_callback(lambda done: done.cancelled() or done.exception())
+            # Runs on the worker thread once the driver returns, or at once if it already has.
+            work.add_done_callback(lambda _: _close_quietly(cursor))
+            raise
+        finally:
+            if self.abandoned is None:
+                await owner.run_blocking(_close_quietly, cursor)
+
+    async def fetch_all(self, sql_query: str, params: Optional[Sequence] = None,
+                        timeout: Optional[float] = None) -> List:
+        return (await self.execute(sql_query, params, timeout))[1]
+
+    async def fetch_df(self, sql_query: str, params: Optional[Sequence] = None,
+                       timeout: Optional[float] = None) -> pd.DataFrame:
+        columns, rows = await self.execute(sql_query, params, timeout)
+        return pd.DataFrame.from_records([tuple(row) for row in rows], columns=columns)
+
+    async def commit(self) -> None:
+        await self._owner.run_blocking(self.conn.commit)
+
+
+class AsyncSqlUtil:
+    """
+    asyncio front end for the pooled SQL layer. Blocking driver calls run on a dedicated executor sized to
+    the pool, and a semaphore gates borrowing so waiting coroutines never tie up worker threads.
+    """
+
+    def __init__(self, pool: SqlConnectionPool, max_workers: Optional[int] = None,
+                 default_timeout: Optional[float] = None):
+        self.pool = pool
+        self.max_workers = min(max_workers or pool.max_size, pool.max_size)
+        self.default_timeout = default_timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='AsyncSql')
+        # asyncio primitives belong to one event loop, so each loop using this util gets its own semaphore.
+        self._slots: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]' = \
+            weakref.WeakKeyDictionary()
+        self._slots_lock = threading.Lock()
+
+    @classmethod
+    def from_sql_util(cls, sql_util: 'TimsySqlUtil', database: Optional[str] = None, **kwargs) -> 'AsyncSqlUtil':
+        """ Use the shared pool of sql_util's server and database (or the given one) without changing sql_util. """
+        return cls(get_pool(sql_util.server, database or sql_util.database, sql_util.trusted_connection), **kwargs)
+
+    async def run_blocking(self, func: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """ Start func on the executor, returning the concurrent Future (for work that may be abandoned). """
+        return self._executor.submit(func, *args, **kwargs)
+
+    def _loop_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._slots_lock:
+            slots = self._slots.get(loop)
+            if slots is None:
+                slots = self._slots[loop] = asyncio.Semaphore(self.max_workers)
+        return slots
+
+    def _release_when_done(self, work: Future, slots: asyncio.Semaphore, conn=None, discard: bool = False) -> None:
+        """
+        Once work still running on a worker thread finishes, hand its connection (conn, or the borrow's result)
+        back to the pool and only then free the semaphore slot, so the slot count never exceeds the connections
+        actually free and new borrowers do not wait in pool.borrow on executor threads.
+        """
+        loop = asyncio.get_running_loop()
+
+        def returned(done: Future) -> None:
+            try:
+                if conn is not None:
+                    self.pool.release(conn, discard=discard)
+                elif not done.cancelled() and done.exception() is None:
+                    self.pool.release(done.result(), discard=discard)
+            except Exception:
+                pass
+            with contextlib.suppress(RuntimeError):
+                # The loop may be closed by the time a long abandoned statement returns.
+                loop.call_soon_threadsafe(slots.release)
+        work.add_done_callback(returned)
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        """ async with util.connection() as conn: borrow a pooled connection for the block. """
+        slots = self._loop_slots()
+        await slots.acquire()
+        borrowing = self.submit(self.pool.borrow)
+        borrowed = asyncio.wrap_future(borrowing)
+        try:
+            conn = await asyncio.shield(borrowed)
+        except asyncio.CancelledError:
+            # The borrow carries on in its thread; its connection and the slot come back when it completes.
+            borrowed.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._release_when_done(borrowing, slots)
+            raise
+        except BaseException:
+            slots.release()
+            raise
+        connection = AsyncSqlConnection(self, conn)
+        discard = False
+        try:
+            yield connection
+        except BaseException:
+            # A cancelled or failed statement may leave the connection mid-batch.
+            discard = True
+            raise
+        finally:
+            if connection.abandoned is not None:
+                # Still in use by the abandoned statement: discarded, and the slot freed, when it returns.
+                self._release_when_done(connection.abandoned, slots, conn, discard=True)
+            else:
+                try:
+                    await asyncio.shield(self.run_blocking(self.pool.release, conn, discard))
+                finally:
+                    slots.release()
+
+    async def fetch_all(self, sql_query: str, params: Optional[Sequence] = None,
+                        timeout: Optional[float] = None) -> List:
+        async with self.connection() as conn:
+            return await conn.fetch_all(sql_query, params, timeout)
+
+    async def fetch_df(self, sql_query: str, params: Optional[Sequence] = None,
+                       timeout: Optional[float] = None) -> pd.DataFrame:
+        async with self.connection() as conn:
+            return await conn.fetch_df(sql_query, params, timeout)
+
+    async def gather(self, queries: Iterable[Query], as_frames: bool = False, timeout: Optional[float] = None,
+                     return_exceptions: bool = False) -> List:
+        """
+        Run many queries concurrently (bounded by the pool) and return results in input order.
+        Each query is SQL text or (SQL text, params).
+        """
+        fetch = self.fetch_df if as_frames else self.fetch_all
+        tasks = []
+        for query in queries:
+            sql_query, params = (query, None) if isinstance(query, str) else query
+            tasks.append(fetch(sql_query, params, timeout))
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> 'AsyncSqlUtil':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+def benchmark_async_vs_sync(pool: SqlConnectionPool, queries: List[Query]) -> dict:
+    """ Time the same queries run serially through the pool and fanned out through AsyncSqlUtil. """
+    start = time.perf_counter()
+    for query in queries:
+        sql_query, params = (query, None) if isinstance(query, str) else query
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            _execute_fetch(cursor, sql_query, params)
+            cursor.close()
+    sync_seconds = time.perf_counter() - start
+
+    async def run_async():
+        async with AsyncSqlUtil(pool) as util:
+            return await util.gather(queries)
+
+    start = time.perf_counter()
+    asyncio.run(run_async())
+    async_seconds = time.perf_counter() - start
+    return {'queries': len(queries), 'sync_seconds': sync_seconds, 'async_seconds': async_seconds,
+            'speedup': sync_seconds / async_seconds if async_seconds else float('inf')}
+
+
+def sqlite_stand_in_pool(database_path: Union[str, Path], max_size: int = 8) -> SqlConnectionPool:
+    """
+    Pool over a local sqlite file, for benchmarks without a SQL Server.
+    Connections get a sleep_ms(n) SQL function to stand in for server side latency.
+    """
+    def connect(server, database, trusted_connection):
+        conn = sqlite3.connect(database, check_same_thread=False)
+        conn.create_function('sleep_ms', 1, lambda ms: time.sleep(ms / 1000) or ms)
+        return conn
+    return SqlConnectionPool('sqlite', str(database_path), 'no', max_size=max_size, connect_func=connect)
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as temp_dir:
+        bench_pool = sqlite_stand_in_pool(Path(temp_dir) / 'bench.sqlite')
+        print(benchmark_async_vs_sync(bench_pool, ['SELECT sleep_ms(50)'] * 32))
+        bench_pool.close()
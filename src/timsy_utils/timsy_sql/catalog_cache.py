@@ -0,0 +1,320 @@
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Union
+
+from .sql_instrumentation import instrument_connection
+from .sql_pool import get_pool
+
+if TYPE_CHECKING:
+    from .timsy_alchemy import TimsySqlAlchemyUtil
+    from .timsy_sql_util import TimsySqlUtil
+
+_SQL_TABLES = """
+SELECT t.object_id, s.name AS schema_name, t.name, CONVERT(VARCHAR(33), t.modify_date, 126) AS modify_date
+FROM sys.tables t
+JOIN sys.schemas s ON s.schema_id = t.schema_id
+"""
+
+_SQL_COLUMNS = """
+SELECT c.object_id, c.column_id, c.name, ty.name AS type_name, c.max_length, c.precision, c.scale, c.is_nullable
+FROM sys.columns c
+JOIN sys.types ty ON ty.user_type_id = c.user_type_id
+WHERE c.object_id IN ({object_ids})
+"""
+
+_SQL_OBJECT_MODIFY_DATE = """
+SELECT CONVERT(VARCHAR(33), modify_date, 126) FROM sys.objects WHERE object_id = OBJECT_ID(?)
+"""
+
+_SQL_REFERENCES = """
+SELECT referenced_schema_name, referenced_entity_name, referenced_minor_name
+FROM sys.dm_sql_referenced_entities(?, 'OBJECT')
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tables (
+    object_id INTEGER PRIMARY KEY, schema_name TEXT, name TEXT, modify_date TEXT);
+CREATE TABLE IF NOT EXISTS columns (
+    object_id INTEGER, column_id INTEGER, name TEXT, type_name TEXT, max_length INTEGER, precision INTEGER,
+    scale INTEGER, is_nullable INTEGER, PRIMARY KEY (object_id, column_id));
+CREATE INDEX IF NOT EXISTS columns_name ON columns (name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS refs (
+    object_name TEXT, modify_date TEXT, fetched_at REAL, referenced_schema_name TEXT,
+    referenced_entity_name TEXT, referenced_minor_name TEXT);
+CREATE INDEX IF NOT EXISTS refs_object_name ON refs (object_name);
+CREATE TABLE IF NOT EXISTS ddl (object_id INTEGER PRIMARY KEY, modify_date TEXT, statement TEXT);
+"""
+
+# Object ids per IN (...) list when re-reading columns of changed tables.
+_ID_CHUNK = 500
+
+
+@dataclass(frozen=True)
+class CatalogTable:
+    object_id: int
+    schema_name: str
+    name: str
+    modify_date: str
+
+    @property
+    def full_name(self) -> str:
+        return f'{self.schema_name}.{self.name}'
+
+
+@dataclass(frozen=True)
+class CatalogColumn:
+    object_id: int
+    column_id: int
+    name: str
+    type_name: str
+    max_length: int
+    precision: int
+    scale: int
+    is_nullable: bool
+
+
+@dataclass(frozen=True)
+class CatalogReference:
+    referenced_schema_name: Optional[str]
+    referenced_entity_name: str
+    referenced_minor_name: Optional[str]
+
+
+@dataclass
+class RefreshResult:
+    changed: int = 0
+    dropped: int = 0
+    unchanged: int = 0
+    seconds: float = 0.0
+
+
+def default_cache_path(server: str, database: str) -> Path:
+    safe_name = re.sub(r'[^\w.-]+', '_', f'{server}_{database}')
+    return Path('catalog_cache') / f'{safe_name}.sqlite'
+
+
+class SqlCatalogCache:
+    """
+    Persistent, sqlite backed cache of sys.tables, sys.columns and referenced entities for one database.
+    refresh() only re-reads columns of tables whose sys.tables.modify_date changed. Lookups are served
+    from in-memory indexes by object_id, name and schema, refreshing first when ttl_seconds has elapsed.
+    """
+
+    def __init__(self, sql_util: 'TimsySqlUtil', database: Optional[str] = None,
+                 cache_path: Union[str, Path, None] = None, ttl_seconds: float = 3600.0):
+        self.sql_util = sql_util
+        self.database = database or sql_util.database
+        self.ttl_seconds = ttl_seconds
+        self.cache_path = Path(cache_path) if cache_path else default_cache_path(sql_util.server, self.database)
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.cache_path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+        self._load_indexes()
+
+    # --- Persistence ---
+    def _get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value) -> None:
+        self._db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+    @property
+    def last_refresh(self) -> float:
+        value = self._get_meta('last_refresh')
+        return float(value) if value else 0.0
+
+    def is_stale(self) -> bool:
+        return time.time() - self.last_refresh > self.ttl_seconds
+
+    def _load_indexes(self) -> None:
+        """ Rebuild the in-memory indexes from sqlite and swap them in at once for concurrent readers. """
+        tables_by_id: Dict[int, CatalogTable] = {}
+        tables_by_name: Dict[str, List[CatalogTable]] = defaultdict(list)
+        tables_by_schema: Dict[str, List[CatalogTable]] = defaultdict(list)
+        columns_by_id: Dict[int, List[CatalogColumn]] = defaultdict(list)
+        for row in self._db.execute('SELECT object_id, schema_name, name, modify_date FROM tables'):
+            table = CatalogTable(*row)
+            tables_by_id[table.object_id] = table
+            tables_by_name[table.name.lower()].append(table)
+            tables_by_schema[table.schema_name.lower()].append(table)
+        for row in self._db.execute('SELECT object_id, column_id, name, type_name, max_length, precision, scale, '
+                                    'is_nullable FROM columns ORDER BY object_id, column_id'):
+            columns_by_id[row[0]].append(CatalogColumn(*row[:7], bool(row[7])))
+        self._tables_by_id = tables_by_id
+        self._tables_by_name = tables_by_name
+        self._tables_by_schema = tables_by_schema
+        self._columns_by_id = columns_by_id
+
+    # --- Refresh ---
+    def _query(self, sql_query: str, params: Optional[List] = None) -> List:
+        # Borrow from the database's pool directly: sql_util.connection(database) would switch sql_util.database.
+        pool = get_pool(self.sql_util.server, self.database, self.sql_util.trusted_connection)
+        with pool.connection() as conn:
+            cursor = instrument_connection(conn, 'SqlCatalogCache').cursor()
+            try:
+                if params:
+                    cursor.execute(sql_query, params)
+                else:
+                    cursor.execute(sql_query)
+                return [tuple(row) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+
+    def refresh(self, force: bool = False) -> RefreshResult:
+        """
+        Re-read sys.tables and only pull sys.columns for tables that are new or have a newer modify_date.
+        force re-reads every table's columns.
+        """
+        start = time.perf_counter()
+        result = RefreshResult()
+        current = {row[0]: CatalogTable(*row) for row in self._query(_SQL_TABLES)}
+        with self._lock:
+            changed = [object_id for object_id, table in current.items()
+                       if force or object_id not in self._tables_by_id
+                       or self._tables_by_id[object_id].modify_date != table.modify_date]
+            dropped = [object_id for object_id in self._tables_by_id if object_id not in current]
+        columns = []
+        for index in range(0, len(changed), _ID_CHUNK):
+            id_list = ', '.join(str(int(object_id)) for object_id in changed[index:index + _ID_CHUNK])
+            columns.extend(self._query(_SQL_COLUMNS.format(object_ids=id_list)))
+
+        with self._lock, self._db:
+            stale_ids = [(object_id,) for object_id in changed + dropped]
+            self._db.executemany('DELETE FROM columns WHERE object_id = ?', stale_ids)
+            self._db.executemany('DELETE FROM ddl WHERE object_id = ?', [(i,) for i in dropped])
+            self._db.executemany('DELETE FROM tables WHERE object_id = ?', [(i,) for i in dropped])
+            self._db.executemany('INSERT OR REPLACE INTO tables (object_id, schema_name, name, modify_date) '
+                                 'VALUES (?, ?, ?, ?)',
+                                 [(t.object_id, t.schema_name, t.name, t.modify_date)
+                                  for t in (current[i] for i in changed)])
+            self._db.executemany('INSERT OR REPLACE INTO columns VALUES (?, ?, ?, ?, ?, ?, ?, ?)', columns)
+            self._set_meta('last_refresh', time.time())
+            if changed or dropped:
+                self._load_indexes()
+        result.changed = len(changed)
+        result.dropped = len(dropped)
+        result.unchanged = len(current) - len(changed)
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def ensure_fresh(self) -> None:
+        if self.is_stale():
+            self.refresh()
+
+    # --- Lookups ---
+    def tables(self) -> List[CatalogTable]:
+        self.ensure_fresh()
+        return list(self._tables_by_id.values())
+
+    def table_by_id(self, object_id: int) -> Optional[CatalogTable]:
+        self.ensure_fresh()
+        return self._tables_by_id.get(object_id)
+
+    def table(self, table_name: str, schema: Optional[str] = None) -> Optional[CatalogTable]:
+        """ Find a table by name, accepting 'schema.table' or an explicit schema. """
+        self.ensure_fresh()
+        if schema is None and '.' in table_name:
+            schema, table_name = table_name.rsplit('.', 1)
+        candidates = self._tables_by_name.get(table_name.strip('[]').lower(), [])
+        if schema is not None:
+            schema = schema.strip('[]').lower()
+            candidates = [table for table in candidates if table.schema_name.lower() == schema]
+        return candidates[0] if candidates else None
+
+    def tables_in_schema(self, schema: str) -> List[CatalogTable]:
+        self.ensure_fresh()
+        return list(self._tables_by_schema.get(schema.strip('[]').lower(), []))
+
+    def columns(self, table: Union[str, int, CatalogTable], schema: Optional[str] = None) -> List[CatalogColumn]:
+        if isinstance(table, CatalogTable):
+            object_id = table.object_id
+        elif isinstance(table, int):
+            object_id = table
+        else:
+            found = self.table(table, schema)
+            if found is None:
+                return []
+            object_id = found.object_id
+        self.ensure_fresh()
+        return list(self._columns_by_id.get(object_id, []))
+
+    def find_columns(self, column_name: str) -> List[CatalogColumn]:
+        """ All cached columns with the given name (case insensitive), across tables. """
+        self.ensure_fresh()
+        with self._lock:
+            rows = self._db.execute('SELECT object_id, column_id, name, type_name, max_length, precision, scale, '
+                                    'is_nullable FROM columns WHERE name = ? COLLATE NOCASE '
+                                    'ORDER BY object_id, column_id', (column_name,)).fetchall()
+        return [CatalogColumn(*row[:7], bool(row[7])) for row in rows]
+
+    def references(self, object_name: str) -> List[CatalogReference]:
+        """
+        Cached sys.dm_sql_referenced_entities for an object. Within ttl_seconds the cache is used as is;
+        afterwards only the object's modify_date is checked and references are re-read when it changed.
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT modify_date, fetched_at, referenced_schema_name, referenced_entity_name, '
+                                    'referenced_minor_name FROM refs WHERE object_name = ?',
+                                    (object_name,)).fetchall()
+        if rows and time.time() - rows[0][1] <= self.ttl_seconds:
+            return [CatalogReference(*row[2:]) for row in rows if row[3] is not None]
+        modify_rows = self._query(_SQL_OBJECT_MODIFY_DATE, [object_name])
+        modify_date = modify_rows[0][0] if modify_rows else None
+        now = time.time()
+        if rows and rows[0][0] == modify_date:
+            with self._lock, self._db:
+                self._db.execute('UPDATE refs SET fetched_at = ? WHERE object_name = ?', (now, object_name))
+            return [CatalogReference(*row[2:]) for row in rows if row[3] is not None]
+        references = [CatalogReference(*row) for row in self._query(_SQL_REFERENCES, [object_name])]
+        # A row with no entity marks "fetched, nothing referenced" so empty results are cached too.
+        stored = [(object_name, modify_date, now, r.referenced_schema_name, r.referenced_entity_name,
+                   r.referenced_minor_name) for r in references] or [(object_name, modify_date, now, None, None, None)]
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM refs WHERE object_name = ?', (object_name,))
+            self._db.executemany('INSERT INTO refs VALUES (?, ?, ?, ?, ?, ?)', stored)
+        return references
+
+    def create_table_stmt(self, alchemy_util: 'TimsySqlAlchemyUtil', table_name: str,
+                          schema: str = 'Production') -> str:
+        """
+        TimsySqlAlchemyUtil.query_create_table_stmt cached against the table's modify_date.
+        """
+        table = self.table(table_name, schema)
+        if table is not None:
+            with self._lock:
+                row = self._db.execute('SELECT modify_date, statement FROM ddl WHERE object_id = ?',
+                                       (table.object_id,)).fetchone()
+            if row and row[0] == table.modify_date:
+                return row[1]
+        statement = alchemy_util.query_create_table_stmt(table_name, schema=schema)
+        if table is not None:
+            with self._lock, self._db:
+                self._db.execute('INSERT OR REPLACE INTO ddl VALUES (?, ?, ?)',
+                                 (table.object_id, table.modify_date, statement))
+        return statement
+
+    def invalidate(self, object_ids: Optional[Iterable[int]] = None) -> None:
+        """ Drop cached entries (all when object_ids is None) so the next lookup re-reads them. """
+        with self._lock, self._db:
+            if object_ids is None:
+                for table_name in ('tables', 'columns', 'refs', 'ddl', 'meta'):
+                    self._db.execute(f'DELETE FROM {table_name}')
+            else:
+                ids = [(int(object_id),) for object_id in object_ids]
+                for table_name in ('tables', 'columns', 'ddl'):
+                    self._db.executemany(f'DELETE FROM {table_name} WHERE object_id = ?', ids)
+                self._set_meta('last_refresh', 0)
+            self._load_indexes()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
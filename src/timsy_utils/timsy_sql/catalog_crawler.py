@@ -0,0 +1,283 @@
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .sql_bulk_load import quote_identifier
+from .sql_instrumentation import instrument_connection
+from .sql_models.column_instance import ColumnInstance
+from .sql_models.database_model import DatabaseModel
+from .sql_models.proc import Proc
+from .sql_models.server_model import ServerModel
+from .sql_models.sql_column_type import SQLColumnType
+from .sql_pool import SqlConnectionPool, new_pool
+
+PoolFactory = Callable[[ServerModel, int], SqlConnectionPool]
+
+_SQL_DATABASES = """
+SELECT database_id, name
+FROM sys.databases
+WHERE state_desc = 'ONLINE' AND HAS_DBACCESS(name) = 1{system_filter}
+ORDER BY name
+"""
+
+# Catalog queries use three part names so any pooled connection on the server can read any database
+# without USE switching the connection.
+_SQL_TABLES = """
+SELECT s.name, t.name
+FROM {db}.sys.tables t
+JOIN {db}.sys.schemas s ON s.schema_id = t.schema_id
+ORDER BY s.name, t.name
+"""
+
+_SQL_COLUMNS = """
+SELECT s.name, t.name, c.name, ty.name, c.max_length, c.precision, c.scale, c.is_nullable
+FROM {db}.sys.columns c
+JOIN {db}.sys.tables t ON t.object_id = c.object_id
+JOIN {db}.sys.schemas s ON s.schema_id = t.schema_id
+JOIN {db}.sys.types ty ON ty.user_type_id = c.user_type_id
+ORDER BY s.name, t.name, c.column_id
+"""
+
+_SQL_PROCS = """
+SELECT p.object_id, s.name, p.name
+FROM {db}.sys.procedures p
+JOIN {db}.sys.schemas s ON s.schema_id = p.schema_id
+ORDER BY s.name, p.name
+"""
+
+_SQL_PROC_PARAMETERS = """
+SELECT pa.object_id, pa.name, ty.name, pa.max_length, pa.precision, pa.scale, pa.is_output
+FROM {db}.sys.parameters pa
+JOIN {db}.sys.procedures p ON p.object_id = pa.object_id
+JOIN {db}.sys.types ty ON ty.user_type_id = pa.user_type_id
+ORDER BY pa.object_id, pa.parameter_id
+"""
+
+# sys.sql_expression_dependencies answers for every proc in one set based read, where
+# sys.dm_sql_referenced_entities needs a call per object.
+_SQL_PROC_REFERENCES = """
+SELECT DISTINCT d.referencing_id, d.referenced_database_name, d.referenced_schema_name, d.referenced_entity_name
+FROM {db}.sys.sql_expression_dependencies d
+JOIN {db}.sys.procedures p ON p.object_id = d.referencing_id
+WHERE d.referenced_entity_name IS NOT NULL
+"""
+
+
+def format_type(type_name: str, max_length: int, precision: int, scale: int) -> str:
+    """ Declared type as written in DDL, e.g. nvarchar(50), decimal(19,4), varchar(max). """
+    type_name = type_name.lower()
+    if type_name in ('varchar', 'char', 'varbinary', 'binary', 'nvarchar', 'nchar'):
+        if max_length == -1:
+            return f'{type_name}(max)'
+        return f'{type_name}({max_length // 2 if type_name.startswith("n") else max_length})'
+    if type_name in ('decimal', 'numeric'):
+        return f'{type_name}({precision},{scale})'
+    if type_name in ('datetime2', 'time', 'datetimeoffset'):
+        return f'{type_name}({scale})'
+    return type_name
+
+
+@dataclass
+class CrawlError:
+    server: str
+    database: Optional[str]
+    error: str
+
+
+class ServerCatalog:
+    """
+    In-memory catalog of crawled servers, with name indexes over tables, columns and proc references.
+    Names are matched case insensitively; unqualified names match any schema.
+    """
+
+    def __init__(self):
+        self.servers: Dict[str, ServerModel] = {}
+        self.errors: List[CrawlError] = []
+        self.seconds: float = 0.0
+        self._tables: Dict[str, List[Tuple[DatabaseModel, str]]] = defaultdict(list)
+        self._columns: Dict[str, List[Tuple[DatabaseModel, ColumnInstance]]] = defaultdict(list)
+        self._procs_by_table: Dict[str, List[Proc]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(qualified_name: str) -> Tuple[str, str]:
+        qualified_name = qualified_name.lower()
+        return qualified_name, qualified_name.rsplit('.', 1)[-1]
+
+    def _unindex(self, database: DatabaseModel) -> None:
+        for index in (self._tables, self._columns):
+            for key in list(index):
+                index[key] = [entry for entry in index[key] if entry[0] is not database]
+                if not index[key]:
+                    del index[key]
+        procs = set(map(id, database.procs))
+        for key in list(self._procs_by_table):
+            self._procs_by_table[key] = [proc for proc in self._procs_by_table[key] if id(proc) not in procs]
+            if not self._procs_by_table[key]:
+                del self._procs_by_table[key]
+
+    def add_database(self, server: ServerModel, database: DatabaseModel) -> None:
+        """ Add a crawled database, replacing (and unindexing) an earlier crawl of the same name. """
+        with self._lock:
+            server = self.servers.setdefault(server.server_name, server)
+            previous = server.database(database.name)
+            if previous is not None:
+                server.databases.remove(previous)
+                self._unindex(previous)
+            server.databases.append(database)
+            for table in database.tables:
+                for key in set(self._keys(table)):
+                    self._tables[key].append((database, table))
+            for column in database.columns:
+                self._columns[column.alias.lower()].append((database, column))
+            for proc in database.procs:
+                for table in proc.table_list:
+                    for key in set(self._keys(table)):
+                        self._procs_by_table[key].append(proc)
+
+    def add_error(self, error: CrawlError) -> None:
+        with self._lock:
+            self.errors.append(error)
+
+    def databases(self, server_name: Optional[str] = None) -> List[DatabaseModel]:
+        servers = [self.servers[server_name]] if server_name else self.servers.values()
+        return [database for server in servers for database in server.databases]
+
+    def find_tables(self, table_name: str) -> List[Tuple[DatabaseModel, str]]:
+        """ (database, schema.table) for every crawled table named table_name ('Product' or 'Production.Product'). """
+        return list(self._tables.get(table_name.replace('[', '').replace(']', '').lower(), []))
+
+    def find_columns(self, column_name: str) -> List[Tuple[DatabaseModel, ColumnInstance]]:
+        return list(self._columns.get(column_name.strip('[]').lower(), []))
+
+    def procs_referencing(self, table_name: str) -> List[Proc]:
+        return list(self._procs_by_table.get(table_name.replace('[', '').replace(']', '').lower(), []))
+
+    def summary(self) -> str:
+        databases = self.databases()
+        return (f'{len(self.servers)} servers, {len(databases)} databases, '
+                f'{sum(len(database.tables) for database in databases)} tables, '
+                f'{sum(len(database.columns) for database in databases)} columns, '
+                f'{sum(len(database.procs) for database in databases)} procs, '
+                f'{len(self.errors)} errors in {self.seconds:.1f}s')
+
+
+def _default_pool(server: ServerModel, max_connections: int) -> SqlConnectionPool:
+    # A pool of the crawler's own: the shared get_pool one would keep the max_size it was first created with.
+    return new_pool(server.server_name, 'master', max_size=max_connections)
+
+
+def _query(pool: SqlConnectionPool, sql_query: str) -> List:
+    with pool.connection() as conn:
+        cursor = instrument_connection(conn, 'CatalogCrawler').cursor()
+        try:
+            cursor.execute(sql_query)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+class CatalogCrawler:
+    """
+    Crawl tables, columns, procs and proc references of every database on a list of servers into a
+    ServerCatalog. Servers are crawled in parallel (up to max_servers at once) and the catalog queries of
+    each server run over at most per_server_connections pooled connections, so no server sees more than
+    that many concurrent sessions from the crawler. pool_factory must return a pool the crawler owns; it is
+    closed once the server is crawled.
+    """
+
+    def __init__(self, per_server_connections: int = 4, max_servers: int = 8, include_system: bool = False,
+                 database_filter: Optional[Callable[[str], bool]] = None,
+                 pool_factory: PoolFactory = _default_pool):
+        self.per_server_connections = per_server_connections
+        self.max_servers = max_servers
+        self.include_system = include_system
+        self.database_filter = database_filter
+        self.pool_factory = pool_factory
+
+    def list_databases(self, pool: SqlConnectionPool) -> List[Tuple[int, str]]:
+        system_filter = '' if self.include_system else ' AND database_id > 4'
+        rows = _query(pool, _SQL_DATABASES.format(system_filter=system_filter))
+        return [(row[0], row[1]) for row in rows
+                if self.database_filter is None or self.database_filter(row[1])]
+
+    @staticmethod
+    def _submit_database(executor: ThreadPoolExecutor, pool: SqlConnectionPool,
+                         database_name: str) -> Dict[str, Future]:
+        db = quote_identifier(database_name, 'mssql')
+        return {name: executor.submit(_query, pool, sql_query.format(db=db))
+                for name, sql_query in (('tables', _SQL_TABLES), ('columns', _SQL_COLUMNS), ('procs', _SQL_PROCS),
+                                        ('parameters', _SQL_PROC_PARAMETERS), ('references', _SQL_PROC_REFERENCES))}
+
+    @staticmethod
+    def build_database(server: ServerModel, database_id: int, database_name: str,
+                       results: Dict[str, List]) -> DatabaseModel:
+        """ Assemble a DatabaseModel from the rows of the five catalog queries. """
+        database = DatabaseModel(database_id, database_name, server.server_name)
+        database.tables = [f'{schema}.{table}' for schema, table in results['tables']]
+        database.columns = [ColumnInstance(column, f'{schema}.{table}', SQLColumnType.from_sql_server(type_name),
+                                           bool(is_nullable), None, '',
+                                           format_type(type_name, max_length, precision, scale))
+                            for schema, table, column, type_name, max_length, precision, scale, is_nullable
+                            in results['columns']]
+
+        parameters: Dict[int, List[str]] = defaultdict(list)
+        for object_id, name, type_name, max_length, precision, scale, is_output in results['parameters']:
+            parameters[object_id].append(f'{name} {format_type(type_name, max_length, precision, scale)}'
+                                         f'{" OUTPUT" if is_output else ""}')
+        references: Dict[int, Tuple[set, set]] = defaultdict(lambda: (set(), set()))
+        for object_id, referenced_database, referenced_schema, referenced_entity in results['references']:
+            database_refs, tables = references[object_id]
+            database_refs.add(referenced_database or database_name)
+            tables.add(f'{referenced_schema or "dbo"}.{referenced_entity}')
+        for object_id, schema, name in results['procs']:
+            database_refs, tables = references.get(object_id, (set(), set()))
+            database.procs.append(Proc(f'{schema}.{name}', ', '.join(parameters.get(object_id, [])),
+                                       server.server_name, database_name, sorted(database_refs), sorted(tables)))
+        return database
+
+    def crawl_server(self, server: ServerModel, catalog: ServerCatalog) -> None:
+        """
+        Queue the catalog queries of every database on the server's bounded executor up front, then
+        assemble databases in name order as their results arrive.
+        """
+        try:
+            pool = self.pool_factory(server, self.per_server_connections)
+        except Exception as e:
+            catalog.add_error(CrawlError(server.server_name, None, f'{type(e).__name__}: {e}'))
+            return
+        try:
+            self._crawl_databases(server, pool, catalog)
+        finally:
+            pool.close()
+
+    def _crawl_databases(self, server: ServerModel, pool: SqlConnectionPool, catalog: ServerCatalog) -> None:
+        try:
+            databases = self.list_databases(pool)
+        except Exception as e:
+            catalog.add_error(CrawlError(server.server_name, None, f'{type(e).__name__}: {e}'))
+            return
+        with ThreadPoolExecutor(max_workers=self.per_server_connections,
+                                thread_name_prefix=f'CatalogCrawler-{server.server_name}') as executor:
+            pending = [(database_id, database_name, self._submit_database(executor, pool, database_name))
+                       for database_id, database_name in databases]
+            for database_id, database_name, futures in pending:
+                try:
+                    results = {name: future.result() for name, future in futures.items()}
+                    catalog.add_database(server, self.build_database(server, database_id, database_name, results))
+                except Exception as e:
+                    catalog.add_error(CrawlError(server.server_name, database_name, f'{type(e).__name__}: {e}'))
+
+    def crawl(self, servers: Iterable[ServerModel], catalog: Optional[ServerCatalog] = None) -> ServerCatalog:
+        """ Crawl every server into catalog (a new ServerCatalog by default). Failures are kept in catalog.errors. """
+        catalog = catalog or ServerCatalog()
+        servers = list(servers)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_servers, len(servers))),
+                                thread_name_prefix='CatalogCrawler') as executor:
+            list(executor.map(lambda server: self.crawl_server(server, catalog), servers))
+        catalog.seconds += time.perf_counter() - start
+        return catalog
@@ -0,0 +1,297 @@
+import mmap
+import struct
+import sys
+import time
+from array import array
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from .catalog_crawler import format_type
+from .sql_instrumentation import instrument_connection
+from .sql_models.column_entry import ColumnEntry
+from .sql_models.column_instance import ColumnInstance
+from .sql_models.proc import Proc
+from .sql_models.sql_column_type import SQLColumnType
+from .sql_pool import SqlConnectionPool
+
+_SQL_PROCS = """
+SELECT s.name, p.name
+FROM sys.procedures p
+JOIN sys.schemas s ON s.schema_id = p.schema_id
+ORDER BY s.name, p.name
+"""
+
+_SQL_COLUMNS = """
+SELECT s.name, o.name, c.name, ty.name, c.max_length, c.precision, c.scale, c.is_nullable
+FROM sys.columns c
+JOIN sys.objects o ON o.object_id = c.object_id AND o.type IN ('U', 'V')
+JOIN sys.schemas s ON s.schema_id = o.schema_id
+JOIN sys.types ty ON ty.user_type_id = c.user_type_id
+"""
+
+_SQL_REFERENCED_ENTITIES = """
+SELECT referenced_database_name, referenced_schema_name, referenced_entity_name, referenced_minor_name
+FROM sys.dm_sql_referenced_entities(?, 'OBJECT')
+"""
+
+# File layout, all integers little-endian uint32:
+#   header | string offsets (n_strings + 1) | column keys | column posting offsets (n_column_keys + 1)
+#   | column postings (proc indexes) | proc keys | proc names | proc posting offsets (n_procs + 1)
+#   | proc postings (string ids) | string data (UTF-8)
+# Keys are lower cased string ids sorted by their UTF-8 bytes, so lookups binary search the mapped file.
+_MAGIC = b'TLIX'
+_VERSION = 1
+_HEADER = struct.Struct('<4s6I')
+
+
+def _lookup_key(name: str) -> str:
+    return name.replace('[', '').replace(']', '').strip().lower()
+
+
+@dataclass
+class ColumnLineage:
+    """
+    Column usage of a database's procs built from sys.dm_sql_referenced_entities: ColumnEntry per column name
+    (instances per table, procs using it) and Proc per procedure (tables referenced).
+    """
+    database: str
+    entries: Dict[str, ColumnEntry] = field(default_factory=dict)
+    procs: Dict[str, Proc] = field(default_factory=dict)
+    # schema.table.column (lower case) -> procs using exactly that table column.
+    column_procs: Dict[str, Set[str]] = field(default_factory=lambda: defaultdict(set))
+    errors: Dict[str, str] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    def procs_using_column(self, column: str) -> List[str]:
+        """ Procs using a column, given as 'Column' (any table) or 'schema.table.column'. """
+        key = _lookup_key(column)
+        if '.' in key:
+            return sorted(self.column_procs.get(key, ()))
+        entry = self.entries.get(key)
+        return sorted(proc.name for proc in entry.procs_using) if entry else []
+
+    def tables_for_proc(self, proc_name: str) -> List[str]:
+        proc = self.procs.get(_lookup_key(proc_name))
+        return list(proc.table_list) if proc else []
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """ Write the inverted indexes (column -> procs, proc -> tables) in the compact mmap-able format. """
+        strings: Dict[str, int] = {}
+
+        def string_id(value: str) -> int:
+            if value not in strings:
+                strings[value] = len(strings)
+            return strings[value]
+
+        procs = sorted(self.procs.values(), key=lambda proc: _lookup_key(proc.name).encode('utf-8'))
+        proc_index = {_lookup_key(proc.name): index for index, proc in enumerate(procs)}
+        column_map: Dict[str, Set[int]] = {}
+        for key, entry in self.entries.items():
+            column_map[key] = {proc_index[_lookup_key(proc.name)] for proc in entry.procs_using}
+        for key, proc_names in self.column_procs.items():
+            column_map[key] = {proc_index[_lookup_key(name)] for name in proc_names}
+        column_keys = sorted(column_map, key=lambda key: key.encode('utf-8'))
+
+        column_offsets, column_postings = array('I', [0]), array('I')
+        for key in column_keys:
+            column_postings.extend(sorted(column_map[key]))
+            column_offsets.append(len(column_postings))
+        proc_offsets, proc_postings = array('I', [0]), array('I')
+        for proc in procs:
+            proc_postings.extend(string_id(table) for table in proc.table_list)
+            proc_offsets.append(len(proc_postings))
+        column_key_ids = array('I', (string_id(key) for key in column_keys))
+        proc_key_ids = array('I', (string_id(_lookup_key(proc.name)) for proc in procs))
+        proc_name_ids = array('I', (string_id(proc.name) for proc in procs))
+
+        encoded = [value.encode('utf-8') for value in strings]
+        string_offsets = array('I', [0])
+        for value in encoded:
+            string_offsets.append(string_offsets[-1] + len(value))
+
+        sections = [string_offsets, column_key_ids, column_offsets, column_postings, proc_key_ids, proc_name_ids,
+                    proc_offsets, proc_postings]
+        if sys.byteorder != 'little':
+            for section in sections:
+                section.byteswap()
+        path = Path(path)
+        temp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(temp_path, 'wb') as index_file:
+            index_file.write(_HEADER.pack(_MAGIC, _VERSION, len(encoded), len(column_keys), len(column_postings),
+                                          len(procs), len(proc_postings)))
+            for section in sections:
+                index_file.write(section.tobytes())
+            index_file.write(b''.join(encoded))
+        temp_path.replace(path)
+        return path
+
+
+class LineageIndex:
+    """
+    Read-only view of a saved ColumnLineage, memory-mapped so opening is O(1) and lookups binary search
+    the mapped pages without deserializing the index.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views: List[memoryview] = [memoryview(self._mmap)]
+        magic, version, n_strings, n_column_keys, n_column_postings, n_procs, n_proc_postings = \
+            _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self.close()
+            raise ValueError(f'{self.path} is not a version {_VERSION} lineage index')
+        position = _HEADER.size
+        sizes = [n_strings + 1, n_column_keys, n_column_keys + 1, n_column_postings, n_procs, n_procs,
+                 n_procs + 1, n_proc_postings]
+        sections = []
+        for size in sizes:
+            sections.append(self._uint32(position, size))
+            position += size * 4
+        (self._string_offsets, self._column_keys, self._column_offsets, self._column_postings, self._proc_keys,
+         self._proc_names, self._proc_offsets, self._proc_postings) = sections
+        self._string_data = position
+
+    def _uint32(self, position: int, count: int):
+        view = self._views[0][position:position + count * 4]
+        self._views.append(view)
+        if sys.byteorder == 'little':
+            self._views.append(view.cast('I'))
+            return self._views[-1]
+        values = array('I', view.tobytes())
+        values.byteswap()
+        return values
+
+    def _string_bytes(self, string_id: int) -> bytes:
+        return self._mmap[self._string_data + self._string_offsets[string_id]:
+                          self._string_data + self._string_offsets[string_id + 1]]
+
+    def _string(self, string_id: int) -> str:
+        return self._string_bytes(string_id).decode('utf-8')
+
+    def _find(self, keys, key: str) -> int:
+        target = key.encode('utf-8')
+        low, high = 0, len(keys)
+        while low < high:
+            middle = (low + high) // 2
+            if self._string_bytes(keys[middle]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < len(keys) and self._string_bytes(keys[low]) == target else -1
+
+    def procs_using_column(self, column: str) -> List[str]:
+        """ Procs using a column, given as 'Column' (any table) or 'schema.table.column'. """
+        index = self._find(self._column_keys, _lookup_key(column))
+        if index < 0:
+            return []
+        return [self._string(self._proc_names[proc_index]) for proc_index
+                in self._column_postings[self._column_offsets[index]:self._column_offsets[index + 1]]]
+
+    def tables_for_proc(self, proc_name: str) -> List[str]:
+        index = self._find(self._proc_keys, _lookup_key(proc_name))
+        if index < 0:
+            return []
+        return [self._string(string_id) for string_id
+                in self._proc_postings[self._proc_offsets[index]:self._proc_offsets[index + 1]]]
+
+    def column_keys(self) -> Iterator[str]:
+        return (self._string(string_id) for string_id in self._column_keys)
+
+    def proc_names(self) -> Iterator[str]:
+        return (self._string(string_id) for string_id in self._proc_names)
+
+    def close(self) -> None:
+        # The map cannot close while views of it are exported, so release casts and slices before the base view.
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> 'LineageIndex':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def load_lineage_index(path: Union[str, Path]) -> LineageIndex:
+    return LineageIndex(path)
+
+
+def _query(pool: SqlConnectionPool, sql_query: str, params: Optional[Tuple] = None) -> List:
+    with pool.connection() as conn:
+        cursor = instrument_connection(conn, 'ColumnLineage').cursor()
+        try:
+            if params:
+                cursor.execute(sql_query, params)
+            else:
+                cursor.execute(sql_query)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+class ColumnLineageIndexer:
+    """
+    Build a ColumnLineage for the pool's database. sys.dm_sql_referenced_entities is called once per proc,
+    max_workers procs at a time; procs whose references cannot be resolved are recorded in errors.
+    """
+
+    def __init__(self, pool: SqlConnectionPool, max_workers: Optional[int] = None):
+        self.pool = pool
+        self.max_workers = min(max_workers or pool.max_size, pool.max_size)
+
+    def _references(self, proc_name: str) -> Tuple[str, List, Optional[str]]:
+        try:
+            return proc_name, _query(self.pool, _SQL_REFERENCED_ENTITIES, (proc_name,)), None
+        except Exception as e:
+            return proc_name, [], f'{type(e).__name__}: {e}'
+
+    def build(self) -> ColumnLineage:
+        start = time.perf_counter()
+        lineage = ColumnLineage(self.pool.database)
+        columns = {}
+        for schema, table, column, type_name, max_length, precision, scale, is_nullable in _query(self.pool,
+                                                                                                  _SQL_COLUMNS):
+            columns[f'{schema}.{table}.{column}'.lower()] = ColumnInstance(
+                column, f'{schema}.{table}', SQLColumnType.from_sql_server(type_name), bool(is_nullable), None, '',
+                format_type(type_name, max_length, precision, scale))
+        proc_names = [f'{schema}.{name}' for schema, name in _query(self.pool, _SQL_PROCS)]
+        instanced: Set[str] = set()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ColumnLineage') as executor:
+            for proc_name, rows, error in executor.map(self._references, proc_names):
+                if error:
+                    lineage.errors[proc_name] = error
+                proc = Proc(proc_name, '', self.pool.server, self.pool.database, [], [])
+                lineage.procs[_lookup_key(proc_name)] = proc
+                database_refs, tables = set(), []
+                for referenced_database, schema, entity, minor in rows:
+                    database_refs.add(referenced_database or self.pool.database)
+                    table = f'{schema or "dbo"}.{entity}'
+                    if table not in tables:
+                        tables.append(table)
+                    if minor is None:
+                        continue
+                    key = f'{table}.{minor}'.lower()
+                    instance = columns.get(key) or ColumnInstance(minor, table, SQLColumnType.TEXT, True, None, '')
+                    entry = lineage.entries.get(minor.lower())
+                    if entry is None:
+                        entry = lineage.entries[minor.lower()] = ColumnEntry(minor, instance.sql_column_type, [], [])
+                    if key not in instanced:
+                        instanced.add(key)
+                        entry.column_instance.append(instance)
+                    # A proc's rows arrive together, so it can only already be the last one appended.
+                    if not entry.procs_using or entry.procs_using[-1] is not proc:
+                        entry.procs_using.append(proc)
+                    lineage.column_procs[key].add(proc_name)
+                proc.database_refs = sorted(database_refs)
+                proc.table_list = tables
+        lineage.seconds = time.perf_counter() - start
+        return lineage
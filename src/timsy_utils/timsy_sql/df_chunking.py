@@ -0,0 +1,150 @@
+import importlib.util
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Literal, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+SpillFormat = Literal['parquet', 'feather']
+DtypeMap = Dict[str, Union[str, type]]
+
+_SPILL_ENGINES = {
+    'parquet': ('pyarrow', 'fastparquet'),
+    'feather': ('pyarrow',),
+}
+
+
+def verify_spill_format(spill_format: SpillFormat) -> None:
+    """ Fail before any query runs when the optional writer for spill_format is not installed. """
+    if spill_format not in _SPILL_ENGINES:
+        raise ValueError(f"Unsupported spill format '{spill_format}'. Expected one of {list(_SPILL_ENGINES)}")
+    engines = _SPILL_ENGINES[spill_format]
+    if not any(importlib.util.find_spec(engine) for engine in engines):
+        raise ImportError(f"Spilling to {spill_format} requires one of: {', '.join(engines)}")
+
+
+class DtypePlan:
+    """
+    Column dtypes decided once, from the first chunk, and applied to every later chunk so all chunks (and
+    spilled files) share one schema. A later chunk that does not fit widens the plan: integers are promoted
+    to a dtype holding the new values (float64 once NULLs appear) and category columns gain the new
+    categories. Chunks already yielded keep the narrower dtype, so concat them with union categories.
+    """
+
+    def __init__(self, dtypes: Dict[str, object]):
+        self.dtypes = dtypes
+
+    @classmethod
+    def from_chunk(cls, df: pd.DataFrame, category_columns: Optional[Iterable[str]] = None,
+                   category_threshold: Optional[float] = None, downcast: bool = True,
+                   pinned_columns: Optional[Iterable[str]] = None) -> 'DtypePlan':
+        """
+        - category_columns are always converted to category.
+        - Other object columns become category when unique/len <= category_threshold (0 - 1).
+        - Integer and float columns are downcast to the smallest dtype holding their values.
+        pinned_columns (explicit dtype map keys) are left untouched.
+        """
+        category_columns = set(category_columns or [])
+        pinned_columns = set(pinned_columns or [])
+        row_count = len(df)
+        dtypes = {}
+        for column in df.columns:
+            series = df[column]
+            if column in pinned_columns:
+                continue
+            if column in category_columns or (
+                    category_threshold is not None and row_count and series.dtype == object
+                    and series.nunique(dropna=False) / row_count <= category_threshold):
+                dtypes[column] = pd.CategoricalDtype(pd.Index(series.dropna().unique()))
+            elif downcast and pd.api.types.is_integer_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                dtypes[column] = pd.to_numeric(series, downcast='integer').dtype
+            elif downcast and pd.api.types.is_float_dtype(series):
+                dtypes[column] = pd.to_numeric(series, downcast='float').dtype
+        return cls(dtypes)
+
+    def _fit(self, column: str, series: pd.Series):
+        planned = self.dtypes[column]
+        if isinstance(planned, pd.CategoricalDtype):
+            new = pd.Index(series.dropna().unique()).difference(planned.categories)
+            if len(new):
+                planned = pd.CategoricalDtype(planned.categories.append(new))
+        elif pd.api.types.is_integer_dtype(planned):
+            if pd.api.types.is_float_dtype(series) or not pd.api.types.is_integer_dtype(series):
+                planned = np.dtype(np.float64)
+            elif len(series):
+                needed = pd.to_numeric(series, downcast='integer').dtype
+                planned = np.promote_types(planned, needed)
+        elif pd.api.types.is_float_dtype(planned) and len(series):
+            planned = np.promote_types(planned, pd.to_numeric(series, downcast='float').dtype)
+        self.dtypes[column] = planned
+        return planned
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """ Convert df in place to the plan's dtypes, widening the plan where df does not fit, and return it. """
+        for column in df.columns:
+            if column in self.dtypes:
+                df[column] = df[column].astype(self._fit(column, df[column]))
+        return df
+
+
+def optimize_dtypes(df: pd.DataFrame, category_columns: Optional[Iterable[str]] = None,
+                    category_threshold: Optional[float] = None, downcast: bool = True,
+                    pinned_columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Shrink a single DataFrame in place where possible and return it; see DtypePlan.from_chunk for the rules.
+    For a series of chunks use iter_optimized_chunks, which keeps the dtypes consistent across chunks.
+    """
+    return DtypePlan.from_chunk(df, category_columns, category_threshold, downcast, pinned_columns).apply(df)
+
+
+def spill_chunk(df: pd.DataFrame, spill_dir: Union[str, Path], index: int, spill_format: SpillFormat = 'parquet',
+                prefix: str = 'chunk') -> Path:
+    """ Write one chunk to spill_dir as <prefix>_<index>.<format> and return the path. """
+    spill_dir = Path(spill_dir)
+    spill_dir.mkdir(parents=True, exist_ok=True)
+    path = spill_dir / f'{prefix}_{index:06d}.{spill_format}'
+    if spill_format == 'parquet':
+        df.to_parquet(path, index=False)
+    else:
+        df.reset_index(drop=True).to_feather(path)
+    return path
+
+
+def iter_optimized_chunks(chunks: Iterable[pd.DataFrame], category_columns: Optional[List[str]] = None,
+                          category_threshold: Optional[float] = None, downcast: bool = True,
+                          spill_dir: Union[str, Path, None] = None, spill_format: SpillFormat = 'parquet',
+                          spill_prefix: str = 'chunk', pinned_columns: Optional[Iterable[str]] = None
+                          ) -> Iterator[Union[pd.DataFrame, Path]]:
+    """
+    Optimize each chunk with one DtypePlan taken from the first chunk, so dtypes do not drift between chunks.
+    When spill_dir is set each chunk is written to disk and its path is yielded instead of the DataFrame,
+    so only one chunk is ever held in memory. The spill format is checked here, before any chunk is read.
+    """
+    if spill_dir is not None:
+        verify_spill_format(spill_format)
+    return _iter_optimized_chunks(chunks, category_columns, category_threshold, downcast, spill_dir, spill_format,
+                                  spill_prefix, pinned_columns)
+
+
+def _iter_optimized_chunks(chunks, category_columns, category_threshold, downcast, spill_dir, spill_format,
+                           spill_prefix, pinned_columns) -> Iterator[Union[pd.DataFrame, Path]]:
+    plan: Optional[DtypePlan] = None
+    for index, chunk in enumerate(chunks):
+        if plan is None:
+            plan = DtypePlan.from_chunk(chunk, category_columns, category_threshold, downcast, pinned_columns)
+        chunk = plan.apply(chunk)
+        if spill_dir is not None:
+            yield spill_chunk(chunk, spill_dir, index, spill_format, spill_prefix)
+        else:
+            yield chunk
+
+
+def read_spilled_chunks(paths: Iterable[Union[str, Path]], columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """ Read spilled chunk files back one at a time. """
+    for path in paths:
+        path = Path(path)
+        if path.suffix == '.feather':
+            yield pd.read_feather(path, columns=columns)
+        else:
+            yield pd.read_parquet(path, columns=columns)
+
@@ -0,0 +1,250 @@
+import copy
+import heapq
+import threading
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .sql_instrumentation import instrument_connection
+from .sql_models.join_table import JoinTable
+from .sql_models.join_types import JoinType
+from .sql_models.on_clause import on_clause
+from .sql_models.sql_model_helpers import add_square_bracket, format_from
+from .sql_models.table_relationship import TableRelationship
+from .sql_pool import SqlConnectionPool
+
+_SQL_FOREIGN_KEYS = """
+SELECT fk.object_id, ps.name, pt.name, pc.name, rs.name, rt.name, rc.name
+FROM sys.foreign_key_columns fkc
+JOIN sys.foreign_keys fk ON fk.object_id = fkc.constraint_object_id
+JOIN sys.tables pt ON pt.object_id = fkc.parent_object_id
+JOIN sys.schemas ps ON ps.schema_id = pt.schema_id
+JOIN sys.columns pc ON pc.object_id = fkc.parent_object_id AND pc.column_id = fkc.parent_column_id
+JOIN sys.tables rt ON rt.object_id = fkc.referenced_object_id
+JOIN sys.schemas rs ON rs.schema_id = rt.schema_id
+JOIN sys.columns rc ON rc.object_id = fkc.referenced_object_id AND rc.column_id = fkc.referenced_column_id
+ORDER BY fk.object_id, fkc.constraint_column_id
+"""
+
+
+def _table_key(name: str) -> str:
+    name = name.replace('[', '').replace(']', '').strip().lower()
+    return name if '.' in name else f'dbo.{name}'
+
+
+@dataclass(frozen=True)
+class _Edge:
+    source: str
+    target: str
+    source_columns: Tuple[str, ...]
+    target_columns: Tuple[str, ...]
+    cost: float
+
+
+@dataclass
+class JoinPlan:
+    """ Join tree connecting the requested tables: root table first, then one JoinTable per joined table. """
+    root: str
+    tables: List[str]
+    joins: List[JoinTable] = field(default_factory=list)
+    cost: float = 0.0
+    root_alias: Optional[str] = None
+
+    def sql(self) -> str:
+        """ The FROM ... JOIN chain. """
+        schema, table = self.root.split('.', 1)
+        return format_from(schema, table, self.root_alias) + ''.join(join.format_join() for join in self.joins)
+
+
+class JoinGraph:
+    """
+    Undirected graph of tables joined by foreign keys or declared TableRelationships.
+    plan() connects a set of tables along the cheapest join edges; the max_cached_plans most recently used
+    results are cached per (table set, root, join type, aliases) until the graph changes. Callers get copies.
+    """
+
+    def __init__(self, max_cached_plans: int = 256):
+        self.max_cached_plans = max_cached_plans
+        self._names: Dict[str, Tuple[str, str]] = {}
+        self._edges: Dict[str, List[_Edge]] = defaultdict(list)
+        self._table_costs: Dict[str, float] = {}
+        self._aliases: Dict[str, str] = {}
+        self._by_table_name: Dict[str, List[str]] = defaultdict(list)
+        self._cache: OrderedDict[Tuple, JoinPlan] = OrderedDict()
+        self._lock = threading.RLock()
+
+    @property
+    def tables(self) -> List[str]:
+        return [f'{schema}.{table}' for schema, table in self._names.values()]
+
+    def _register(self, schema: Optional[str], table: str) -> str:
+        schema = (schema or 'dbo').strip('[]')
+        table = table.strip('[]')
+        key = _table_key(f'{schema}.{table}')
+        if key not in self._names:
+            self._names[key] = (schema, table)
+            self._by_table_name[key.split('.', 1)[1]].append(key)
+        return key
+
+    def resolve(self, table_name: str) -> str:
+        """ Graph key of a table given as 'schema.table' or an unambiguous bare table name. """
+        name = table_name.replace('[', '').replace(']', '').strip().lower()
+        if '.' in name:
+            if name not in self._names:
+                raise KeyError(f'Table {table_name} is not in the join graph')
+            return name
+        keys = self._by_table_name.get(name, [])
+        if len(keys) != 1:
+            raise KeyError(f'Table {table_name} is {"ambiguous" if keys else "not in the join graph"}: {keys}')
+        return keys[0]
+
+    def add_join(self, source_schema: Optional[str], source_table: str, source_columns: Sequence[str],
+                 target_schema: Optional[str], target_table: str, target_columns: Sequence[str],
+                 cost: float = 1.0) -> None:
+        if len(source_columns) != len(target_columns) or not source_columns:
+            raise ValueError('Join needs matching, non empty source and target column lists')
+        with self._lock:
+            source = self._register(source_schema, source_table)
+            target = self._register(target_schema, target_table)
+            self._edges[source].append(_Edge(source, target, tuple(source_columns), tuple(target_columns), cost))
+            self._edges[target].append(_Edge(target, source, tuple(target_columns), tuple(source_columns), cost))
+            self._cache.clear()
+
+    def add_relationship(self, relationship: TableRelationship, cost: float = 1.0) -> None:
+        """ Declared aliases become the tables' default aliases in plan(). """
+        table_a, table_b = relationship.table_a, relationship.table_b
+        with self._lock:
+            self.add_join(table_a.get('schema'), table_a['table'], [table_a['column']],
+                          table_b.get('schema'), table_b['table'], [table_b['column']], cost)
+            for table in (table_a, table_b):
+                if table.get('alias'):
+                    self.set_table_alias(f"{table.get('schema') or 'dbo'}.{table['table']}", table['alias'])
+
+    def set_table_alias(self, table_name: str, alias: str) -> None:
+        """ Default alias for table_name in plans; aliases passed to plan() take precedence. """
+        with self._lock:
+            key = self.resolve(table_name)
+            current = self._aliases.get(key)
+            if current is not None and current != alias:
+                raise ValueError(f'Table {table_name} already has alias {current}, not {alias}')
+            self._aliases[key] = alias
+            self._cache.clear()
+
+    def add_foreign_key_rows(self, rows: Iterable[Sequence], cost: float = 1.0) -> int:
+        """
+        Add joins from (constraint id, parent schema, parent table, parent column, referenced schema,
+        referenced table, referenced column) rows ordered by constraint; composite keys become one join.
+        Returns the number of foreign keys added.
+        """
+        foreign_keys: Dict[object, List[Sequence]] = {}
+        for row in rows:
+            foreign_keys.setdefault(row[0], []).append(row)
+        for fk_rows in foreign_keys.values():
+            first = fk_rows[0]
+            self.add_join(first[1], first[2], [row[3] for row in fk_rows],
+                          first[4], first[5], [row[6] for row in fk_rows], cost)
+        return len(foreign_keys)
+
+    @classmethod
+    def from_foreign_keys(cls, pool: SqlConnectionPool) -> 'JoinGraph':
+        """ Build the graph from every foreign key in the pool's database. """
+        with pool.connection() as conn:
+            cursor = instrument_connection(conn, 'JoinGraph').cursor()
+            try:
+                cursor.execute(_SQL_FOREIGN_KEYS)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        graph = cls()
+        graph.add_foreign_key_rows(rows)
+        return graph
+
+    def set_table_cost(self, table_name: str, cost: float) -> None:
+        """ Extra cost for routing a join through table_name, e.g. to avoid very large tables as bridges. """
+        with self._lock:
+            self._table_costs[self.resolve(table_name)] = cost
+            self._cache.clear()
+
+    def _nearest(self, tree: Dict[str, Optional[_Edge]], targets: set) -> Tuple[str, List[_Edge], float]:
+        """ Multi-source Dijkstra from every tree table to the closest target; returns the edges tree -> target. """
+        distances = {table: 0.0 for table in tree}
+        previous: Dict[str, _Edge] = {}
+        heap = [(0.0, table) for table in tree]
+        heapq.heapify(heap)
+        while heap:
+            distance, table = heapq.heappop(heap)
+            if distance > distances.get(table, float('inf')):
+                continue
+            if table in targets:
+                found, path = table, []
+                while table not in tree:
+                    edge = previous[table]
+                    path.append(edge)
+                    table = edge.source
+                return found, path[::-1], distance
+            for edge in self._edges.get(table, []):
+                next_distance = distance + edge.cost + self._table_costs.get(edge.target, 0.0)
+                if next_distance < distances.get(edge.target, float('inf')):
+                    distances[edge.target] = next_distance
+                    previous[edge.target] = edge
+                    heapq.heappush(heap, (next_distance, edge.target))
+        raise ValueError(f'No join path connects {sorted(tree)} to {sorted(targets)}')
+
+    def plan(self, tables: Iterable[str], root: Optional[str] = None, join_type: JoinType = JoinType.INNER_JOIN,
+             aliases: Optional[Dict[str, str]] = None) -> JoinPlan:
+        """
+        Join tree covering every table in tables, starting FROM root (default: the first table).
+        Two tables get the cheapest path; more tables grow the tree by repeatedly attaching the nearest missing
+        table, the usual shortest path approximation of the Steiner tree.
+        """
+        required = [self.resolve(table) for table in tables]
+        if not required:
+            raise ValueError('No tables to join')
+        root_key = self.resolve(root) if root else required[0]
+        explicit = {self.resolve(table): alias for table, alias in (aliases or {}).items()}
+        with self._lock:
+            alias_items = tuple(sorted({**self._aliases, **explicit}.items()))
+            cache_key = (frozenset(required), root_key, join_type, alias_items)
+            plan = self._cache.get(cache_key)
+            if plan is not None:
+                self._cache.move_to_end(cache_key)
+            else:
+                plan = self._plan(set(required), root_key, join_type, dict(alias_items))
+                self._cache[cache_key] = plan
+                while len(self._cache) > self.max_cached_plans:
+                    self._cache.popitem(last=False)
+            return copy.deepcopy(plan)
+
+    def _plan(self, required: set, root: str, join_type: JoinType, aliases: Dict[str, str]) -> JoinPlan:
+        tree: Dict[str, Optional[_Edge]] = {root: None}
+        plan = JoinPlan(self._display(root), [self._display(root)], root_alias=add_square_bracket(aliases.get(root)))
+        remaining = required - {root}
+        while remaining:
+            target, path, distance = self._nearest(tree, remaining)
+            plan.cost += distance
+            for edge in path:
+                tree[edge.target] = edge
+                plan.tables.append(self._display(edge.target))
+                plan.joins.append(self._join_table(edge, join_type, aliases))
+            remaining -= set(tree)
+        return plan
+
+    def _display(self, key: str) -> str:
+        schema, table = self._names[key]
+        return f'{schema}.{table}'
+
+    def _join_table(self, edge: _Edge, join_type: JoinType, aliases: Dict[str, str]) -> JoinTable:
+        source_schema, source_table = self._names[edge.source]
+        target_schema, target_table = self._names[edge.target]
+        return JoinTable(join_type,
+                         on_clause(source_schema, source_table, edge.source_columns[0], list(edge.source_columns),
+                                   alias=aliases.get(edge.source)),
+                         on_clause(target_schema, target_table, edge.target_columns[0], list(edge.target_columns),
+                                   alias=aliases.get(edge.target)))
+
+    def cache_size(self) -> int:
+        return len(self._cache)
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
@@ -0,0 +1,353 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Literal, Optional, Sequence, Set, Union
+
+import pandas as pd
+
+from .df_chunking import verify_spill_format
+
+DiskFormat = Literal['pickle', 'parquet']
+
+# Tag of entries whose tables could not be determined from the SQL; any invalidation drops them.
+UNKNOWN_TABLES = '*'
+
+_NAME = r'(?:\[[^\]]+\]|[\w#@$]+)(?:\s*\.\s*(?:\[[^\]]+\]|[\w#@$]+))*'
+_TABLE_PATTERN = re.compile(r'\b(FROM|JOIN|UPDATE|INTO|MERGE)\s+(' + _NAME + r')(\s*\()?', re.IGNORECASE)
+# What may follow a FROM list item before the comma: optional [AS] alias, then optional WITH (hints).
+_ALIAS_AND_HINTS = (r'(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|INNER|LEFT|RIGHT|FULL|CROSS|OUTER|ON|GROUP|ORDER|HAVING|UNION|'
+                    r'EXCEPT|INTERSECT|OPTION|FOR|WITH|SELECT|SET|PIVOT|UNPIVOT)\b)(?:\[[^\]]+\]|\w+))?'
+                    r'(?:\s*WITH\s*\((?:[^()]|\([^()]*\))*\))?')
+# A further item of a comma separated FROM list.
+_NEXT_FROM_ITEM = re.compile(_ALIAS_AND_HINTS + r'\s*,\s*(' + _NAME + r')(\s*\()?', re.IGNORECASE)
+# The list goes on with something _NEXT_FROM_ITEM cannot read, such as a derived table.
+_FROM_LIST_GAP = re.compile(_ALIAS_AND_HINTS + r'\s*,', re.IGNORECASE)
+# Dynamic SQL hides the tables it touches; derived tables and APPLY are not followed.
+_UNSURE_PATTERN = re.compile(r'\b(?:EXEC|EXECUTE|sp_executesql|APPLY)\b|\bFROM\s*\(', re.IGNORECASE)
+
+
+def normalize_table_name(table_name: str) -> str:
+    return '.'.join(part.strip().strip('[]').lower() for part in table_name.split('.'))
+
+
+def referenced_tables(sql_query: str) -> Set[str]:
+    """
+    Best effort set of normalized table names following FROM (every item of a comma separated list, table
+    hints allowed) and JOIN/UPDATE/INTO/MERGE. When the tables cannot be determined (none found, dynamic SQL,
+    a derived table, APPLY, a table valued function or OPENQUERY) the set is {UNKNOWN_TABLES}.
+    """
+    if _UNSURE_PATTERN.search(sql_query):
+        return {UNKNOWN_TABLES}
+    tables = set()
+    for match in _TABLE_PATTERN.finditer(sql_query):
+        items = [(match.group(2), match.group(3))]
+        if match.group(1).upper() == 'FROM':
+            position = match.end()
+            while True:
+                item = _NEXT_FROM_ITEM.match(sql_query, position)
+                if item is None:
+                    break
+                items.append((item.group(1), item.group(2)))
+                position = item.end()
+            if _FROM_LIST_GAP.match(sql_query, position):
+                return {UNKNOWN_TABLES}
+        for name, call in items:
+            if call:
+                return {UNKNOWN_TABLES}
+            tables.add(normalize_table_name(name))
+    return tables or {UNKNOWN_TABLES}
+
+
+def _same_table(cached: str, name: str) -> bool:
+    """
+    Whether two normalized names can denote the same table: the shorter is a trailing part of the longer,
+    so 'product', 'production.product' and 'db.production.product' all match while 'sales.product' does not
+    match 'production.product'. Unqualified SQL may resolve to any schema, so this errs towards a match.
+    """
+    if cached == UNKNOWN_TABLES:
+        return True
+    cached_parts, name_parts = cached.split('.'), name.split('.')
+    shorter = min(len(cached_parts), len(name_parts))
+    return cached_parts[-shorter:] == name_parts[-shorter:]
+
+
+def make_cache_key(server: str, database: str, sql_query: str, params: Optional[Sequence] = None) -> str:
+    sql_hash = hashlib.sha256(sql_query.encode('utf-8')).hexdigest()
+    raw = json.dumps([server, database, sql_hash, list(params) if params is not None else None], default=repr)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    memory_hits: int = 0
+    disk_hits: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+    memory_bytes: int = 0
+    memory_entries: int = 0
+    disk_entries: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass
+class _Entry:
+    expires_at: float
+    tables: Set[str] = field(default_factory=set)
+    df: Optional[pd.DataFrame] = None
+    size: int = 0
+    # Whether the data file is written; a put's disk write runs outside the lock.
+    on_disk: bool = False
+
+
+class QueryResultCache:
+    """
+    Opt-in two tier cache of query DataFrames keyed by (server, database, SQL hash, params).
+    The memory tier is an LRU bounded by max_memory_bytes; with disk_dir set, results are also written
+    through to pickle/parquet files that survive restarts. Entries expire after their TTL and can be
+    dropped by any table name the query references; entries whose tables are unknown are dropped by any
+    table invalidation.
+    """
+
+    def __init__(self, max_memory_bytes: int = 256 * 1024 * 1024, default_ttl: float = 300.0,
+                 disk_dir: Union[str, Path, None] = None, disk_format: DiskFormat = 'pickle',
+                 copy_on_get: bool = True):
+        if disk_format == 'parquet':
+            verify_spill_format('parquet')
+        self.max_memory_bytes = max_memory_bytes
+        self.default_ttl = default_ttl
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_format = disk_format
+        self.copy_on_get = copy_on_get
+        self._entries: Dict[str, _Entry] = {}
+        self._lru: OrderedDict[str, None] = OrderedDict()
+        self._memory_bytes = 0
+        self._stats = CacheStats()
+        self._lock = threading.RLock()
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._load_disk_index()
+
+    # --- Disk tier ---
+    @property
+    def _index_path(self) -> Path:
+        return self.disk_dir / 'index.json'
+
+    def _data_path(self, key: str) -> Path:
+        return self.disk_dir / f'{key}.{"pkl" if self.disk_format == "pickle" else "parquet"}'
+
+    def _load_disk_index(self) -> None:
+        if not self._index_path.exists():
+            return
+        index = json.loads(self._index_path.read_text())
+        now = time.time()
+        for key, meta in index.items():
+            if meta['expires_at'] > now and self._data_path(key).exists():
+                self._entries[key] = _Entry(meta['expires_at'], set(meta['tables']), on_disk=True)
+
+    def _write_disk_index(self) -> None:
+        index = {key: {'expires_at': entry.expires_at, 'tables': sorted(entry.tables)}
+                 for key, entry in self._entries.items() if entry.on_disk}
+        temp_path = self._index_path.with_suffix('.tmp')
+        temp_path.write_text(json.dumps(index))
+        temp_path.replace(self._index_path)
+
+    def _write_disk(self, key: str, df: pd.DataFrame) -> None:
+        path = self._data_path(key)
+        # Unique temp name: concurrent puts of one key each write their own file, the last replace wins.
+        temp_path = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+        if self.disk_format == 'pickle':
+            with open(temp_path, 'wb') as data_file:
+                pickle.dump(df, data_file, protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            df.to_parquet(temp_path)
+        os.replace(temp_path, path)
+
+    def _read_disk(self, key: str) -> Optional[pd.DataFrame]:
+        path = self._data_path(key)
+        try:
+            if self.disk_format == 'pickle':
+                with open(path, 'rb') as data_file:
+                    return pickle.load(data_file)
+            return pd.read_parquet(path)
+        except FileNotFoundError:
+            # Never written, or removed by an invalidation since the entry was looked up.
+            return None
+
+    # --- Memory tier ---
+    def _drop_from_memory(self, key: str) -> None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.df is not None:
+            self._memory_bytes -= entry.size
+            entry.df = None
+            entry.size = 0
+        self._lru.pop(key, None)
+
+    def _remove(self, key: str) -> None:
+        self._drop_from_memory(key)
+        self._entries.pop(key, None)
+        if self.disk_dir is not None:
+            self._data_path(key).unlink(missing_ok=True)
+
+    def _hold_in_memory(self, key: str, entry: _Entry, df: pd.DataFrame, size: int) -> None:
+        if size > self.max_memory_bytes:
+            return
+        entry.df = df
+        entry.size = size
+        self._memory_bytes += size
+        self._lru[key] = None
+        self._lru.move_to_end(key)
+        while self._memory_bytes > self.max_memory_bytes and self._lru:
+            oldest = next(iter(self._lru))
+            self._drop_from_memory(oldest)
+            if self.disk_dir is None:
+                self._entries.pop(oldest, None)
+            self._stats.evictions += 1
+
+    # --- Public API ---
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats.misses += 1
+                return None
+            if entry.expires_at <= time.time():
+                self._remove(key)
+                self._stats.expirations += 1
+                self._stats.misses += 1
+                if self.disk_dir is not None:
+                    self._write_disk_index()
+                return None
+            if entry.df is not None:
+                self._lru.move_to_end(key)
+                self._stats.hits += 1
+                self._stats.memory_hits += 1
+                df = entry.df
+                return df.copy() if self.copy_on_get else df
+            if not entry.on_disk:
+                # Put by another thread that is still writing the file.
+                self._stats.misses += 1
+                return None
+        # Loading from disk can be slow, so it runs without the lock; other keys are served meanwhile.
+        df = self._read_disk(key)
+        with self._lock:
+            if self._entries.get(key) is not entry:
+                # Invalidated or replaced while reading: the loaded frame may be stale.
+                self._stats.misses += 1
+                return None
+            if df is None:
+                self._entries.pop(key, None)
+                self._stats.misses += 1
+                return None
+            self._stats.hits += 1
+            self._stats.disk_hits += 1
+            if entry.df is None:
+                self._hold_in_memory(key, entry, df, frame_bytes(df))
+        return df.copy() if self.copy_on_get else df
+
+    def put(self, key: str, df: pd.DataFrame, ttl: Optional[float] = None,
+            tables: Optional[Iterable[str]] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        entry = _Entry(time.time() + ttl, {normalize_table_name(table) for table in tables or []})
+        stored = df.copy() if self.copy_on_get else df
+        size = frame_bytes(stored)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._hold_in_memory(key, entry, stored, size)
+            if self.disk_dir is None:
+                if entry.df is None:
+                    # Too large for memory and no disk tier: nothing to keep.
+                    self._entries.pop(key, None)
+                return
+        # The file write can be slow, so it runs without the lock; gets meanwhile are served from memory.
+        try:
+            self._write_disk(key, stored)
+        except Exception:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._remove(key)
+            raise
+        with self._lock:
+            if self._entries.get(key) is entry:
+                entry.on_disk = True
+                self._write_disk_index()
+            elif key not in self._entries:
+                # Invalidated while writing.
+                self._data_path(key).unlink(missing_ok=True)
+
+    def get_or_load(self, server: str, database: str, sql_query: str, params: Optional[Sequence],
+                    loader: Callable[[], pd.DataFrame], ttl: Optional[float] = None,
+                    tables: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        Return the cached result for the query or run loader and cache it.
+        Tables default to those found after FROM/JOIN in the SQL text.
+        """
+        key = make_cache_key(server, database, sql_query, params)
+        df = self.get(key)
+        if df is not None:
+            return df
+        df = loader()
+        self.put(key, df, ttl, tables if tables is not None else referenced_tables(sql_query))
+        return df
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self._stats.invalidations += 1
+                if self.disk_dir is not None:
+                    self._write_disk_index()
+
+    def invalidate_table(self, table_name: str) -> int:
+        """
+        Drop every entry whose query references table_name, and every entry whose tables are unknown.
+        'Product' matches 'production.product'; 'Production.Product' matches that schema and queries that
+        name the table without a schema, but not 'sales.product'. Returns the number of entries dropped.
+        """
+        name = normalize_table_name(table_name)
+        with self._lock:
+            keys = [key for key, entry in self._entries.items()
+                    if any(_same_table(table, name) for table in entry.tables)]
+            for key in keys:
+                self._remove(key)
+            self._stats.invalidations += len(keys)
+            if keys and self.disk_dir is not None:
+                self._write_disk_index()
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+            if self.disk_dir is not None:
+                self._write_disk_index()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            snapshot = CacheStats(**vars(self._stats))
+            snapshot.memory_bytes = self._memory_bytes
+            snapshot.memory_entries = len(self._lru)
+            snapshot.disk_entries = len(self._entries) if self.disk_dir is not None else 0
+        return snapshot
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._entries)
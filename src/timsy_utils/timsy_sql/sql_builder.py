@@ -1,115 +1,312 @@
+import copy
+from collections.abc import Set
+from dataclasses import dataclass
 from enum import Enum
-from typing import List, TypeVar
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple, TypeVar
 
 T = TypeVar('T')
 
+# Operators whose value is a sequence expanded to one placeholder per item.
+_LIST_OPERATORS = ('IN', 'NOT IN')
+
 class OrderByEnum(Enum):
     ASC = "ASC"
     DESC = "DESC"
 
 class SqlWhereClause:
+    """
+    Immutable column / operator / value condition; with_value() returns a copy with a new value of the same type.
+    Statements share their clauses, so a clause never changes once built.
+    """
+
     def __init__(self, column: str, value: T, operator: str = "="):
         self.column = column
-        self._value = value
         self.operator = operator
+        self._check_list_value(value)
+        # A caller's list could still be changed after the fact; keep a tuple of its values.
+        self._value = tuple(value) if operator.upper() in _LIST_OPERATORS else value
         self._type = type(value)
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError("SqlWhereClause is immutable; use with_value() or SqlStatement.with_where_value()")
+        super().__setattr__(name, value)
+
+    def _check_list_value(self, value) -> None:
+        """ IN / NOT IN take a non-empty list, tuple or set; a str would otherwise be split into characters. """
+        if self.operator.upper() not in _LIST_OPERATORS:
+            return
+        if isinstance(value, (str, bytes)) or not isinstance(value, (Sequence, Set)):
+            raise TypeError(f"{self.operator} expects a list, tuple or set of values, got {type(value).__name__}")
+        if not value:
+            raise ValueError(f"{self.operator} needs at least one value")
 
     @property
     def value(self):
         return self._value
 
-    @value.setter
-    def value(self, new_value):
+    def with_value(self, new_value) -> 'SqlWhereClause':
         if not isinstance(new_value, self._type):
             raise TypeError(f"Expected value of type {self._type}, got {type(new_value)}")
-        self._value = new_value
+        return SqlWhereClause(self.column, new_value, self.operator)
 
     def __str__(self):
-        if isinstance(self._value, str):
-            return f"{self.column} {self.operator} '{self.value}'"
-        else:
-            return f"{self.column} {self.operator} {self.value}"
+        if self.operator.upper() in _LIST_OPERATORS:
+            return f"{self.column} {self.operator} ({', '.join(_literal(value) for value in self._value)})"
+        return f"{self.column} {self.operator} {_literal(self._value)}"
 
     def __repr__(self):
         return str(self)
 
+    @property
+    def params(self) -> Tuple:
+        if self.operator.upper() in _LIST_OPERATORS:
+            return tuple(self._value)
+        return (self._value,)
+
+    @property
+    def shape(self) -> Tuple[str, str, int]:
+        """ Column, operator and placeholder count; everything but the values. """
+        return self.column, self.operator, len(self.params)
+
+
+def _placeholder_condition(column: str, operator: str, count: int) -> str:
+    if operator.upper() in _LIST_OPERATORS:
+        return f"{column} {operator} ({', '.join('?' for _ in range(count))})"
+    return f"{column} {operator} ?"
+
+
+def _literal(value) -> str:
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return str(value)
+
+
+def _keyset_condition(columns: Sequence[str], direction: str, values: Optional[Sequence] = None) -> str:
+    """
+    Seek predicate for rows after the key values in ORDER BY order, e.g. for (a, b) ascending
+    a >= ? AND (a > ? OR (a = ? AND b > ?)). The leading a >= ? is redundant but sargable, so the
+    index seeks straight to the page instead of scanning the rows before it.
+    Placeholders are filled from values (inlined as literals) when given.
+    """
+    values = iter(values) if values is not None else None
+
+    def param() -> str:
+        return _literal(next(values)) if values is not None else "?"
+
+    strict, inclusive = ('<', '<=') if direction == OrderByEnum.DESC.value else ('>', '>=')
+    if len(columns) == 1:
+        return f"{columns[0]} {strict} {param()}"
+    leading = f"{columns[0]} {inclusive} {param()}"
+    branches = []
+    for position, column in enumerate(columns):
+        equals = [f"{previous} = {param()}" for previous in columns[:position]]
+        branch = ' AND '.join(equals + [f"{column} {strict} {param()}"])
+        branches.append(f"({branch})" if equals else branch)
+    return f"{leading} AND ({' OR '.join(branches)})"
+
+
+def _keyset_params(after: Sequence) -> Tuple:
+    """ Parameters of _keyset_condition in placeholder order. """
+    params = [after[0]] if len(after) > 1 else []
+    for position in range(len(after)):
+        params.extend(after[:position + 1])
+    return tuple(params)
+
+
+@dataclass(frozen=True)
+class CompiledStatement:
+    """
+    ?-parameterized SQL and its parameters. The SQL text is identical for every statement of the same
+    shape, so SQL Server can reuse one cached plan; use bind() to run it again with new values.
+    """
+    sql: str
+    params: Tuple = ()
+
+    def bind(self, *params) -> 'CompiledStatement':
+        if len(params) != len(self.params):
+            raise ValueError(f"Expected {len(self.params)} parameters, got {len(params)}")
+        return CompiledStatement(self.sql, tuple(params))
+
+    def __iter__(self):
+        """ Allows cursor.execute(*compiled). """
+        return iter((self.sql, self.params))
+
+
+@lru_cache(maxsize=1024)
+def _compile_shape(shape: Tuple) -> str:
+    (columns, table_name, where_shapes, group_by, order_by, order_direction, has_top, keyset_columns,
+     has_keyset_after, has_offset) = shape
+    sql = "SELECT "
+    if has_top:
+        sql += "TOP(?)"
+    sql += "\n\t" + '\n\t,'.join(columns) + "\nFROM " + table_name
+    conditions = [_placeholder_condition(*where) for where in where_shapes]
+    if has_keyset_after:
+        conditions.append(f"({_keyset_condition(keyset_columns, order_direction)})")
+    if conditions:
+        sql += "\n\tWHERE " + '\n\tAND '.join(conditions)
+    if group_by:
+        sql += "\n\tGROUP BY " + ', '.join(group_by)
+    if keyset_columns:
+        # The seek predicate follows every key column in the same direction, so ORDER BY must too.
+        sql += "\n\tORDER BY " + ', '.join(f"{column} {order_direction}" for column in keyset_columns)
+    elif order_by:
+        sql += "\n\tORDER BY " + f"{', '.join(order_by)} {order_direction}"
+    if has_offset:
+        sql += "\n\tOFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+    return sql
+
+
+def compiled_cache_info():
+    """ Hit/miss counters of the compiled statement text cache. """
+    return _compile_shape.cache_info()
+
 
 
 class SqlStatement:
+    """
+    Immutable SELECT builder: add_where_clause, add_group_by, add_order_by, set_* return a new statement and
+    leave this one unchanged, so one base statement can be extended and compiled many times.
+    This changed from the earlier in-place builder: statement.add_where_clause(...) on its own no longer does
+    anything, the result has to be assigned (statement = statement.add_where_clause(...)).
+    """
+
     def __init__(self, source_identifier: str, database_name:str, schema_name: str, table_name: str, columns: str | List[str] = None):
         if source_identifier is None and (database_name is None or schema_name is None or table_name is None):
             raise ValueError("Required source_identifier or all of the following: database_name, schema_name, "
                              "and table_name must be provided")
 
         if columns is None:
-            self.columns =["*"]
+            self.columns = ("*",)
         else:
-            self.columns = [columns] if isinstance(columns, str) else columns
-        # if isinstance(columns, str):
-        #     self.columns = [columns]
-        # else:
-        #     self.columns = columns
+            self.columns = (columns,) if isinstance(columns, str) else tuple(columns)
         self._source_identifier: str = None
         self.database_name: str = database_name
         self.schema_name: str = schema_name
         self.table_name: str = table_name
-        self.where_clause: List[SqlWhereClause] = None
-        self.group_by: List[str] = None
-        self.order_by: List[str] = None
+        self.where_clause: Tuple[SqlWhereClause, ...] = None
+        self.group_by: Tuple[str, ...] = None
+        self.order_by: Tuple[str, ...] = None
         self.order_direction: OrderByEnum = OrderByEnum.ASC
         self.top: int = None
+        self.keyset_columns: Tuple[str, ...] = None
+        self.keyset_after: Tuple = None
+        self.offset: int = None
+        self.fetch: int = None
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError("SqlStatement is immutable; use the add_*/set_* methods, which return a copy")
+        super().__setattr__(name, value)
+
+    def _replace(self, **changes) -> 'SqlStatement':
+        statement = copy.copy(self)
+        statement.__dict__.update(changes)
+        return statement
 
     def __str__(self):
         return self.build_sql()
 
-    def add_where_clause(self, column: str, value: T, operator: str = "="):
-        if self.where_clause is None:
-            self.where_clause = []
-        self.where_clause.append(SqlWhereClause(column, value, operator))
+    def add_where_clause(self, column: str, value: T, operator: str = "=") -> 'SqlStatement':
+        return self._replace(where_clause=(self.where_clause or ()) + (SqlWhereClause(column, value, operator),))
 
-    def add_group_by(self, column: str | List[str]) -> None:
-        if self.group_by is None:
-            self.group_by = []
-        if isinstance(column, str):
-            self.group_by.append(column)
-        else:
-            self.group_by.extend(column)
+    def with_where_value(self, index: int, value: T) -> 'SqlStatement':
+        """ Copy with a new value for the index-th where clause (same column, operator and value type). """
+        where_clause = list(self.where_clause or ())
+        where_clause[index] = where_clause[index].with_value(value)
+        return self._replace(where_clause=tuple(where_clause))
 
+    def add_group_by(self, column: str | List[str]) -> 'SqlStatement':
+        columns = (column,) if isinstance(column, str) else tuple(column)
+        return self._replace(group_by=(self.group_by or ()) + columns)
 
-    def add_order_by(self, column: str | List[str]) -> None:
-        if self.order_by is None:
-            self.order_by = []
-        if isinstance(column, str):
-            self.order_by.append(column)
-        else:
-            self.order_by.extend(column)
+    def add_order_by(self, column: str | List[str]) -> 'SqlStatement':
+        columns = (column,) if isinstance(column, str) else tuple(column)
+        return self._replace(order_by=(self.order_by or ()) + columns)
+
+    def set_ordered_direction(self, direction: OrderByEnum) -> 'SqlStatement':
+        return self._replace(order_direction=direction)
+
+    def set_top(self, top: int) -> 'SqlStatement':
+        """ TOP(top); replaces OFFSET/FETCH, which cannot be combined with it. """
+        return self._replace(top=top, offset=None, fetch=None)
 
+    def set_keyset(self, columns: str | List[str], page_size: int, after: Optional[Sequence] = None
+                   ) -> 'SqlStatement':
+        """
+        Keyset (seek) paging: ORDER BY columns, TOP(page_size) and, with after, only rows past those key values.
+        columns must be unique together. Each page seeks from the previous page's last key, so page 1000
+        costs the same as page 1.
+        """
+        columns = (columns,) if isinstance(columns, str) else tuple(columns)
+        if after is not None and len(after) != len(columns):
+            raise ValueError(f"Expected {len(columns)} key values, got {len(after)}")
+        return self._replace(offset=None, fetch=None, keyset_columns=columns,
+                             keyset_after=tuple(after) if after is not None else None, order_by=columns,
+                             top=page_size)
 
-    def set_ordered_direction(self, direction: OrderByEnum):
-        self.order_direction = direction
+    def set_offset_fetch(self, offset: int, fetch: int) -> 'SqlStatement':
+        """
+        OFFSET offset ROWS FETCH NEXT fetch ROWS ONLY. Needs an ORDER BY and replaces TOP; the server still reads
+        and discards the skipped rows, so prefer set_keyset for deep pages.
+        """
+        return self._replace(keyset_columns=None, keyset_after=None, top=None, offset=offset, fetch=fetch)
 
-    def set_top(self, top: int):
-        self.top = top
+    def _validate_paging(self):
+        if self.offset is not None and not self.order_by:
+            raise ValueError("OFFSET/FETCH requires an ORDER BY")
 
     def build_sql(self) -> str:
+        """ Build SQL with literal values inlined. Does not modify the statement, so it can be rebuilt. """
+        self._validate_paging()
         sql = "SELECT "
         if self.top:
             sql += f"TOP({self.top})"
         sql += "\n\t" + '\n\t,'.join(self.columns) + "\nFROM " + self.table_name
-        if self.where_clause:
-            if isinstance(self.where_clause, list):
-                self.where_clause = '\n\tAND '.join([ str(condition) for condition in self.where_clause])
-            sql += "\n\tWHERE " + self.where_clause
+        conditions = [str(condition) for condition in self.where_clause or []]
+        if self.keyset_after is not None:
+            seek = _keyset_condition(self.keyset_columns, self.order_direction.value, _keyset_params(self.keyset_after))
+            conditions.append(f"({seek})")
+        if conditions:
+            sql += "\n\tWHERE " + '\n\tAND '.join(conditions)
         if self.group_by:
-            if isinstance(self.group_by, list):
-                self.group_by = ', '.join(self.group_by)
-            sql += "\n\tGROUP BY " + self.group_by
-        if self.order_by:
-            if isinstance(self.order_by, list):
-                self.order_by = ', '.join(self.order_by)
-            sql += "\n\tORDER BY " + f"{self.order_by} {self.order_direction.value}"
+            sql += "\n\tGROUP BY " + ', '.join(self.group_by)
+        if self.keyset_columns:
+            sql += "\n\tORDER BY " + ', '.join(f"{column} {self.order_direction.value}" for column in self.keyset_columns)
+        elif self.order_by:
+            sql += "\n\tORDER BY " + f"{', '.join(self.order_by)} {self.order_direction.value}"
+        if self.offset is not None:
+            sql += f"\n\tOFFSET {self.offset} ROWS FETCH NEXT {self.fetch} ROWS ONLY"
         return sql
 
+    @property
+    def shape(self) -> Tuple:
+        """ Hashable description of the statement without its values; the compile cache key. """
+        return (self.columns, self.table_name,
+                tuple(condition.shape for condition in self.where_clause or ()),
+                self.group_by or (), self.order_by or (), self.order_direction.value,
+                bool(self.top), self.keyset_columns or (), self.keyset_after is not None,
+                self.offset is not None)
+
+    def compile(self) -> CompiledStatement:
+        """
+        Compile to ?-parameterized SQL plus a parameter tuple (TOP first, then where values in order, then
+        keyset values, then OFFSET and FETCH).
+        SQL text is cached per shape, so repeated compiles with new values only rebuild the parameters.
+        """
+        self._validate_paging()
+        params: List = [self.top] if self.top else []
+        for condition in self.where_clause or []:
+            params.extend(condition.params)
+        if self.keyset_after is not None:
+            params.extend(_keyset_params(self.keyset_after))
+        if self.offset is not None:
+            params.extend((self.offset, self.fetch))
+        return CompiledStatement(_compile_shape(self.shape), tuple(params))
 
 
 def build_simple_sql_select_statement(columns: List[str], table_name: str, where_clause: str | List[str] = None, group_by: str | List[str] = None, order_by: str = None, order_direction: OrderByEnum = OrderByEnum.ASC, top: int = None) -> str:
@@ -135,18 +332,45 @@ def build_simple_sql_select_statement(columns: List[str], table_name: str, where
 
     return sql
 
-sql_output = build_simple_sql_select_statement(columns=["column1", "column2"], table_name="table1", where_clause=["column1 = 'value1'", "column2 = 'value2'"], group_by=["column1", "column2"], order_by=["column1", "column2"], order_direction= OrderByEnum.DESC, top=10)
+def compile_simple_sql_select_statement(columns: List[str], table_name: str,
+                                        where: Dict[str, T] | Sequence[Tuple] = None,
+                                        group_by: str | List[str] = None, order_by: str | List[str] = None,
+                                        order_direction: OrderByEnum = OrderByEnum.ASC,
+                                        top: Optional[int] = None) -> CompiledStatement:
+    """
+    Parameterized counterpart of build_simple_sql_select_statement.
+    where is {column: value} for equality or a sequence of (column, value[, operator]) tuples.
+    """
+    statement = SqlStatement(source_identifier=table_name, database_name=None, schema_name=None,
+                             table_name=table_name, columns=columns)
+    conditions = where.items() if isinstance(where, dict) else (where or [])
+    for condition in conditions:
+        statement = statement.add_where_clause(*condition)
+    if group_by:
+        statement = statement.add_group_by(group_by)
+    if order_by:
+        statement = statement.add_order_by(order_by)
+    statement = statement.set_ordered_direction(order_direction)
+    if top:
+        statement = statement.set_top(top)
+    return statement.compile()
+
+
+if __name__ == '__main__':
+    sql_output = build_simple_sql_select_statement(columns=["column1", "column2"], table_name="table1", where_clause=["column1 = 'value1'", "column2 = 'value2'"], group_by=["column1", "column2"], order_by=["column1", "column2"], order_direction= OrderByEnum.DESC, top=10)
 
-print(sql_output)
+    print(sql_output)
 
-sql_statement = SqlStatement(source_identifier=None, database_name="database1", schema_name="dbo", table_name="table1", columns=["column1", "column2", "column3"])
-sql_statement.add_order_by(["column1", "column2"])
-test_c = 'c'
-sql_statement.add_where_clause("column2", operator= ">", value= 'c')
-sql_statement.add_group_by(["column1", "column2"])
-sql_statement.set_ordered_direction(OrderByEnum.DESC)
-sql_statement.set_top(1000)
-sql_statement.add_order_by("column3")
+    sql_statement = SqlStatement(source_identifier=None, database_name="database1", schema_name="dbo", table_name="table1", columns=["column1", "column2", "column3"])
+    sql_statement = sql_statement.add_order_by(["column1", "column2"])
+    test_c = 'c'
+    sql_statement = sql_statement.add_where_clause("column2", operator= ">", value= 'c')
+    sql_statement = sql_statement.add_group_by(["column1", "column2"])
+    sql_statement = sql_statement.set_ordered_direction(OrderByEnum.DESC)
+    sql_statement = sql_statement.set_top(1000)
+    sql_statement = sql_statement.add_order_by("column3")
 
-print("Printing the Class:\n\n")
-print(sql_statement)
\ No newline at end of file
+    print("Printing the Class:\n\n")
+    print(sql_statement)
+    print("\n\nCompiled:\n")
+    print(sql_statement.compile())
@@ -0,0 +1,203 @@
+import csv
+import itertools
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator, List, Literal, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+from .sql_instrumentation import InstrumentedCursor
+
+Dialect = Literal['mssql', 'sqlite']
+BulkData = Union[pd.DataFrame, str, Path, Iterable[Sequence]]
+
+
+@dataclass
+class BatchTiming:
+    index: int
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else float('inf')
+
+
+@dataclass
+class BulkLoadStats:
+    """
+    Timings for one bulk load. merge_seconds is only set when rows were staged and merged.
+    """
+    table_name: str
+    batches: List[BatchTiming] = field(default_factory=list)
+    merge_seconds: Optional[float] = None
+    total_seconds: float = 0.0
+
+    @property
+    def rows(self) -> int:
+        return sum(batch.rows for batch in self.batches)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.total_seconds if self.total_seconds else float('inf')
+
+    def __str__(self) -> str:
+        merge = f', merge {self.merge_seconds:.3f}s' if self.merge_seconds is not None else ''
+        return (f'Bulk load {self.table_name}: {self.rows} rows in {len(self.batches)} batches, '
+                f'{self.total_seconds:.3f}s ({self.rows_per_second:,.0f} rows/s){merge}')
+
+
+def detect_dialect(cursor) -> Dialect:
+    if isinstance(cursor, InstrumentedCursor):
+        cursor = cursor._cursor
+    return 'sqlite' if isinstance(cursor, sqlite3.Cursor) else 'mssql'
+
+
+def quote_identifier(name: str, dialect: Dialect) -> str:
+    name = name.strip()
+    if dialect == 'sqlite':
+        return name if name.startswith('"') else '"' + name.replace('"', '""') + '"'
+    return name if name.startswith('[') else '[' + name.replace(']', ']]') + ']'
+
+
+def _frame_rows(df: pd.DataFrame, batch_size: int) -> Iterator[Tuple]:
+    """ Yield DataFrame rows as tuples with NaN/NaT converted to None, one batch slice at a time. """
+    for start in range(0, len(df), batch_size):
+        part = df.iloc[start:start + batch_size].astype(object)
+        part = part.where(pd.notna(part), None)
+        yield from part.itertuples(index=False, name=None)
+
+
+def _csv_rows(path: Union[str, Path]) -> Tuple[List[str], Iterator[Tuple]]:
+    """ Read the header now; the rows generator reopens the file so an unconsumed iterator holds no handle. """
+    with open(path, newline='') as csv_file:
+        header = next(csv.reader(csv_file), None)
+    if header is None:
+        raise ValueError(f'CSV file {path} is empty')
+
+    def rows():
+        with open(path, newline='') as csv_file:
+            reader = csv.reader(csv_file)
+            next(reader, None)
+            for row in reader:
+                yield tuple(value if value != '' else None for value in row)
+
+    return header, rows()
+
+
+def normalize_bulk_data(data: BulkData, columns: Optional[List[str]] = None,
+                        batch_size: int = 1000) -> Tuple[List[str], Iterator[Tuple]]:
+    """
+    Turn a DataFrame, CSV path or iterable of tuples into (column names, row iterator).
+    CSV headers and DataFrame columns are used unless columns is given.
+    """
+    if isinstance(data, pd.DataFrame):
+        names = list(data.columns)
+        if columns is not None:
+            data = data[columns]
+            names = list(columns)
+        return names, _frame_rows(data, batch_size)
+    if isinstance(data, (str, Path)):
+        header, rows = _csv_rows(data)
+        if columns is None:
+            return header, rows
+        positions = [header.index(column) for column in columns]
+        return list(columns), (tuple(row[i] for i in positions) for row in rows)
+    if columns is None:
+        raise ValueError('columns are required when loading an iterable of tuples')
+    return list(columns), (tuple(row) for row in data)
+
+
+def _insert_batches(cursor, insert_sql: str, rows: Iterator[Tuple], batch_size: int,
+                    stats: BulkLoadStats) -> None:
+    for index in itertools.count():
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        start = time.perf_counter()
+        cursor.executemany(insert_sql, batch)
+        stats.batches.append(BatchTiming(index, len(batch), time.perf_counter() - start))
+
+
+def _stage_table_name(table_name: str, dialect: Dialect) -> str:
+    base = table_name.split('.')[-1].strip('[]"')
+    return f'#stage_{base}' if dialect == 'mssql' else f'temp.stage_{base}'
+
+
+def _merge_sql(dialect: Dialect, table_name: str, stage_name: str, columns: List[str],
+               merge_keys: List[str]) -> str:
+    quoted = [quote_identifier(column, dialect) for column in columns]
+    keys = [quote_identifier(key, dialect) for key in merge_keys]
+    updates = [column for column in quoted if column not in keys]
+    column_list = ', '.join(quoted)
+    if dialect == 'sqlite':
+        conflict = (f'DO UPDATE SET {", ".join(f"{c} = excluded.{c}" for c in updates)}' if updates
+                    else 'DO NOTHING')
+        return (f'INSERT INTO {table_name} ({column_list}) SELECT {column_list} FROM {stage_name} WHERE true '
+                f'ON CONFLICT ({", ".join(keys)}) {conflict};')
+    on = ' AND '.join(f'target.{key} = source.{key}' for key in keys)
+    sql = f'MERGE {table_name} AS target USING {stage_name} AS source ON {on}'
+    if updates:
+        sql += f'\nWHEN MATCHED THEN UPDATE SET {", ".join(f"target.{c} = source.{c}" for c in updates)}'
+    sql += (f'\nWHEN NOT MATCHED BY TARGET THEN INSERT ({column_list}) '
+            f'VALUES ({", ".join(f"source.{c}" for c in quoted)});')
+    return sql
+
+
+def bulk_load(cursor, table_name: str, data: BulkData, columns: Optional[List[str]] = None,
+              batch_size: int = 1000, merge_keys: Optional[List[str]] = None,
+              dialect: Optional[Dialect] = None) -> BulkLoadStats:
+    """
+    Insert rows into table_name with executemany in batches of batch_size.
+    pyodbc cursors get fast_executemany so each batch is sent as one parameter array.
+    With merge_keys, rows are staged in a temp table (#table on SQL Server) and applied with one
+    set based MERGE (INSERT ... ON CONFLICT on sqlite, which needs a unique index on the keys).
+    The caller owns the transaction and commits.
+    """
+    dialect = dialect or detect_dialect(cursor)
+    stats = BulkLoadStats(table_name)
+    start = time.perf_counter()
+    names, rows = normalize_bulk_data(data, columns, batch_size)
+    if hasattr(cursor, 'fast_executemany'):
+        cursor.fast_executemany = True
+    quoted = ', '.join(quote_identifier(name, dialect) for name in names)
+    placeholders = ', '.join('?' for _ in names)
+
+    target = table_name
+    if merge_keys:
+        stage_name = _stage_table_name(table_name, dialect)
+        cursor.execute(f'DROP TABLE IF EXISTS {stage_name};')
+        if dialect == 'mssql':
+            cursor.execute(f'SELECT TOP 0 {quoted} INTO {stage_name} FROM {table_name};')
+        else:
+            cursor.execute(f'CREATE TABLE {stage_name} AS SELECT {quoted} FROM {table_name} WHERE 0;')
+        target = stage_name
+
+    _insert_batches(cursor, f'INSERT INTO {target} ({quoted}) VALUES ({placeholders})', rows, batch_size, stats)
+
+    if merge_keys:
+        merge_start = time.perf_counter()
+        cursor.execute(_merge_sql(dialect, table_name, target, names, merge_keys))
+        stats.merge_seconds = time.perf_counter() - merge_start
+        cursor.execute(f'DROP TABLE IF EXISTS {target};')
+    stats.total_seconds = time.perf_counter() - start
+    return stats
+
+
+def sqlite_bulk_load(database_path: Union[str, Path], table_name: str, data: BulkData,
+                     columns: Optional[List[str]] = None, batch_size: int = 1000,
+                     merge_keys: Optional[List[str]] = None) -> BulkLoadStats:
+    """ Local sqlite fallback of bulk_load for benchmarking without a SQL Server. """
+    conn = sqlite3.connect(database_path)
+    try:
+        cursor = conn.cursor()
+        stats = bulk_load(cursor, table_name, data, columns, batch_size, merge_keys, dialect='sqlite')
+        conn.commit()
+        return stats
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
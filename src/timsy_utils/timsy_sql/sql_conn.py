@@ -1,30 +1,98 @@
+import threading
+import time
+import weakref
 import pyodbc
 from dataclasses import dataclass, field, InitVar
+from typing import List, Optional
 from timsy_config import Config
 import timsy_log
 
+from .sql_bulk_load import BulkData, BulkLoadStats, bulk_load
+from .sql_instrumentation import instrument_cursor, metrics
+from .sql_plan import PlanCapture, capture_plan
+from .sql_pool import build_connection_string
+
 logger = timsy_log.getLogger('SqlConn')
 
 
-def precursor(func):
+def is_connection_error(error: Exception) -> bool:
+    """ True for driver errors meaning the connection itself is gone (SQLSTATE class 08). """
+    if not isinstance(error, pyodbc.Error):
+        return False
+    sql_state = str(error.args[0]) if error.args else ''
+    return sql_state.startswith('08')
+
+
+def precursor(func=None, *, retry: bool = True):
+    """
+    Pass a fresh cursor to the wrapped SqlConn method and close it afterwards.
+    When the connection turns out to be dead the connection is reopened and the call retried up to
+    reconnect_retries times. The server rolls back the lost connection's open transaction, so the
+    retried call starts clean. Use @precursor(retry=False) for calls that cannot safely run twice, e.g.
+    ones consuming a one-shot iterator or executing user statements.
+    """
+    if func is None:
+        return lambda wrapped: precursor(wrapped, retry=retry)
+
     def wrapper(*args, **kwargs):
-        cursor: pyodbc.Cursor | None = None
-        try:
-            wrapper_self: SqlConn = args[0]
-            cursor: pyodbc.Cursor = wrapper_self.get_cursor()
-            if cursor is None:
-                raise ValueError('Cursor is None')
-            return func(*args, cursor=cursor, **kwargs)
-        except Exception as e:
-            logger.error(f'{type(e).__name__}: {e}')
-            raise e
-        finally:
-            if cursor is not None:
-                cursor.close()
+        wrapper_self: SqlConn = args[0]
+        attempt = 0
+        while True:
+            cursor: pyodbc.Cursor | None = None
+            try:
+                with wrapper_self.lock:
+                    cursor = wrapper_self.get_cursor()
+                    if cursor is None:
+                        raise ValueError('Cursor is None')
+                    return func(*args, cursor=cursor, **kwargs)
+            except Exception as e:
+                if retry and attempt < wrapper_self.reconnect_retries and is_connection_error(e):
+                    attempt += 1
+                    logger.warning(f'Connection lost ({type(e).__name__}: {e}). '
+                                   f'Reconnect attempt {attempt} of {wrapper_self.reconnect_retries}')
+                    wrapper_self.discard_connection()
+                    time.sleep(wrapper_self.reconnect_delay * attempt)
+                    continue
+                if is_connection_error(e):
+                    wrapper_self.discard_connection()
+                logger.error(f'{type(e).__name__}: {e}')
+                raise e
+            finally:
+                if cursor is not None:
+                    try:
+                        cursor.close()
+                    except pyodbc.Error:
+                        pass
 
     return wrapper
 
 
+def _keepalive_loop(conn_ref: 'weakref.ReferenceType[SqlConn]', stop: threading.Event, interval: float):
+    """
+    Keepalive thread body. It only holds the SqlConn weakly between pings, so dropping the last reference
+    lets __del__ stop the thread and close the connection.
+    """
+    while not stop.wait(interval):
+        sql_conn = conn_ref()
+        if sql_conn is None:
+            return
+        try:
+            with sql_conn.lock:
+                if time.monotonic() - sql_conn.last_used < interval:
+                    continue
+                was_connected = sql_conn.is_connected
+                if sql_conn.ping() or not was_connected:
+                    continue
+            try:
+                with sql_conn.lock:
+                    sql_conn.open_connection()
+                logger.info('Keepalive reconnected')
+            except pyodbc.Error as e:
+                logger.warning(f'Keepalive reconnect failed: {type(e).__name__}: {e}')
+        finally:
+            del sql_conn
+
+
 @dataclass
 class SqlConn:
     config: Config = field(default_factory=Config)
@@ -34,6 +102,14 @@ class SqlConn:
     config_override: InitVar[dict | None] = None
     conn: pyodbc.Connection = field(init=False, default=None)
     is_connected: bool = field(init=False, default=False)
+    # Seconds between keepalive pings, and idle seconds after which get_cursor validates first. 0 disables both.
+    keepalive_interval: float = 0.0
+    reconnect_retries: int = 2
+    reconnect_delay: float = 0.5
+    lock: threading.RLock = field(init=False, default_factory=threading.RLock, repr=False)
+    last_used: float = field(init=False, default=0.0, repr=False)
+    _keepalive_stop: threading.Event = field(init=False, default_factory=threading.Event, repr=False)
+    _keepalive_thread: Optional[threading.Thread] = field(init=False, default=None, repr=False)
 
     def __post_init__(self, config_override):
         if config_override is not None:
@@ -45,21 +121,96 @@ class SqlConn:
             self.server = self.config.get('DEFAULT', 'server')
             self.database = self.config.get('DEFAULT', 'database')
             self.trusted_connection = self.config.get('DEFAULT', 'trusted_connection')
+        if self.keepalive_interval:
+            self.start_keepalive()
 
     def open_connection(self):
-        self.conn = pyodbc.connect(
-            f'DRIVER=ODBC Driver 17 for SQL Server;'
-            f'SERVER={self.server};'
-            f'DATABASE={self.database};'
-            f'Trusted_Connection={self.trusted_connection}'
-        )
+        start = time.perf_counter()
+        self.conn = pyodbc.connect(build_connection_string(self.server, self.database, self.trusted_connection))
+        metrics.record_connect(time.perf_counter() - start)
         self.is_connected = True
+        self.last_used = time.monotonic()
 
     def verify_connection(self) -> bool:
         if not self.is_connected:
             self.open_connection()
         return self.is_connected
 
+    def discard_connection(self):
+        """ Drop the current connection without raising, so the next get_cursor reconnects. """
+        with self.lock:
+            if self.conn is not None:
+                try:
+                    self.conn.close()
+                except pyodbc.Error:
+                    pass
+            self.conn = None
+            self.is_connected = False
+
+    def ping(self) -> bool:
+        """
+        Run SELECT 1 on the open connection. A failure marks the connection as disconnected.
+        Returns False when not connected.
+        """
+        with self.lock:
+            if not self.is_connected:
+                return False
+            cursor = None
+            try:
+                cursor = self.conn.cursor()
+                cursor.execute('SELECT 1')
+                cursor.fetchall()
+                self.last_used = time.monotonic()
+                return True
+            except pyodbc.Error as e:
+                logger.warning(f'Keepalive failed, dropping connection: {type(e).__name__}: {e}')
+                self.discard_connection()
+                return False
+            finally:
+                if cursor is not None:
+                    try:
+                        cursor.close()
+                    except pyodbc.Error:
+                        pass
+
+    def start_keepalive(self, interval: Optional[float] = None):
+        """
+        Start a daemon thread that pings the connection when it has been idle for interval seconds
+        and reopens it after a server side drop.
+        """
+        if interval is not None:
+            self.keepalive_interval = interval
+        if not self.keepalive_interval:
+            raise ValueError('keepalive_interval must be greater than 0')
+        self.stop_keepalive()
+        self._keepalive_stop = threading.Event()
+        self._keepalive_thread = threading.Thread(target=_keepalive_loop,
+                                                  args=(weakref.ref(self), self._keepalive_stop,
+                                                        self.keepalive_interval),
+                                                  name=f'SqlConnKeepalive-{self.server}', daemon=True)
+        self._keepalive_thread.start()
+
+    def stop_keepalive(self):
+        if self._keepalive_thread is not None:
+            self._keepalive_stop.set()
+            # __del__ can run on the keepalive thread itself when it held the last reference.
+            if self._keepalive_thread is not threading.current_thread():
+                self._keepalive_thread.join(timeout=5)
+            self._keepalive_thread = None
+
+    def warm_up(self) -> int:
+        """
+        Eagerly open this SqlConn's connection so the first request does not pay the connect cost.
+        SqlConn uses a single connection; to pre-open pooled connections use sql_pool.get_pool(...).warm_up.
+        Returns the number of connections opened (0 or 1).
+        """
+        with self.lock:
+            if self.is_connected:
+                return 0
+            self.open_connection()
+        logger.info(f'Warmed up connection to {self.server}/{self.database}')
+        return 1
+
     def test_connection(self):
         try:
             self.verify_connection()
@@ -74,11 +225,16 @@ class SqlConn:
             raise e
 
     def get_cursor(self) -> pyodbc.Cursor:
-        if not self.is_connected:
-            self.open_connection()
-        return self.conn.cursor()
+        with self.lock:
+            if self.is_connected and self.keepalive_interval \
+                    and time.monotonic() - self.last_used > self.keepalive_interval:
+                self.ping()
+            if not self.is_connected:
+                self.open_connection()
+            self.last_used = time.monotonic()
+            return instrument_cursor(self.conn.cursor(), 'SqlConn')
 
-    @precursor
+    @precursor(retry=False)
     def test_query(self, query: str, cursor=None):
         if cursor is None:
             raise ValueError('Cursor is None')
@@ -141,6 +297,60 @@ class SqlConn:
             logger.error(f'Connection Failed: {type(e).__name__}: {e}')
             raise e
 
+    @precursor(retry=False)
+    def bulk_load(self, table_name: str, data: BulkData, columns: Optional[List[str]] = None,
+                  batch_size: int = 1000, merge_keys: Optional[List[str]] = None,
+                  cursor: pyodbc.Cursor = None) -> BulkLoadStats:
+        """
+        Bulk insert a DataFrame, CSV path or iterable of tuples using fast_executemany batches.
+        With merge_keys, rows are staged into a #temp table and applied with a single MERGE.
+        Commits on success and rolls back on failure. Not retried on a dropped connection: an iterator
+        would already be partly consumed and the rolled back rows lost, so the caller must reload.
+        """
+        try:
+            stats = bulk_load(cursor, table_name, data, columns, batch_size, merge_keys)
+            self.conn.commit()
+        except Exception:
+            if self.is_connected:
+                try:
+                    self.conn.rollback()
+                except pyodbc.Error:
+                    pass
+            raise
+        logger.info(str(stats))
+        return stats
+
+    def _capture_plan(self, query: str, actual: bool, statistics: bool, cursor: pyodbc.Cursor) -> PlanCapture:
+        try:
+            capture = capture_plan(cursor, query, actual, statistics)
+        finally:
+            if self.is_connected:
+                self.conn.rollback()
+        for issue in capture.issues:
+            logger.info(str(issue))
+        return capture
+
+    @precursor
+    def _capture_estimated_plan(self, query: str, statistics: bool, cursor: pyodbc.Cursor = None) -> PlanCapture:
+        return self._capture_plan(query, False, statistics, cursor)
+
+    @precursor(retry=False)
+    def _capture_actual_plan(self, query: str, statistics: bool, cursor: pyodbc.Cursor = None) -> PlanCapture:
+        return self._capture_plan(query, True, statistics, cursor)
+
+    def capture_plan(self, query: str, actual: bool = False, statistics: bool = True) -> PlanCapture:
+        """
+        Capture and parse the estimated plan of a query (GO separated batches allowed).
+        actual=True executes it under STATISTICS XML, IO and TIME and rolls it back; that mode is not
+        retried on a dropped connection, so the statements never run twice.
+        """
+        if actual:
+            return self._capture_actual_plan(query, statistics)
+        return self._capture_estimated_plan(query, statistics)
+
+    def capture_plan_file(self, file_path: str, actual: bool = False, statistics: bool = True) -> PlanCapture:
+        with open(file_path, 'r') as file:
+            return self.capture_plan(file.read(), actual, statistics)
 
     def close_connection(self):
         if self.is_connected:
@@ -148,6 +358,7 @@ class SqlConn:
             self.is_connected = False
 
     def __del__(self):
+        self.stop_keepalive()
         self.close_connection()
         logger.info('Connection Closed')
 
@@ -0,0 +1,336 @@
+import bisect
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# timsy_logger.getLogger hands out standard named loggers, so the handlers installed by
+# timsy_logger.init_root_logger receive these records.
+slow_query_logger = logging.getLogger('SqlSlowQuery')
+
+# Histogram bucket upper bounds in milliseconds.
+DEFAULT_BUCKETS_MS: Tuple[float, ...] = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_COMMENT_PATTERN = re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+_STRING_PATTERN = re.compile(r"N?'(?:[^']|'')*'")
+_NUMBER_PATTERN = re.compile(r'(?<![\w@#$.])[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b')
+_IN_LIST_PATTERN = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(sql_query: str) -> str:
+    """
+    Reduce SQL to its shape so identical statements aggregate together: comments removed, string and
+    numeric literals replaced with ?, IN lists collapsed to (?...) and whitespace collapsed.
+    """
+    sql_query = _COMMENT_PATTERN.sub(' ', sql_query)
+    sql_query = _STRING_PATTERN.sub('?', sql_query)
+    sql_query = _NUMBER_PATTERN.sub('?', sql_query)
+    sql_query = _IN_LIST_PATTERN.sub('(?...)', sql_query)
+    return _WHITESPACE_PATTERN.sub(' ', sql_query).strip()
+
+
+class Histogram:
+    """ Fixed bucket latency histogram in milliseconds. """
+
+    def __init__(self, buckets_ms: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = float('inf')
+        self.max_ms = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets_ms, value_ms)] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.min_ms = min(self.min_ms, value_ms)
+        self.max_ms = max(self.max_ms, value_ms)
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        """ Upper bound of the bucket holding the given fraction (0 - 1) of observations. """
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        running = 0
+        for index, bucket_count in enumerate(self.counts):
+            running += bucket_count
+            if running >= target:
+                return self.buckets_ms[index] if index < len(self.buckets_ms) else self.max_ms
+        return self.max_ms
+
+
+@dataclass
+class QueryTiming:
+    sql: str
+    connect_seconds: float = 0.0
+    execute_seconds: float = 0.0
+    fetch_seconds: float = 0.0
+    rows: int = 0
+    bytes: int = 0
+    source: str = ''
+
+    @property
+    def total_ms(self) -> float:
+        return (self.connect_seconds + self.execute_seconds + self.fetch_seconds) * 1000
+
+
+@dataclass
+class StatementStats:
+    shape: str
+    total: Histogram = field(default_factory=Histogram)
+    execute: Histogram = field(default_factory=Histogram)
+    fetch: Histogram = field(default_factory=Histogram)
+    rows: int = 0
+    bytes: int = 0
+
+    def __str__(self) -> str:
+        return (f'{self.total.count}x mean {self.total.mean_ms:.1f}ms p95 {self.total.percentile(0.95):.0f}ms '
+                f'max {self.total.max_ms:.1f}ms rows {self.rows} bytes {self.bytes}: {self.shape[:200]}')
+
+
+class SqlMetricsRegistry:
+    """
+    Aggregates QueryTimings per normalized statement shape and logs statements slower than
+    slow_query_threshold_ms to the SqlSlowQuery logger.
+    """
+
+    def __init__(self, slow_query_threshold_ms: Optional[float] = 1000.0, enabled: bool = True,
+                 measure_bytes: bool = False):
+        self.slow_query_threshold_ms = slow_query_threshold_ms
+        self.enabled = enabled
+        self.measure_bytes = measure_bytes
+        self.connect = Histogram()
+        self._statements: Dict[str, StatementStats] = {}
+        self._lock = threading.Lock()
+
+    def record_connect(self, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.connect.observe(seconds * 1000)
+
+    def record(self, timing: QueryTiming) -> None:
+        if not self.enabled:
+            return
+        shape = normalize_sql(timing.sql)
+        total_ms = timing.total_ms
+        with self._lock:
+            stats = self._statements.get(shape)
+            if stats is None:
+                stats = self._statements[shape] = StatementStats(shape)
+            stats.total.observe(total_ms)
+            stats.execute.observe(timing.execute_seconds * 1000)
+            stats.fetch.observe(timing.fetch_seconds * 1000)
+            stats.rows += timing.rows
+            stats.bytes += timing.bytes
+        if self.slow_query_threshold_ms is not None and total_ms >= self.slow_query_threshold_ms:
+            slow_query_logger.warning(
+                f'Slow query {total_ms:.1f}ms (connect {timing.connect_seconds * 1000:.1f}ms, '
+                f'execute {timing.execute_seconds * 1000:.1f}ms, fetch {timing.fetch_seconds * 1000:.1f}ms, '
+                f'rows {timing.rows}{", bytes " + str(timing.bytes) if timing.bytes else ""})'
+                f'{" [" + timing.source + "]" if timing.source else ""}: {shape}')
+
+    def snapshot(self) -> List[StatementStats]:
+        """ Statement stats, slowest total time first. """
+        with self._lock:
+            return sorted(self._statements.values(), key=lambda stats: stats.total.total_ms, reverse=True)
+
+    def report(self, top: int = 10) -> str:
+        lines = [f'Connects: {self.connect.count} mean {self.connect.mean_ms:.1f}ms max {self.connect.max_ms:.1f}ms']
+        lines.extend(str(stats) for stats in self.snapshot()[:top])
+        return '\n'.join(lines)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._statements.clear()
+            self.connect = Histogram()
+
+
+metrics = SqlMetricsRegistry()
+
+
+def configure_instrumentation(slow_query_threshold_ms: Optional[float] = None, enabled: Optional[bool] = None,
+                              measure_bytes: Optional[bool] = None) -> SqlMetricsRegistry:
+    if slow_query_threshold_ms is not None:
+        metrics.slow_query_threshold_ms = slow_query_threshold_ms
+    if enabled is not None:
+        metrics.enabled = enabled
+    if measure_bytes is not None:
+        metrics.measure_bytes = measure_bytes
+    return metrics
+
+
+def _row_bytes(rows: Sequence) -> int:
+    """ Rough payload size: string/bytes lengths plus 8 bytes for every other value. """
+    size = 0
+    for row in rows:
+        for value in row:
+            size += len(value) if isinstance(value, (str, bytes, bytearray)) else 8
+    return size
+
+
+class InstrumentedCursor:
+    """
+    DBAPI cursor proxy timing execute and fetch calls. The timing of a statement is recorded when the next
+    statement starts or the cursor is closed.
+    """
+
+    def __init__(self, cursor, registry: SqlMetricsRegistry = metrics, connect_seconds: float = 0.0,
+                 source: str = ''):
+        object.__setattr__(self, '_cursor', cursor)
+        object.__setattr__(self, '_registry', registry)
+        object.__setattr__(self, '_timing', None)
+        object.__setattr__(self, '_pending_connect', connect_seconds)
+        object.__setattr__(self, '_source', source)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _flush(self) -> None:
+        timing = self._timing
+        if timing is not None:
+            object.__setattr__(self, '_timing', None)
+            self._registry.record(timing)
+
+    def _run(self, method: str, sql_query: str, *args):
+        self._flush()
+        timing = QueryTiming(sql_query, connect_seconds=self._pending_connect, source=self._source)
+        object.__setattr__(self, '_pending_connect', 0.0)
+        start = time.perf_counter()
+        try:
+            result = getattr(self._cursor, method)(sql_query, *args)
+        finally:
+            timing.execute_seconds = time.perf_counter() - start
+            object.__setattr__(self, '_timing', timing)
+        if method == 'executemany' or self._cursor.description is None:
+            timing.rows = max(getattr(self._cursor, 'rowcount', 0), 0)
+        # pyodbc returns the cursor from execute for chaining; keep callers on the proxy.
+        return self if result is self._cursor else result
+
+    def execute(self, sql_query: str, *args):
+        return self._run('execute', sql_query, *args)
+
+    def executemany(self, sql_query: str, *args):
+        return self._run('executemany', sql_query, *args)
+
+    def _fetch(self, method: str, *args):
+        start = time.perf_counter()
+        result = getattr(self._cursor, method)(*args)
+        timing = self._timing
+        if timing is not None:
+            timing.fetch_seconds += time.perf_counter() - start
+            rows = [result] if method == 'fetchone' and result is not None else (result or [])
+            timing.rows += len(rows)
+            if self._registry.measure_bytes:
+                timing.bytes += _row_bytes(rows)
+        return result
+
+    def fetchone(self):
+        return self._fetch('fetchone')
+
+    def fetchmany(self, *args):
+        return self._fetch('fetchmany', *args)
+
+    def fetchall(self):
+        return self._fetch('fetchall')
+
+    def close(self):
+        self._flush()
+        self._cursor.close()
+
+    def __del__(self):
+        try:
+            self._flush()
+        except Exception:
+            pass
+
+
+class InstrumentedConnection:
+    """ Connection proxy whose cursors are InstrumentedCursors. The first cursor carries the connect time. """
+
+    def __init__(self, conn, registry: SqlMetricsRegistry = metrics, connect_seconds: float = 0.0,
+                 source: str = ''):
+        self._conn = conn
+        self._registry = registry
+        self._connect_seconds = connect_seconds
+        self._source = source
+
+    @property
+    def raw_connection(self):
+        return self._conn
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        # Drivers are configured through attributes (autocommit, isolation_level), which belong on the connection.
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def cursor(self, *args, **kwargs) -> InstrumentedCursor:
+        connect_seconds, self._connect_seconds = self._connect_seconds, 0.0
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._registry, connect_seconds,
+                                  self._source)
+
+
+def instrument_connection(conn, source: str = '', connect_seconds: float = 0.0):
+    """ Wrap a DBAPI connection when instrumentation is enabled, otherwise return it unchanged. """
+    if not metrics.enabled or isinstance(conn, InstrumentedConnection):
+        return conn
+    return InstrumentedConnection(conn, metrics, connect_seconds, source)
+
+
+def instrument_cursor(cursor, source: str = ''):
+    if not metrics.enabled or isinstance(cursor, InstrumentedCursor):
+        return cursor
+    return InstrumentedCursor(cursor, metrics, source=source)
+
+
+def instrument_engine(engine, source: str = 'sqlalchemy') -> None:
+    """
+    Record connect, execute, fetch, row and byte figures for every statement a SQLAlchemy engine runs: each
+    DBAPI connection the engine opens is wrapped in an InstrumentedConnection (connections already pooled
+    before the call are not). A failed statement is recorded with its execute time.
+    """
+    from sqlalchemy import event
+
+    if getattr(engine, '_timsy_instrumented', False):
+        return
+
+    @event.listens_for(engine, 'do_connect')
+    def _connect(dialect, conn_rec, cargs, cparams):
+        start = time.perf_counter()
+        conn = dialect.connect(*cargs, **cparams)
+        connect_seconds = time.perf_counter() - start
+        metrics.record_connect(connect_seconds)
+        return instrument_connection(conn, source, connect_seconds)
+
+    engine._timsy_instrumented = True
@@ -1,3 +1,9 @@
+from dataclasses import dataclass
+from typing import List
+
+from .column_instance import ColumnInstance
+from .proc import Proc
+from .sql_column_type import SQLColumnType
 
 
 @dataclass
@@ -6,4 +12,3 @@ class ColumnEntry:
     sql_column_type: SQLColumnType
     column_instance: List[ColumnInstance]
     procs_using: List[Proc]
-
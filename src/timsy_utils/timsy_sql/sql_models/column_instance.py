@@ -1,3 +1,7 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from .sql_column_type import SQLColumnType
 
 
 @dataclass
@@ -8,3 +12,5 @@ class ColumnInstance:
     is_nullable: bool
     condition: str | None
     description: str
+    # Declared SQL type as written in DDL, e.g. nvarchar(50); None when unknown.
+    declared_type: Optional[str] = None
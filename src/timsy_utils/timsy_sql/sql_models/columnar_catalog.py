@@ -0,0 +1,311 @@
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+class CatalogRow:
+    """ Lightweight view of one catalog row; attribute access reads the catalog's column arrays. """
+    __slots__ = ('_catalog', '_index')
+
+    def __init__(self, catalog: 'ColumnarCatalog', index: int):
+        self._catalog = catalog
+        self._index = index
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith('_'):
+            # Private and dunder lookups (copy, pickle) before the slots are set must not recurse.
+            raise AttributeError(name)
+        catalog = self._catalog
+        if name not in catalog.column_index and name.startswith('col') and name[3:].isdigit():
+            # Positional names as set by timsy_sql_util.TableInfo.
+            position = int(name[3:])
+            if position < len(catalog.column_names):
+                name = catalog.column_names[position]
+        try:
+            return catalog.value(name, self._index)
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, key: Union[int, str]) -> Any:
+        name = self._catalog.column_names[key] if isinstance(key, int) else key
+        return self._catalog.value(name, self._index)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: self._catalog.value(name, self._index) for name in self._catalog.column_names}
+
+    def __repr__(self) -> str:
+        catalog = self._catalog
+        label = catalog.value('name', self._index) if 'name' in catalog.column_index else self._index
+        return f'CatalogRow({label})'
+
+
+class ColumnarCatalog:
+    """
+    Column oriented store for sys catalog result sets (sys.tables, sys.columns, ...).
+    Each column is one NumPy array: integers in the smallest int dtype that holds them, booleans as bool
+    (both with a separate null mask when nullable), decimals/floats as float64 with NaN for NULL, datetimes
+    as datetime64[us] and strings as int32 codes into a shared list of interned strings.
+    Rows are materialized on demand as __slots__ CatalogRow views, and filter() works on whole columns.
+    """
+
+    def __init__(self, column_names: Sequence[str], columns: Dict[str, np.ndarray],
+                 dictionaries: Dict[str, List[str]], nulls: Optional[Dict[str, np.ndarray]] = None):
+        self.column_names = list(column_names)
+        self.column_index = {name: position for position, name in enumerate(self.column_names)}
+        self._columns = columns
+        self._dictionaries = dictionaries
+        self._nulls = nulls or {}
+        self._length = len(next(iter(columns.values()))) if columns else 0
+
+    @classmethod
+    def from_rows(cls, column_names: Sequence[str], rows: Iterable[Sequence]) -> 'ColumnarCatalog':
+        builder = ColumnarCatalogBuilder(column_names)
+        builder.extend(rows)
+        return builder.build()
+
+    @classmethod
+    def from_batches(cls, column_names: Sequence[str], batches: Iterable[Iterable[Sequence]]) -> 'ColumnarCatalog':
+        builder = ColumnarCatalogBuilder(column_names)
+        for batch in batches:
+            builder.extend(batch)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[CatalogRow]:
+        return (CatalogRow(self, index) for index in range(self._length))
+
+    def __getitem__(self, index: int) -> CatalogRow:
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return CatalogRow(self, index)
+
+    def __repr__(self) -> str:
+        return f'ColumnarCatalog({self._length} rows x {len(self.column_names)} columns, {self.nbytes():,} bytes)'
+
+    def column(self, name: str) -> np.ndarray:
+        """ Raw column array (string columns as int32 codes, see values() for decoded strings). """
+        return self._columns[name]
+
+    def values(self, name: str) -> np.ndarray:
+        """ Column values with strings decoded, and nullable int/bool columns as object arrays holding None. """
+        if name in self._dictionaries:
+            lookup = np.array(self._dictionaries[name] + [None], dtype=object)
+            return lookup[self._columns[name]]
+        if name in self._nulls:
+            values = self._columns[name].astype(object)
+            values[self._nulls[name]] = None
+            return values
+        return self._columns[name]
+
+    def value(self, name: str, index: int) -> Any:
+        array = self._columns[name]
+        raw = array[index]
+        if name in self._dictionaries:
+            return None if raw < 0 else self._dictionaries[name][raw]
+        if name in self._nulls and self._nulls[name][index]:
+            return None
+        if array.dtype.kind == 'M':
+            return None if np.isnat(raw) else raw.item()
+        if array.dtype.kind == 'f' and np.isnan(raw):
+            return None
+        return raw.item() if isinstance(raw, np.generic) else raw
+
+    def nbytes(self) -> int:
+        """ Approximate memory: column arrays plus the dictionary strings. """
+        total = sum(array.nbytes for array in self._columns.values())
+        total += sum(array.nbytes for array in self._nulls.values())
+        return total + sum(sys.getsizeof(value) for dictionary in self._dictionaries.values() for value in dictionary)
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame({name: self.values(name) for name in self.column_names})
+
+    # --- Vectorized filtering ---
+    def _string_mask(self, name: str, wanted: Union[str, Iterable[str]]) -> np.ndarray:
+        wanted = {wanted} if isinstance(wanted, str) else set(wanted)
+        wanted = {value.strip().casefold() for value in wanted}
+        # Match against the (small) dictionary once, then test the codes.
+        codes = [code for code, value in enumerate(self._dictionaries[name]) if value.strip().casefold() in wanted]
+        return np.isin(self._columns[name], codes)
+
+    def is_null(self, name: str) -> np.ndarray:
+        array = self._columns[name]
+        if name in self._dictionaries:
+            return array < 0
+        if name in self._nulls:
+            return self._nulls[name]
+        if array.dtype.kind == 'M':
+            return np.isnat(array)
+        if array.dtype.kind == 'f':
+            return np.isnan(array)
+        return np.equal(array, None) if array.dtype.kind == 'O' else np.zeros(len(array), dtype=bool)
+
+    def mask(self, name: str, wanted: Any) -> np.ndarray:
+        """ Boolean mask of rows whose column equals wanted (or is in it, for lists/sets/tuples); None matches NULL. """
+        if wanted is None:
+            return self.is_null(name)
+        if name in self._dictionaries:
+            return self._string_mask(name, wanted)
+        if isinstance(wanted, (list, set, tuple, frozenset)):
+            selected = np.isin(self._columns[name], list(wanted))
+        else:
+            selected = self._columns[name] == wanted
+        return selected & ~self._nulls[name] if name in self._nulls else selected
+
+    def where(self, mask: np.ndarray) -> 'ColumnarCatalog':
+        """ New catalog of the rows selected by mask (or an index array); string dictionaries are shared. """
+        return ColumnarCatalog(self.column_names, {name: array[mask] for name, array in self._columns.items()},
+                               self._dictionaries, {name: array[mask] for name, array in self._nulls.items()})
+
+    def filter(self, schema: Any = None, type: Any = None, modified_after: Optional[datetime] = None,
+               modified_before: Optional[datetime] = None, **equals: Any) -> 'ColumnarCatalog':
+        """
+        Rows matching every given condition. schema matches schema_name (or schema_id for ints), type matches
+        any of type, type_desc or type_name, the modified bounds apply to modify_date and keyword arguments
+        match columns by equality (or membership for lists).
+        """
+        selected = np.ones(self._length, dtype=bool)
+        if schema is not None:
+            schema_column = 'schema_name' if 'schema_name' in self.column_index and not isinstance(schema, int) \
+                else 'schema_id'
+            selected &= self.mask(schema_column, schema)
+        if type is not None:
+            type_mask = np.zeros(self._length, dtype=bool)
+            for name in ('type', 'type_desc', 'type_name'):
+                if name in self._dictionaries:
+                    type_mask |= self._string_mask(name, type)
+            selected &= type_mask
+        if modified_after is not None:
+            selected &= self._columns['modify_date'] > np.datetime64(modified_after, 'us')
+        if modified_before is not None:
+            selected &= self._columns['modify_date'] < np.datetime64(modified_before, 'us')
+        for name, wanted in equals.items():
+            selected &= self.mask(name, wanted)
+        return self.where(selected)
+
+
+# Per batch conversion result: (kind, array, null mask); a 'null' chunk has no array, only its mask.
+_Chunk = Tuple[str, Optional[np.ndarray], Optional[np.ndarray]]
+
+
+def _chunk_length(chunk: _Chunk) -> int:
+    kind, array, null = chunk
+    return len(null) if array is None else len(array)
+
+
+class ColumnarCatalogBuilder:
+    """
+    Converts each batch of rows into typed column chunks as it arrives, so no more than one batch is held as
+    Python objects; build() concatenates the chunks. Each distinct string is kept once, interned, in its
+    column's dictionary. A column whose batches disagree on type is widened (int to float) or, failing that,
+    kept as an object array.
+    """
+
+    def __init__(self, column_names: Sequence[str]):
+        self.column_names = list(column_names)
+        self._reset()
+
+    def _reset(self) -> None:
+        self._chunks: List[List[_Chunk]] = [[] for _ in self.column_names]
+        self._codes: List[Dict[str, int]] = [{} for _ in self.column_names]
+
+    def extend(self, rows: Iterable[Sequence]) -> None:
+        # Transpose the batch in C rather than appending value by value.
+        for chunks, codes, values in zip(self._chunks, self._codes, zip(*rows)):
+            chunks.append(_convert_chunk(values, codes))
+
+    def build(self) -> ColumnarCatalog:
+        columns, dictionaries, nulls = {}, {}, {}
+        for name, chunks, codes in zip(self.column_names, self._chunks, self._codes):
+            kinds = {chunk[0] for chunk in chunks} - {'null'}
+            null = np.concatenate([np.zeros(_chunk_length(chunk), dtype=bool) if chunk[2] is None else chunk[2]
+                                   for chunk in chunks]) if chunks else np.zeros(0, dtype=bool)
+            has_null = bool(null.any())
+            if not kinds:
+                columns[name] = np.zeros(len(null), dtype=np.int8)
+                nulls[name] = null
+            elif kinds == {'str'}:
+                columns[name] = _concatenate(chunks, np.int32, -1)
+                dictionaries[name] = [sys.intern(value) for value in codes]
+            elif kinds == {'datetime'}:
+                columns[name] = _concatenate(chunks, 'datetime64[us]', np.datetime64('NaT'))
+            elif kinds <= {'bool', 'int'}:
+                if kinds == {'bool'}:
+                    columns[name] = _concatenate(chunks, bool, False)
+                else:
+                    array = _concatenate(chunks, np.int64, 0)
+                    columns[name] = array.astype(_smallest_int(array), copy=False)
+                if has_null:
+                    nulls[name] = null
+            elif kinds <= {'bool', 'int', 'float'}:
+                array = _concatenate(chunks, np.float64, np.nan)
+                array[null] = np.nan
+                columns[name] = array
+            else:
+                array = np.concatenate([_chunk_objects(chunk, codes) for chunk in chunks])
+                array[null] = None
+                columns[name] = array
+        self._reset()
+        return ColumnarCatalog(self.column_names, columns, dictionaries, nulls)
+
+
+def _convert_chunk(values: Sequence, codes: Dict[str, int]) -> _Chunk:
+    """ One batch of one column as the narrowest array that holds it, with a null mask where needed. """
+    count = len(values)
+    types = set(map(type, values))
+    has_null = type(None) in types
+    kinds = types - {type(None)}
+    null = np.fromiter((value is None for value in values), dtype=bool, count=count) if has_null else None
+    if not kinds:
+        return 'null', None, np.ones(count, dtype=bool)
+    if kinds <= {str}:
+        return 'str', np.fromiter((-1 if value is None else codes.setdefault(value, len(codes)) for value in values),
+                                  dtype=np.int32, count=count), null
+    if kinds <= {datetime, date}:
+        return 'datetime', np.array(values, dtype='datetime64[us]'), null
+    if kinds <= {bool, int}:
+        filled = [0 if value is None else value for value in values] if has_null else values
+        if kinds == {bool}:
+            return 'bool', np.array(filled, dtype=bool), null
+        return 'int', np.array(filled, dtype=np.int64), null
+    if kinds <= {bool, int, float, Decimal}:
+        return 'float', np.array([np.nan if value is None else float(value) for value in values],
+                                 dtype=np.float64), null
+    array = np.empty(count, dtype=object)
+    array[:] = values
+    return 'object', array, null
+
+
+def _concatenate(chunks: List[_Chunk], dtype, fill) -> np.ndarray:
+    return np.concatenate([np.full(_chunk_length(chunk), fill, dtype=dtype) if chunk[1] is None
+                           else chunk[1].astype(dtype, copy=False) for chunk in chunks])
+
+
+def _chunk_objects(chunk: _Chunk, codes: Dict[str, int]) -> np.ndarray:
+    """ A chunk back as Python values, for columns whose batches mix types. """
+    kind, array, null = chunk
+    if array is None:
+        return np.full(len(null), None, dtype=object)
+    if kind == 'str':
+        return np.array(list(codes) + [None], dtype=object)[array]
+    if kind == 'datetime':
+        return np.array(array.tolist(), dtype=object)
+    return array.astype(object)
+
+
+def _smallest_int(array: np.ndarray) -> np.dtype:
+    if not len(array):
+        return np.dtype(np.int64)
+    low, high = array.min(), array.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
@@ -1,9 +1,21 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import List
+
+from .column_instance import ColumnInstance
+from .proc import Proc
+
 
 @dataclass
 class DatabaseModel:
     id: int
     name: str
-    
-
+    server: str = ''
+    # Tables as schema.table.
+    tables: List[str] = field(default_factory=list)
+    # One ColumnInstance per table column; alias holds the column name.
+    columns: List[ColumnInstance] = field(default_factory=list)
+    procs: List[Proc] = field(default_factory=list)
 
+    @property
+    def full_name(self) -> str:
+        return f'[{self.server}].[{self.name}]' if self.server else f'[{self.name}]'
@@ -1,4 +1,7 @@
-
+from .join_types import JoinType
+from .on_clause import on_clause
+from .sql_model_helpers import format_from
+from .table_relationship import TableRelationship
 
 
 class JoinTable:
@@ -12,8 +15,8 @@ class JoinTable:
     def from_direct(cls, join_type: JoinType, source_schema: str | None, source_table: str, source_column: str,
                     target_schema: str | None, target_table: str, target_column: str, source_alias: str = None,
                     target_alias: str = None):
-        on_source = on_clause(source_schema, source_table, source_column, source_alias)
-        on_target = on_clause(target_schema, target_table, target_column, target_alias)
+        on_source = on_clause(source_schema, source_table, source_column, alias=source_alias)
+        on_target = on_clause(target_schema, target_table, target_column, alias=target_alias)
         return cls(join_type, on_source, on_target)
 
     @classmethod
@@ -21,9 +24,10 @@ class JoinTable:
         return cls(join_type, on_clause.from_dict(table_relationship.table_a), on_clause.from_dict(table_relationship.table_b))
 
     def format_from(self, schema: str, table: str, alias: str = None) -> str:
-        if alias:
-            return f'FROM {schema}.{table} AS {alias}'
-        return f'FROM {schema}.{table}'
+        return format_from(schema, table, alias)
 
     def format_join(self) -> str:
-        return f'\n\t{self.join_type} {self.on_target.join_to()}\n\t\tON {self.on_source.column} = {self.on_target.column}'
+        join_type = self.join_type.value if isinstance(self.join_type, JoinType) else self.join_type
+        conditions = '\n\t\tAND '.join(f'{self.on_source.qualify(source)} = {self.on_target.qualify(target)}'
+                                        for source, target in zip(self.on_source.columns, self.on_target.columns))
+        return f'\n\t{join_type} {self.on_target.join_to()}\n\t\tON {conditions}'
@@ -1,3 +1,6 @@
+from typing import List
+
+from .sql_model_helpers import add_square_bracket, add_square_brackets, qualified_name
 
 
 class on_clause:
@@ -5,16 +8,20 @@ class on_clause:
         self.schema = schema if schema else 'dbo'
         self.table = table
         self.column = add_square_bracket(column)
-        self.columns = add_square_brackets(columns)
+        self.columns = add_square_brackets(columns) or [self.column]
         self.alias = add_square_bracket(alias)
         self.has_on_join_multiple_columns = len(self.columns) > 1
 
     def join_to(self) -> str:
         if self.alias:
-            return f'{self.schema}.{self.table} AS {self.alias}'
-        return f'{self.schema}.{self.table}'
+            return f'{qualified_name(self.schema, self.table)} AS {self.alias}'
+        return qualified_name(self.schema, self.table)
+
+    def qualify(self, column: str) -> str:
+        """ Column prefixed with the alias, or [schema].[table] when there is no alias. """
+        return f'{self.alias or qualified_name(self.schema, self.table)}.{column}'
 
     @classmethod
     def from_dict(cls, table: dict):
-        return cls(table.get('schema', 'dbo'), table['table'], table['column'], table.get('alias', None))
-
+        return cls(table.get('schema', 'dbo'), table['table'], table['column'], table.get('columns', None),
+                   alias=table.get('alias', None))
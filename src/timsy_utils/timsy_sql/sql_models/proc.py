@@ -1,3 +1,6 @@
+from dataclasses import dataclass
+from typing import List
+
 
 @dataclass
 class Proc:
@@ -6,4 +9,4 @@ class Proc:
     server: str
     database_location: str #TODO: Create Database Class.
     database_refs: List[str]
-    table_list: List[str] #TODO Create Table Class.
\ No newline at end of file
+    table_list: List[str] #TODO Create Table Class.
@@ -11,6 +11,7 @@ class ServerModel:
     common_names: List[str] = field(default_factory=list)
     preferred_common_name: Optional[str] = None
     notes: List['NoteModel'] = field(default_factory=list)
+    databases: List['DatabaseModel'] = field(default_factory=list)
 
     def __post_init__(self):
         if self.common_names:
@@ -63,6 +64,11 @@ class ServerModel:
             notes=dict_data.get('notes', [])
         )
 
+    def database(self, name: str) -> Optional['DatabaseModel']:
+        """Get a crawled database by name (case insensitive)."""
+        name = name.strip('[]').lower()
+        return next((database for database in self.databases if database.name.lower() == name), None)
+
 # Note: 'NoteModel' should be imported or defined elsewhere in your codebase.
 
 if __name__ == "__main__":
@@ -20,3 +20,26 @@ class SQLColumnType(Enum):
     UUID = "UUID"
     # Column Contains VARCHAR of comma delimited values.
     CSV = "CSV"
+
+    @classmethod
+    def from_sql_server(cls, type_name: str) -> 'SQLColumnType':
+        """ Map a sys.types name to the closest SQLColumnType. Unknown types map to TEXT. """
+        return _SQL_SERVER_TYPES.get(type_name.lower(), cls.TEXT)
+
+
+_SQL_SERVER_TYPES = {
+    'varchar': SQLColumnType.VARCHAR, 'nvarchar': SQLColumnType.VARCHAR, 'sysname': SQLColumnType.VARCHAR,
+    'char': SQLColumnType.CHAR, 'nchar': SQLColumnType.CHAR,
+    'text': SQLColumnType.TEXT, 'ntext': SQLColumnType.TEXT,
+    'int': SQLColumnType.INTEGER, 'bigint': SQLColumnType.BIGINT,
+    'smallint': SQLColumnType.SMALLINT, 'tinyint': SQLColumnType.SMALLINT,
+    'real': SQLColumnType.FLOAT, 'float': SQLColumnType.DOUBLE,
+    'decimal': SQLColumnType.DECIMAL, 'numeric': SQLColumnType.DECIMAL,
+    'money': SQLColumnType.DECIMAL, 'smallmoney': SQLColumnType.DECIMAL,
+    'date': SQLColumnType.DATE, 'time': SQLColumnType.TIME,
+    'datetime': SQLColumnType.TIMESTAMP, 'datetime2': SQLColumnType.TIMESTAMP,
+    'smalldatetime': SQLColumnType.TIMESTAMP, 'datetimeoffset': SQLColumnType.TIMESTAMP,
+    'bit': SQLColumnType.BOOLEAN,
+    'binary': SQLColumnType.BLOB, 'varbinary': SQLColumnType.BLOB, 'image': SQLColumnType.BLOB,
+    'xml': SQLColumnType.CLOB, 'uniqueidentifier': SQLColumnType.UUID,
+}
@@ -2,21 +2,25 @@
 def add_square_brackets(columns: list) -> list:
     if not columns:
         return columns
-    return [f'[{column.strip()}]' if not (column.startswith('[') and column.endswith(']'))
-            else column for column in columns]
+    return [add_square_bracket(column) for column in columns]
 
 
 def add_square_bracket(item: str | None) -> str:
     if not item:
         return item
     item = item.strip()
-    return item if not (item.startswith('[') and item.endswith(']')) else f'[{item}]'
+    return item if item.startswith('[') and item.endswith(']') else f'[{item}]'
+
+
+def qualified_name(schema: str | None, table: str) -> str:
+    """ [schema].[table], so reserved words and names with spaces (dbo.Order) stay valid. """
+    return f'{add_square_bracket(schema or "dbo")}.{add_square_bracket(table)}'
 
 
 def format_from(schema: str, table: str, alias: str = None) -> str:
     if alias:
-        return f'FROM {schema}.{table} AS {alias}'
-    return f'FROM {schema}.{table}'
+        return f'FROM {qualified_name(schema, table)} AS {add_square_bracket(alias)}'
+    return f'FROM {qualified_name(schema, table)}'
 
 
 def format_join(join_type: str, source_table: dict, target_table: dict, on_source: dict, on_target: dict) -> str:
@@ -0,0 +1,113 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+from .sql_builder import CompiledStatement, SqlStatement
+from .sql_instrumentation import instrument_connection
+from .sql_pool import SqlConnectionPool
+
+
+@dataclass
+class Page:
+    number: int
+    rows: List
+    columns: List[str]
+    # Key values of the last row, the seek position of the next page (keyset mode only).
+    last_key: Optional[Tuple] = None
+    seconds: float = 0.0
+
+
+def _column_key(name: str) -> str:
+    return name.rsplit('.', 1)[-1].replace('[', '').replace(']', '').strip().lower()
+
+
+class PageIterator:
+    """
+    Iterate a SqlStatement one page at a time, either by keyset (seek from the last key of the previous page,
+    key_columns must be unique, non null and selected) or, without key_columns, by OFFSET/FETCH over the
+    statement's ORDER BY. With prefetch, the next page is queried on a background thread, over its own pooled
+    connection, while the caller works through the current one.
+    """
+
+    def __init__(self, pool: SqlConnectionPool, statement: SqlStatement, page_size: int,
+                 key_columns: Optional[Sequence[str]] = None, after: Optional[Sequence] = None,
+                 prefetch: bool = True, max_pages: Optional[int] = None, start_page: int = 0):
+        if page_size < 1:
+            raise ValueError('page_size must be at least 1')
+        if key_columns is None and not statement.order_by:
+            raise ValueError('OFFSET/FETCH paging needs a statement with an ORDER BY, or pass key_columns')
+        self.pool = pool
+        self.page_size = page_size
+        self.key_columns = [key_columns] if isinstance(key_columns, str) else key_columns
+        self.after = tuple(after) if after is not None else None
+        self.prefetch = prefetch
+        self.max_pages = max_pages
+        self.start_page = start_page
+        self._statement = statement
+        self._key_positions: Optional[List[int]] = None
+
+    @property
+    def keyset(self) -> bool:
+        return self.key_columns is not None
+
+    def compile_page(self, number: int, after: Optional[Sequence] = None) -> CompiledStatement:
+        """ Statement for page number (OFFSET/FETCH) or for the page after the given key values (keyset). """
+        if self.keyset:
+            statement = self._statement.set_keyset(self.key_columns, self.page_size, after)
+        else:
+            statement = self._statement.set_offset_fetch(number * self.page_size, self.page_size)
+        return statement.compile()
+
+    def _last_key(self, rows: List, columns: List[str]) -> Optional[Tuple]:
+        if not self.keyset or not rows:
+            return None
+        if self._key_positions is None:
+            names = [_column_key(column) for column in columns]
+            missing = [column for column in self.key_columns if _column_key(column) not in names]
+            if missing:
+                raise ValueError(f'Keyset columns {missing} must be in the select list')
+            self._key_positions = [names.index(_column_key(column)) for column in self.key_columns]
+        return tuple(rows[-1][position] for position in self._key_positions)
+
+    def fetch_page(self, number: int, after: Optional[Sequence] = None) -> Page:
+        compiled = self.compile_page(number, after)
+        start = time.perf_counter()
+        with self.pool.connection() as conn:
+            cursor = instrument_connection(conn, 'PageIterator').cursor()
+            try:
+                cursor.execute(*compiled)
+                columns = [column[0] for column in cursor.description]
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        return Page(number, rows, columns, self._last_key(rows, columns), time.perf_counter() - start)
+
+    def __iter__(self) -> Iterator[Page]:
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='PageIterator') if self.prefetch else None
+
+        def request(number: int, after: Optional[Sequence]) -> Callable[[], Page]:
+            if executor is None:
+                return lambda: self.fetch_page(number, after)
+            return executor.submit(self.fetch_page, number, after).result
+
+        number, fetched = self.start_page, 0
+        pending = request(number, self.after)
+        try:
+            while pending is not None:
+                page = pending()
+                fetched += 1
+                last = len(page.rows) < self.page_size or (self.max_pages is not None and fetched >= self.max_pages)
+                # Queue the next page before handing this one over, so it loads while the caller is busy.
+                pending = None if last else request(number + 1, page.last_key)
+                if page.rows:
+                    yield page
+                number += 1
+        finally:
+            if executor is not None:
+                # A page still in flight holds a pooled connection, so let it finish before returning.
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def rows(self) -> Iterator:
+        for page in self:
+            yield from page.rows
@@ -0,0 +1,400 @@
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, List, Literal, Optional, Sequence, Tuple, Union
+
+from .sql_script_runner import SqlBatch, split_batches
+
+SHOWPLAN_NAMESPACE = 'http://schemas.microsoft.com/sqlserver/2004/07/showplan'
+# Column name SQL Server gives the plan result sets of SHOWPLAN_XML and STATISTICS XML.
+SHOWPLAN_COLUMN = 'Microsoft SQL Server 2005 XML Showplan'
+
+IssueKind = Literal['scan', 'key_lookup', 'implicit_conversion', 'missing_index', 'warning']
+
+_NS = {'p': SHOWPLAN_NAMESPACE}
+_SCAN_OPS = {'Table Scan', 'Clustered Index Scan', 'Index Scan', 'Columnstore Index Scan'}
+_LOOKUP_OPS = {'Key Lookup', 'RID Lookup'}
+_XML_DECLARATION = re.compile(r'^\s*<\?xml[^>]*\?>')
+_CONVERT_IMPLICIT = re.compile(r'CONVERT_IMPLICIT\([^()]*(?:\([^()]*\)[^()]*)*\)')
+_IO_TABLE = re.compile(r"Table '([^']+)'\.(.*)")
+_IO_COUNTER = re.compile(r'([a-z][a-z -]*?)\s+(\d+)', re.IGNORECASE)
+_TIME = re.compile(r'CPU time = (\d+) ms,\s+elapsed time = (\d+) ms')
+
+
+def _tag(element: ET.Element) -> str:
+    return element.tag.rsplit('}', 1)[-1]
+
+
+def _float(value: Optional[str]) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _strip_brackets(name: Optional[str]) -> str:
+    return (name or '').strip('[]')
+
+
+def _shallow(element: ET.Element, tag: str) -> Iterator[ET.Element]:
+    """ Descendants named tag that belong to this operator, i.e. are not inside a nested RelOp. """
+    for child in element:
+        child_tag = _tag(child)
+        if child_tag == tag:
+            yield child
+        elif child_tag != 'RelOp':
+            yield from _shallow(child, tag)
+
+
+@dataclass
+class PlanIssue:
+    kind: IssueKind
+    message: str
+    statement_index: int = 0
+    node_id: Optional[int] = None
+    cost: float = 0.0
+
+    def __str__(self) -> str:
+        node = f' node {self.node_id}' if self.node_id is not None else ''
+        return f'[{self.kind}] statement {self.statement_index}{node} (cost {self.cost:.4f}): {self.message}'
+
+
+@dataclass
+class PlanNode:
+    node_id: int
+    physical_op: str
+    logical_op: str
+    estimated_rows: float = 0.0
+    estimated_cost: float = 0.0
+    estimated_io: float = 0.0
+    estimated_cpu: float = 0.0
+    object_name: str = ''
+    index_name: str = ''
+    predicate: str = ''
+    seek_predicate: str = ''
+    actual_rows: Optional[int] = None
+    actual_executions: Optional[int] = None
+    actual_logical_reads: Optional[int] = None
+    is_lookup: bool = False
+    warnings: List[str] = field(default_factory=list)
+    children: List['PlanNode'] = field(default_factory=list)
+
+    @property
+    def own_cost(self) -> float:
+        """ Estimated cost of this operator alone (subtree cost minus the children's). """
+        return max(self.estimated_cost - sum(child.estimated_cost for child in self.children), 0.0)
+
+    def walk(self) -> Iterator['PlanNode']:
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def format(self, depth: int = 0) -> str:
+        target = f' {self.object_name}' + (f'.{self.index_name}' if self.index_name else '') if self.object_name else ''
+        actual = f' actual={self.actual_rows}' if self.actual_rows is not None else ''
+        lines = [f'{"  " * depth}{self.node_id}: {self.physical_op}{target} '
+                 f'est_rows={self.estimated_rows:g}{actual} cost={self.estimated_cost:.4f}']
+        lines.extend(child.format(depth + 1) for child in self.children)
+        return '\n'.join(lines)
+
+
+@dataclass
+class MissingIndex:
+    impact: float
+    database: str
+    schema: str
+    table: str
+    equality_columns: List[str] = field(default_factory=list)
+    inequality_columns: List[str] = field(default_factory=list)
+    include_columns: List[str] = field(default_factory=list)
+
+    @property
+    def table_name(self) -> str:
+        return f'[{self.schema}].[{self.table}]'
+
+    def create_statement(self, index_name: Optional[str] = None) -> str:
+        key_columns = self.equality_columns + self.inequality_columns
+        index_name = index_name or f'IX_{self.table}_{"_".join(key_columns)}'[:128]
+        statement = (f'CREATE NONCLUSTERED INDEX [{index_name}] ON {self.table_name} '
+                     f'({", ".join(f"[{column}]" for column in key_columns)})')
+        if self.include_columns:
+            statement += f' INCLUDE ({", ".join(f"[{column}]" for column in self.include_columns)})'
+        return statement
+
+    def __str__(self) -> str:
+        return f'{self.impact:.1f}% impact: {self.create_statement()}'
+
+
+@dataclass
+class StatementPlan:
+    index: int
+    statement_text: str
+    statement_type: str
+    estimated_cost: float = 0.0
+    estimated_rows: float = 0.0
+    root: Optional[PlanNode] = None
+    missing_indexes: List[MissingIndex] = field(default_factory=list)
+    issues: List[PlanIssue] = field(default_factory=list)
+
+    def nodes(self) -> Iterator[PlanNode]:
+        if self.root is not None:
+            yield from self.root.walk()
+
+
+@dataclass
+class QueryPlan:
+    """ A parsed ShowPlanXML document: one StatementPlan per statement in the batch. """
+    xml: str
+    statements: List[StatementPlan] = field(default_factory=list)
+
+    @property
+    def issues(self) -> List[PlanIssue]:
+        """ Issues of every statement, most expensive first. """
+        issues = [issue for statement in self.statements for issue in statement.issues]
+        return sorted(issues, key=lambda issue: issue.cost, reverse=True)
+
+    @property
+    def missing_indexes(self) -> List[MissingIndex]:
+        return [index for statement in self.statements for index in statement.missing_indexes]
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """ Write the plan XML; a .sqlplan extension opens in SSMS. """
+        path = Path(path)
+        path.write_text(self.xml, encoding='utf-8')
+        return path
+
+    def report(self) -> str:
+        lines = []
+        for statement in self.statements:
+            lines.append(f'Statement {statement.index} ({statement.statement_type}, '
+                         f'cost {statement.estimated_cost:.4f}): {" ".join(statement.statement_text.split())[:200]}')
+            if statement.root is not None:
+                lines.append(statement.root.format(1))
+        issues = self.issues
+        lines.append(f'Issues: {len(issues)}')
+        lines.extend(f'  {issue}' for issue in issues)
+        return '\n'.join(lines)
+
+
+def _parse_node(rel_op: ET.Element, statement_index: int, issues: List[PlanIssue]) -> PlanNode:
+    node = PlanNode(node_id=int(rel_op.get('NodeId', -1)),
+                    physical_op=rel_op.get('PhysicalOp', ''),
+                    logical_op=rel_op.get('LogicalOp', ''),
+                    estimated_rows=_float(rel_op.get('EstimateRows')) or 0.0,
+                    estimated_cost=_float(rel_op.get('EstimatedTotalSubtreeCost')) or 0.0,
+                    estimated_io=_float(rel_op.get('EstimateIO')) or 0.0,
+                    estimated_cpu=_float(rel_op.get('EstimateCPU')) or 0.0)
+    for index_scan in _shallow(rel_op, 'IndexScan'):
+        node.is_lookup = node.is_lookup or index_scan.get('Lookup') in ('1', 'true')
+    for plan_object in _shallow(rel_op, 'Object'):
+        node.object_name = '.'.join(_strip_brackets(plan_object.get(part))
+                                    for part in ('Schema', 'Table') if plan_object.get(part))
+        node.index_name = _strip_brackets(plan_object.get('Index'))
+        break
+    for predicate in _shallow(rel_op, 'Predicate'):
+        node.predicate = ' AND '.join(filter(None, (node.predicate, *(
+            scalar.get('ScalarString', '') for scalar in predicate.iterfind('p:ScalarOperator', _NS)))))
+    for seek in _shallow(rel_op, 'SeekPredicates'):
+        node.seek_predicate = ' '.join(scalar.get('ScalarString', '')
+                                       for scalar in seek.iter(f'{{{SHOWPLAN_NAMESPACE}}}ScalarOperator')
+                                       if scalar.get('ScalarString'))
+    runtime = rel_op.find('p:RunTimeInformation', _NS)
+    if runtime is not None:
+        counters = runtime.findall('p:RunTimeCountersPerThread', _NS)
+        node.actual_rows = sum(int(counter.get('ActualRows', 0)) for counter in counters)
+        node.actual_executions = sum(int(counter.get('ActualExecutions', 0)) for counter in counters)
+        if any(counter.get('ActualLogicalReads') is not None for counter in counters):
+            node.actual_logical_reads = sum(int(counter.get('ActualLogicalReads', 0)) for counter in counters)
+    for warnings in rel_op.findall('p:Warnings', _NS):
+        node.warnings.extend(f'{name}={value}' for name, value in warnings.attrib.items())
+        node.warnings.extend(_tag(child) for child in warnings)
+    for child in _shallow(rel_op, 'RelOp'):
+        node.children.append(_parse_node(child, statement_index, issues))
+
+    cost = node.own_cost
+    target = node.object_name + (f' ({node.index_name})' if node.index_name else '')
+    if node.physical_op in _SCAN_OPS and not node.is_lookup:
+        rows = f', {node.actual_rows} actual' if node.actual_rows is not None else ''
+        filtered = f' filtered by {node.predicate}' if node.predicate else ''
+        issues.append(PlanIssue('scan', f'{node.physical_op} on {target}: {node.estimated_rows:g} estimated rows'
+                                        f'{rows}{filtered}', statement_index, node.node_id, cost))
+    if node.physical_op in _LOOKUP_OPS or node.is_lookup:
+        executions = f' x{node.actual_executions}' if node.actual_executions is not None else ''
+        issues.append(PlanIssue('key_lookup', f'{node.physical_op} on {target}{executions}; '
+                                              f'consider covering the columns with INCLUDE',
+                                statement_index, node.node_id, cost))
+    for expression in _CONVERT_IMPLICIT.findall(f'{node.seek_predicate} {node.predicate}'):
+        issues.append(PlanIssue('implicit_conversion', f'{expression} in predicate of {node.physical_op} on {target}',
+                                statement_index, node.node_id, cost))
+    for warning in node.warnings:
+        issues.append(PlanIssue('warning', f'{warning} on {node.physical_op}', statement_index, node.node_id, cost))
+    return node
+
+
+def _parse_missing_indexes(query_plan: ET.Element) -> List[MissingIndex]:
+    missing_indexes = []
+    for group in query_plan.iterfind('p:MissingIndexes/p:MissingIndexGroup', _NS):
+        for index in group.iterfind('p:MissingIndex', _NS):
+            missing = MissingIndex(_float(group.get('Impact')) or 0.0, _strip_brackets(index.get('Database')),
+                                   _strip_brackets(index.get('Schema')), _strip_brackets(index.get('Table')))
+            for column_group in index.iterfind('p:ColumnGroup', _NS):
+                columns = [_strip_brackets(column.get('Name')) for column in column_group.iterfind('p:Column', _NS)]
+                usage = column_group.get('Usage')
+                if usage == 'EQUALITY':
+                    missing.equality_columns.extend(columns)
+                elif usage == 'INEQUALITY':
+                    missing.inequality_columns.extend(columns)
+                else:
+                    missing.include_columns.extend(columns)
+            missing_indexes.append(missing)
+    return missing_indexes
+
+
+def _parse_statement(statement: ET.Element, index: int) -> StatementPlan:
+    statement_plan = StatementPlan(index, statement.get('StatementText', ''), statement.get('StatementType', ''),
+                                   _float(statement.get('StatementSubTreeCost')) or 0.0,
+                                   _float(statement.get('StatementEstRows')) or 0.0)
+    query_plan = statement.find('p:QueryPlan', _NS)
+    if query_plan is None:
+        return statement_plan
+    root = query_plan.find('p:RelOp', _NS)
+    if root is not None:
+        statement_plan.root = _parse_node(root, index, statement_plan.issues)
+    statement_plan.missing_indexes = _parse_missing_indexes(query_plan)
+    for missing in statement_plan.missing_indexes:
+        statement_plan.issues.append(PlanIssue('missing_index', str(missing), index,
+                                               cost=statement_plan.estimated_cost * missing.impact / 100))
+    for convert in query_plan.iterfind('p:Warnings/p:PlanAffectingConvert', _NS):
+        statement_plan.issues.append(PlanIssue('implicit_conversion',
+                                               f'{convert.get("Expression")} may affect {convert.get("ConvertIssue")}',
+                                               index, cost=statement_plan.estimated_cost))
+    return statement_plan
+
+
+def parse_plan(plan_xml: Union[str, bytes]) -> QueryPlan:
+    """ Parse SHOWPLAN_XML / STATISTICS XML output (or a saved .sqlplan) into a QueryPlan. No connection needed. """
+    if isinstance(plan_xml, bytes):
+        plan_xml = plan_xml.decode('utf-16' if plan_xml[:2] in (b'\xff\xfe', b'\xfe\xff') else 'utf-8-sig')
+    plan_xml = _XML_DECLARATION.sub('', plan_xml, count=1)
+    root = ET.fromstring(plan_xml)
+    plan = QueryPlan(plan_xml)
+    # StmtSimple covers SELECT/DML; StmtCond/StmtCursor etc. carry their plans on nested StmtSimple elements.
+    for index, statement in enumerate(root.iter(f'{{{SHOWPLAN_NAMESPACE}}}StmtSimple')):
+        plan.statements.append(_parse_statement(statement, index))
+    return plan
+
+
+def load_plan(path: Union[str, Path]) -> QueryPlan:
+    """ Parse a plan saved to disk, e.g. a .sqlplan from SSMS (UTF-16 or UTF-8). """
+    return parse_plan(Path(path).read_bytes())
+
+
+@dataclass
+class IoStatistic:
+    table: str
+    counters: dict = field(default_factory=dict)
+
+    @property
+    def logical_reads(self) -> int:
+        return self.counters.get('logical reads', 0)
+
+    @property
+    def physical_reads(self) -> int:
+        return self.counters.get('physical reads', 0)
+
+    @property
+    def scan_count(self) -> int:
+        return self.counters.get('Scan count', 0)
+
+
+@dataclass
+class TimeStatistic:
+    kind: str
+    cpu_ms: int
+    elapsed_ms: int
+
+
+def parse_statistics_messages(messages: Sequence[str]) -> Tuple[List[IoStatistic], List[TimeStatistic]]:
+    """ Parse SET STATISTICS IO / TIME informational messages. """
+    io_statistics, time_statistics = [], []
+    kind = 'execution'
+    for message in messages:
+        if 'parse and compile time' in message:
+            kind = 'parse_compile'
+        elif 'Execution Times' in message:
+            kind = 'execution'
+        io_match = _IO_TABLE.search(message)
+        if io_match:
+            counters = {name.strip(): int(value) for name, value in _IO_COUNTER.findall(io_match.group(2))}
+            io_statistics.append(IoStatistic(io_match.group(1), counters))
+            continue
+        for cpu_ms, elapsed_ms in _TIME.findall(message):
+            time_statistics.append(TimeStatistic(kind, int(cpu_ms), int(elapsed_ms)))
+    return io_statistics, time_statistics
+
+
+@dataclass
+class PlanCapture:
+    plans: List[QueryPlan] = field(default_factory=list)
+    io_statistics: List[IoStatistic] = field(default_factory=list)
+    time_statistics: List[TimeStatistic] = field(default_factory=list)
+    messages: List[str] = field(default_factory=list)
+    actual: bool = False
+
+    @property
+    def statements(self) -> List[StatementPlan]:
+        return [statement for plan in self.plans for statement in plan.statements]
+
+    @property
+    def issues(self) -> List[PlanIssue]:
+        return sorted((issue for plan in self.plans for issue in plan.issues), key=lambda issue: issue.cost,
+                      reverse=True)
+
+    def report(self) -> str:
+        lines = [plan.report() for plan in self.plans]
+        for io in self.io_statistics:
+            lines.append(f'IO {io.table}: scans {io.scan_count}, logical reads {io.logical_reads}, '
+                         f'physical reads {io.physical_reads}')
+        for timing in self.time_statistics:
+            lines.append(f'Time ({timing.kind}): CPU {timing.cpu_ms} ms, elapsed {timing.elapsed_ms} ms')
+        return '\n'.join(lines)
+
+
+def _drain_messages(cursor, messages: List[str]) -> None:
+    for message in getattr(cursor, 'messages', None) or []:
+        messages.append(message[1] if isinstance(message, tuple) else str(message))
+
+
+def capture_plan(cursor, sql: Union[str, Sequence[SqlBatch]], actual: bool = False,
+                 statistics: bool = True) -> PlanCapture:
+    """
+    Capture execution plans for SQL text (split on GO) or pre-split batches on an open cursor.
+    The estimated plan (SHOWPLAN_XML) compiles without running anything. actual=True runs the batches
+    under STATISTICS XML (plus STATISTICS IO, TIME when statistics is set); the caller decides whether
+    to commit or roll back.
+    """
+    batches = split_batches(sql) if isinstance(sql, str) else list(sql)
+    if actual:
+        settings = ['STATISTICS XML'] + (['STATISTICS IO', 'STATISTICS TIME'] if statistics else [])
+    else:
+        settings = ['SHOWPLAN_XML']
+    capture = PlanCapture(actual=actual)
+    # SET SHOWPLAN_XML must be alone in its batch, so every setting is its own execute.
+    for setting in settings:
+        cursor.execute(f'SET {setting} ON')
+    try:
+        for batch in batches:
+            for _ in range(batch.repeat):
+                cursor.execute(batch.sql)
+                while True:
+                    _drain_messages(cursor, capture.messages)
+                    if cursor.description:
+                        is_plan = cursor.description[0][0] == SHOWPLAN_COLUMN
+                        rows = cursor.fetchall()
+                        if is_plan:
+                            capture.plans.extend(parse_plan(row[0]) for row in rows)
+                    if not cursor.nextset():
+                        break
+    finally:
+        for setting in reversed(settings):
+            cursor.execute(f'SET {setting} OFF')
+    capture.io_statistics, capture.time_statistics = parse_statistics_messages(capture.messages)
+    return capture
@@ -0,0 +1,345 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pyodbc
+
+from .sql_instrumentation import metrics
+
+PoolKey = Tuple[str, str, str]
+
+
+def build_connection_string(server: str, database: str, trusted_connection: str) -> str:
+    return (f'DRIVER=ODBC Driver 17 for SQL Server;'
+            f'SERVER={server};'
+            f'DATABASE={database};'
+            f'Trusted_Connection={trusted_connection}')
+
+
+def _default_connect(server: str, database: str, trusted_connection: str):
+    return pyodbc.connect(build_connection_string(server, database, trusted_connection))
+
+
+@dataclass
+class PoolStats:
+    """
+    Snapshot of a connection pool's counters.
+    """
+    borrows: int = 0
+    hits: int = 0
+    misses: int = 0
+    health_check_failures: int = 0
+    idle_evictions: int = 0
+    live_connections: int = 0
+    idle_connections: int = 0
+    in_use_connections: int = 0
+    total_borrow_wait: float = 0.0
+    max_borrow_wait: float = 0.0
+    total_connect_time: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.borrows if self.borrows else 0.0
+
+    @property
+    def avg_borrow_wait(self) -> float:
+        return self.total_borrow_wait / self.borrows if self.borrows else 0.0
+
+
+@dataclass
+class _PooledConnection:
+    conn: object
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class SqlConnectionPool:
+    """
+    Thread safe pool of DBAPI connections for a single (server, database, auth) key.
+    Idle connections are reused LIFO and closed after idle_timeout seconds. A connection idle for longer
+    than health_check_after seconds is validated with health_check_query before it is handed out; recently
+    used ones skip the round trip (0 checks every borrow).
+    """
+
+    def __init__(self, server: str, database: str, trusted_connection: str = 'yes', min_size: int = 0,
+                 max_size: int = 5, idle_timeout: float = 300.0, health_check: bool = True,
+                 health_check_query: str = 'SELECT 1', borrow_timeout: Optional[float] = 30.0,
+                 connect_func: Callable[[str, str, str], object] = _default_connect,
+                 health_check_after: float = 30.0):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        if min_size > max_size:
+            raise ValueError('min_size cannot be larger than max_size')
+        self.server = server
+        self.database = database
+        self.trusted_connection = trusted_connection
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check
+        self.health_check_query = health_check_query
+        self.health_check_after = health_check_after
+        self.borrow_timeout = borrow_timeout
+        self.connect_func = connect_func
+        self._idle: List[_PooledConnection] = []
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._stats = PoolStats()
+        self._closed = False
+        if min_size:
+            self.warm_up(min_size)
+
+    @property
+    def key(self) -> PoolKey:
+        return self.server, self.database, self.trusted_connection
+
+    @property
+    def live_connections(self) -> int:
+        return len(self._idle) + len(self._in_use) + self._pending
+
+    def _connect(self) -> _PooledConnection:
+        start = time.perf_counter()
+        conn = self.connect_func(self.server, self.database, self.trusted_connection)
+        elapsed = time.perf_counter() - start
+        metrics.record_connect(elapsed)
+        with self._lock:
+            self._stats.total_connect_time += elapsed
+        return _PooledConnection(conn)
+
+    @staticmethod
+    def _close_quietly(pooled: _PooledConnection):
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+
+    def _needs_health_check(self, pooled: _PooledConnection) -> bool:
+        return self.health_check and time.monotonic() - pooled.last_used >= self.health_check_after
+
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        cursor = None
+        try:
+            cursor = pooled.conn.cursor()
+            cursor.execute(self.health_check_query)
+            cursor.fetchall()
+            return True
+        except Exception:
+            return False
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+
+    def _evict_idle(self) -> List[_PooledConnection]:
+        """ Remove idle connections past idle_timeout while keeping min_size live. Caller holds the lock. """
+        if self.idle_timeout is None:
+            return []
+        now = time.monotonic()
+        evicted = []
+        keep = []
+        # Oldest idle connections sit at the front of the list.
+        for pooled in self._idle:
+            if (now - pooled.last_used > self.idle_timeout
+                    and self.live_connections - len(evicted) > self.min_size):
+                evicted.append(pooled)
+            else:
+                keep.append(pooled)
+        self._idle = keep
+        self._stats.idle_evictions += len(evicted)
+        return evicted
+
+    def borrow(self):
+        """
+        Borrow a connection, waiting up to borrow_timeout seconds when the pool is exhausted.
+        The connection must be handed back with release().
+        """
+        start = time.perf_counter()
+        deadline = None if self.borrow_timeout is None else time.monotonic() + self.borrow_timeout
+        while True:
+            pooled = None
+            evicted = []
+            try:
+                with self._available:
+                    evicted = self._evict_idle()
+                    while True:
+                        # Rechecked after every wait: close() wakes all waiters.
+                        if self._closed:
+                            raise RuntimeError(f'Connection pool {self.key} is closed')
+                        if self._idle or self.live_connections < self.max_size:
+                            break
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            raise TimeoutError(f'Timed out waiting for a connection from pool {self.key}')
+                        self._available.wait(remaining)
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        self._in_use[id(pooled.conn)] = pooled
+                    else:
+                        # Reserve the slot so concurrent borrowers respect max_size while we connect.
+                        self._pending += 1
+            finally:
+                # Also when raising: the evicted connections have already left _idle.
+                for stale in evicted:
+                    self._close_quietly(stale)
+
+            if pooled is None:
+                try:
+                    pooled = self._connect()
+                except Exception:
+                    with self._available:
+                        self._pending -= 1
+                        self._available.notify()
+                    raise
+                with self._lock:
+                    self._pending -= 1
+                    closed = self._closed
+                    if not closed:
+                        self._in_use[id(pooled.conn)] = pooled
+                        self._stats.misses += 1
+                if closed:
+                    self._close_quietly(pooled)
+                    raise RuntimeError(f'Connection pool {self.key} is closed')
+            elif self._needs_health_check(pooled) and not self._is_healthy(pooled):
+                with self._available:
+                    self._in_use.pop(id(pooled.conn), None)
+                    self._stats.health_check_failures += 1
+                    self._available.notify()
+                self._close_quietly(pooled)
+                continue
+            else:
+                with self._lock:
+                    self._stats.hits += 1
+
+            wait = time.perf_counter() - start
+            with self._lock:
+                self._stats.borrows += 1
+                self._stats.total_borrow_wait += wait
+                self._stats.max_borrow_wait = max(self._stats.max_borrow_wait, wait)
+            pooled.last_used = time.monotonic()
+            return pooled.conn
+
+    def release(self, conn, discard: bool = False):
+        """
+        Return a borrowed connection. Discarded connections are closed instead of reused.
+        """
+        with self._available:
+            pooled = self._in_use.pop(id(conn), None)
+            if pooled is None:
+                raise ValueError('Connection was not borrowed from this pool')
+        if not discard and not self._closed:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        with self._available:
+            if discard or self._closed:
+                to_close = pooled
+            else:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+                to_close = None
+            self._available.notify()
+        if to_close is not None:
+            self._close_quietly(to_close)
+
+    @contextmanager
+    def connection(self):
+        """ Borrow a connection for the duration of a with block. """
+        conn = self.borrow()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def warm_up(self, count: int) -> int:
+        """
+        Eagerly open connections until at least count are live, bounded by max_size.
+        Returns the number of connections opened.
+        """
+        opened = 0
+        while True:
+            with self._lock:
+                if self._closed or self.live_connections >= min(count, self.max_size):
+                    return opened
+                self._pending += 1
+            try:
+                pooled = self._connect()
+            except Exception:
+                with self._available:
+                    self._pending -= 1
+                    self._available.notify()
+                raise
+            with self._available:
+                self._pending -= 1
+                self._idle.insert(0, pooled)
+                self._available.notify()
+            opened += 1
+
+    def stats(self) -> PoolStats:
+        with self._lock:
+            snapshot = PoolStats(**{k: v for k, v in vars(self._stats).items()})
+            snapshot.idle_connections = len(self._idle)
+            snapshot.in_use_connections = len(self._in_use)
+            snapshot.live_connections = self.live_connections
+        return snapshot
+
+    def close(self):
+        """ Close idle connections and refuse new borrows. In-use connections close on release. """
+        with self._available:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._available.notify_all()
+        for pooled in idle:
+            self._close_quietly(pooled)
+
+
+_pools: Dict[PoolKey, SqlConnectionPool] = {}
+_pools_lock = threading.Lock()
+_pool_defaults: dict = {}
+
+
+def configure_pools(**pool_kwargs) -> None:
+    """
+    Set default SqlConnectionPool keyword arguments (min_size, max_size, idle_timeout, connect_func, ...)
+    used by get_pool for pools that have not been created yet.
+    """
+    _pool_defaults.update(pool_kwargs)
+
+
+def new_pool(server: str, database: str, trusted_connection: str = 'yes', **pool_kwargs) -> SqlConnectionPool:
+    """ A private pool (not shared through get_pool) with the configure_pools defaults; the caller closes it. """
+    return SqlConnectionPool(server, database, trusted_connection, **{**_pool_defaults, **pool_kwargs})
+
+
+def get_pool(server: str, database: str, trusted_connection: str = 'yes', **pool_kwargs) -> SqlConnectionPool:
+    """
+    Get or create the shared pool for a (server, database, auth) key.
+    Keyword arguments only apply when the pool is first created.
+    """
+    key = (server, database, trusted_connection)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = new_pool(server, database, trusted_connection, **pool_kwargs)
+            _pools[key] = pool
+        return pool
+
+
+def all_pool_stats() -> Dict[PoolKey, PoolStats]:
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.key: pool.stats() for pool in pools}
+
+
+def close_all_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
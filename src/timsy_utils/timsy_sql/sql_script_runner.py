@@ -0,0 +1,192 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .sql_file import get_scripts
+from .sql_instrumentation import instrument_cursor
+from .sql_pool import SqlConnectionPool
+
+# A batch separator is a line holding only GO, optionally followed by a repeat count and a comment.
+_GO_PATTERN = re.compile(r'^[ \t]*GO(?:[ \t]+(\d+))?[ \t]*(?:--[^\n]*)?[ \t]*\r?$', re.IGNORECASE | re.MULTILINE)
+_USE_PATTERN = re.compile(r'^\s*USE\s', re.IGNORECASE | re.MULTILINE)
+
+
+@dataclass(frozen=True)
+class SqlBatch:
+    index: int
+    sql: str
+    repeat: int = 1
+
+    @property
+    def changes_database(self) -> bool:
+        return bool(_USE_PATTERN.search(self.sql))
+
+
+def split_batches(sql_text: str) -> List[SqlBatch]:
+    """ Split a script on GO separator lines the way SSMS/sqlcmd do. Empty batches are dropped. """
+    batches = []
+    position = 0
+    for match in _GO_PATTERN.finditer(sql_text):
+        sql = sql_text[position:match.start()].strip()
+        if sql:
+            batches.append(SqlBatch(len(batches), sql, int(match.group(1) or 1)))
+        position = match.end()
+    sql = sql_text[position:].strip()
+    if sql:
+        batches.append(SqlBatch(len(batches), sql))
+    return batches
+
+
+_batch_cache: Dict[Path, Tuple[int, int, List[SqlBatch]]] = {}
+_batch_cache_lock = threading.Lock()
+
+
+def load_batches(script_path: Union[str, Path]) -> List[SqlBatch]:
+    """ Parse a .sql file into batches, reusing the parsed result until the file's mtime or size changes. """
+    script_path = Path(script_path).resolve()
+    stat = script_path.stat()
+    with _batch_cache_lock:
+        cached = _batch_cache.get(script_path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    batches = split_batches(script_path.read_text())
+    with _batch_cache_lock:
+        _batch_cache[script_path] = (stat.st_mtime_ns, stat.st_size, batches)
+    return batches
+
+
+@dataclass
+class BatchResult:
+    script: str
+    index: int
+    seconds: float = 0.0
+    rowcount: int = -1
+    rows_returned: int = 0
+    error: Optional[str] = None
+    rows: Optional[List] = None
+
+
+@dataclass
+class ScriptResult:
+    script: Path
+    batches: List[BatchResult] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return all(batch.error is None for batch in self.batches)
+
+    def __str__(self) -> str:
+        status = 'OK' if self.ok else 'FAILED'
+        lines = [f'{self.script.name}: {status} in {self.seconds:.3f}s ({len(self.batches)} batches)']
+        for batch in self.batches:
+            detail = batch.error or f'rowcount={batch.rowcount}, rows_returned={batch.rows_returned}'
+            lines.append(f'\tbatch {batch.index}: {batch.seconds:.3f}s {detail}')
+        return '\n'.join(lines)
+
+
+class SqlScriptRunner:
+    """
+    Run .sql scripts batch by batch over a bounded connection pool.
+    Each script runs on one borrowed connection (temp tables and SET options carry across its batches)
+    and commits at the end. Scripts run one after another in the given order, since a script may depend on
+    an earlier one; only scripts explicitly grouped as independent (run_groups) run concurrently, at most
+    pool.max_size at a time.
+    """
+
+    def __init__(self, pool: SqlConnectionPool, max_workers: Optional[int] = None, stop_on_error: bool = True,
+                 keep_rows: bool = False):
+        self.pool = pool
+        self.max_workers = min(max_workers or pool.max_size, pool.max_size)
+        self.stop_on_error = stop_on_error
+        self.keep_rows = keep_rows
+
+    def _run_batch(self, cursor, script_name: str, batch: SqlBatch) -> BatchResult:
+        result = BatchResult(script_name, batch.index, rows=[] if self.keep_rows else None)
+        start = time.perf_counter()
+        try:
+            for _ in range(batch.repeat):
+                cursor.execute(batch.sql)
+                # Rows affected by every statement of all GO n executions; -1 (unknown) only if none reported.
+                while True:
+                    if cursor.rowcount >= 0:
+                        result.rowcount = max(result.rowcount, 0) + cursor.rowcount
+                    if cursor.description:
+                        rows = cursor.fetchall()
+                        result.rows_returned += len(rows)
+                        if self.keep_rows:
+                            result.rows.append(rows)
+                    if not (hasattr(cursor, 'nextset') and cursor.nextset()):
+                        break
+        except Exception as e:
+            result.error = f'{type(e).__name__}: {e}'
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def run_script(self, script_path: Union[str, Path]) -> ScriptResult:
+        script_path = Path(script_path)
+        batches = load_batches(script_path)
+        script_result = ScriptResult(script_path)
+        start = time.perf_counter()
+        conn = self.pool.borrow()
+        # USE changes the pooled connection's database, so such connections are not reused.
+        discard = any(batch.changes_database for batch in batches)
+        try:
+            cursor = instrument_cursor(conn.cursor(), 'SqlScriptRunner')
+            try:
+                for batch in batches:
+                    batch_result = self._run_batch(cursor, script_path.name, batch)
+                    script_result.batches.append(batch_result)
+                    if batch_result.error and self.stop_on_error:
+                        break
+            finally:
+                cursor.close()
+            if script_result.ok:
+                conn.commit()
+            else:
+                conn.rollback()
+        except Exception:
+            discard = True
+            raise
+        finally:
+            self.pool.release(conn, discard=discard)
+            script_result.seconds = time.perf_counter() - start
+        return script_result
+
+    def run_scripts(self, script_paths: Iterable[Union[str, Path]]) -> List[ScriptResult]:
+        """ Run scripts one at a time in order. With stop_on_error, scripts after a failed one are not run. """
+        results = []
+        for path in script_paths:
+            results.append(self.run_script(path))
+            if not results[-1].ok and self.stop_on_error:
+                break
+        return results
+
+    def run_concurrently(self, script_paths: Iterable[Union[str, Path]]) -> List[ScriptResult]:
+        """ Run scripts the caller knows to be independent concurrently, returning results in input order. """
+        script_paths = list(script_paths)
+        if self.max_workers == 1 or len(script_paths) < 2:
+            return [self.run_script(path) for path in script_paths]
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='SqlScriptRunner') as executor:
+            return list(executor.map(self.run_script, script_paths))
+
+    def run_groups(self, script_groups: Iterable[Sequence[Union[str, Path]]]) -> List[ScriptResult]:
+        """
+        Run groups in order; the scripts inside a group are independent of each other and run concurrently.
+        With stop_on_error, groups after one holding a failed script are not run.
+        """
+        results = []
+        for group in script_groups:
+            group_results = self.run_concurrently(group)
+            results.extend(group_results)
+            if self.stop_on_error and not all(result.ok for result in group_results):
+                break
+        return results
+
+    def run_folder(self, script_path: Union[str, Path, None] = None) -> List[ScriptResult]:
+        """ Run every .sql file found by sql_file.get_scripts one at a time, in sorted order. """
+        return self.run_scripts(sorted(get_scripts(script_path)))
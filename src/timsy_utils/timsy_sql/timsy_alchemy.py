@@ -1,17 +1,132 @@
 import configparser
-from typing import Sequence, List, Union, Callable, Literal
-from sqlalchemy import create_engine, text, Column, Integer, String, MetaData, Table
+import csv
+import threading
+from typing import Sequence, List, Union, Callable, Literal, Dict, Optional, Tuple, Iterator, Any
+from sqlalchemy import create_engine, text, Column, Integer, String, MetaData, Table, Executable
 from sqlalchemy.engine import CursorResult, Engine
 from sqlalchemy.orm import sessionmaker, Session, Query, declarative_base
 from sqlalchemy.schema import CreateTable
 import pandas as pd
 
+from .sql_instrumentation import instrument_engine
+
 # Debug print flag and function
 _IS_DEBUG_PRINT = False
 def _debug_print(*args, **kwargs):
     if _IS_DEBUG_PRINT:
         print(*args, **kwargs)
 
+# Process wide engines and reflected metadata, shared by every TimsySqlAlchemyUtil instance.
+_engine_registry: Dict[str, Engine] = {}
+_metadata_cache: Dict[str, MetaData] = {}
+# One lock per connection string: reflecting a table (a server round trip) blocks only that database's MetaData.
+_metadata_locks: Dict[str, threading.RLock] = {}
+_ddl_cache: Dict[Tuple[str, Optional[str], str], str] = {}
+_registry_lock = threading.RLock()
+
+
+def get_engine(connection_string: str, **engine_kwargs) -> Engine:
+    """
+    Return the shared engine (and its connection pool) for a connection string, creating it once.
+    engine_kwargs only apply on first creation.
+    """
+    with _registry_lock:
+        engine = _engine_registry.get(connection_string)
+        if engine is None:
+            engine = create_engine(connection_string, **engine_kwargs)
+            instrument_engine(engine)
+            _engine_registry[connection_string] = engine
+        return engine
+
+
+def _table_key(table_name: str, schema: Optional[str]) -> str:
+    return f'{schema}.{table_name}' if schema else table_name
+
+
+def _shared_metadata(connection_string: str) -> Tuple[MetaData, threading.RLock]:
+    with _registry_lock:
+        metadata = _metadata_cache.setdefault(connection_string, MetaData())
+        return metadata, _metadata_locks.setdefault(connection_string, threading.RLock())
+
+
+def reflect_table(connection_string: str, table_name: str, schema: Optional[str] = None) -> Table:
+    """
+    Reflect a table once per connection string and serve it from the shared MetaData afterwards.
+    The global registry lock is only held for the lookup; reflection runs under the database's own lock.
+    """
+    engine = get_engine(connection_string)
+    metadata, lock = _shared_metadata(connection_string)
+    with lock:
+        table = metadata.tables.get(_table_key(table_name, schema))
+        if table is None:
+            table = Table(table_name, metadata, autoload_with=engine, schema=schema)
+        return table
+
+
+def _fk_related_tables(metadata: MetaData, table: Table) -> List[Table]:
+    """
+    The table and every table linked to it by foreign keys, in either direction and transitively: the
+    tables reflected along with it and the tables holding references to its columns.
+    """
+    related = {table.key: table}
+    pending = [table]
+    while pending:
+        current = pending.pop()
+        linked = [metadata.tables.get(fk.target_fullname.rsplit('.', 1)[0]) for fk in current.foreign_keys]
+        linked += [other for other in metadata.tables.values()
+                   if any(fk.target_fullname.rsplit('.', 1)[0] == current.key for fk in other.foreign_keys)]
+        for other in linked:
+            if other is not None and other.key not in related:
+                related[other.key] = other
+                pending.append(other)
+    return list(related.values())
+
+
+def invalidate_reflection_cache(connection_string: Optional[str] = None, table_name: Optional[str] = None,
+                                schema: Optional[str] = None) -> None:
+    """
+    Forget reflected tables and cached DDL. With no arguments everything is cleared; with a connection
+    string only that database; with a table name that table and the tables linked to it by foreign keys,
+    whose reflected Table objects refer to each other.
+    """
+    with _registry_lock:
+        if connection_string is None:
+            _metadata_cache.clear()
+            _ddl_cache.clear()
+            return
+        if table_name is None:
+            _metadata_cache.pop(connection_string, None)
+            for key in [key for key in _ddl_cache if key[0] == connection_string]:
+                del _ddl_cache[key]
+            return
+        metadata = _metadata_cache.get(connection_string)
+        lock = _metadata_locks.get(connection_string)
+        _ddl_cache.pop((connection_string, schema, table_name), None)
+    if metadata is None:
+        return
+    with lock:
+        table = metadata.tables.get(_table_key(table_name, schema))
+        if table is None:
+            return
+        related = _fk_related_tables(metadata, table)
+        for related_table in related:
+            metadata.remove(related_table)
+    with _registry_lock:
+        for related_table in related:
+            _ddl_cache.pop((connection_string, related_table.schema, related_table.name), None)
+
+
+def dispose_engines() -> None:
+    """ Dispose every registered engine and clear the registry and reflection caches. """
+    with _registry_lock:
+        engines = list(_engine_registry.values())
+        _engine_registry.clear()
+        _metadata_cache.clear()
+        _ddl_cache.clear()
+    for engine in engines:
+        engine.dispose()
+
+
 class TimsySqlAlchemyUtil:
     """
     Flexible SQLAlchemy utility for engine/session management, query execution, ORM helpers, and config management.
@@ -37,7 +152,8 @@ class TimsySqlAlchemyUtil:
             self.username = section.get('username') or self.config['DEFAULT'].get('username')
             self.password = section.get('password') or self.config['DEFAULT'].get('password')
             connection_string = f"mssql+pyodbc://{self.username}:{self.password}@{self.server}/{self.database}"
-        self.engine: Engine = create_engine(connection_string)
+        self.connection_string = connection_string
+        self.engine: Engine = get_engine(connection_string)
         self.Session = sessionmaker(bind=self.engine)
         if set_default:
             TimsySqlAlchemyUtil.SqlAlchemyUtil = self
@@ -65,6 +181,64 @@ class TimsySqlAlchemyUtil:
         finally:
             session.close()
 
+    def _stream_partitions(self, query: Union[str, Executable], params: Optional[dict],
+                           batch_size: int) -> Iterator[Union[List[str], Sequence]]:
+        """ Yield the column names first, then partitions of a server side cursor result. """
+        if isinstance(query, str):
+            query = text(query)
+        session = self.Session()
+        result = None
+        try:
+            _debug_print('Streaming query in TimsySqlAlchemyUtil...')
+            result = session.execute(query, params or {},
+                                     execution_options={'stream_results': True, 'yield_per': batch_size})
+            yield list(result.keys())
+            yield from result.partitions(batch_size)
+        finally:
+            if result is not None:
+                result.close()
+            session.close()
+
+    def execute_stream(self, query: Union[str, Executable], params: Optional[dict] = None, batch_size: int = 10_000,
+                       output: Literal['rows', 'pandas', 'arrow'] = 'rows') -> Iterator[Any]:
+        """
+        Execute a query with a server side cursor and yield it in partitions of batch_size rows,
+        as lists of Rows, pandas DataFrames or pyarrow Tables. Nothing beyond one partition is buffered.
+        The session and cursor are closed when the iterator is exhausted, closed early (break / .close())
+        or garbage collected; wrap it in contextlib.closing to close deterministically.
+        """
+        if output == 'arrow':
+            import pyarrow
+        partitions = self._stream_partitions(query, params, batch_size)
+        try:
+            columns = next(partitions)
+            for partition in partitions:
+                if output == 'rows':
+                    yield partition
+                    continue
+                df = pd.DataFrame.from_records(partition, columns=columns)
+                yield df if output == 'pandas' else pyarrow.Table.from_pandas(df, preserve_index=False)
+        finally:
+            partitions.close()
+
+    def stream_to_csv(self, query: Union[str, Executable], csv_path: str, params: Optional[dict] = None,
+                      batch_size: int = 10_000, include_header: bool = True) -> int:
+        """ Stream a query straight into a CSV file without materializing it. Returns the row count. """
+        row_count = 0
+        partitions = self._stream_partitions(query, params, batch_size)
+        try:
+            with open(csv_path, 'w', newline='') as csv_file:
+                writer = csv.writer(csv_file)
+                columns = next(partitions)
+                if include_header:
+                    writer.writerow(columns)
+                for partition in partitions:
+                    writer.writerows(partition)
+                    row_count += len(partition)
+        finally:
+            partitions.close()
+        return row_count
+
     def run_sql_file(self, sql_file_path: str) -> CursorResult:
         def query_func(session):
             with open(sql_file_path, 'r') as file:
@@ -74,8 +248,7 @@ class TimsySqlAlchemyUtil:
 
     def query_all_tables(self, schema: str = 'Production', table_name: str = 'Product') -> Sequence:
         def query_func(session: Session) -> List:
-            metadata = MetaData(schema=schema)
-            table_data: Table = Table(table_name, metadata, autoload_with=self.engine)
+            table_data: Table = reflect_table(self.connection_string, table_name, schema)
             _debug_print("|***********\tSys_tables\t***********|", table_data)
             query: Query = session.query(table_data)
             _debug_print("|***********\tQuery\t***********|", query)
@@ -83,9 +256,18 @@ class TimsySqlAlchemyUtil:
         return self.execute(query_func, is_cursor_result=False)
 
     def query_create_table_stmt(self, table_name: str, schema: str = 'Production') -> str:
-        metadata = MetaData()
-        table = Table(table_name, metadata, autoload_with=self.engine, schema=schema)
-        return str(CreateTable(table))
+        key = (self.connection_string, schema, table_name)
+        statement = _ddl_cache.get(key)
+        if statement is None:
+            table = reflect_table(self.connection_string, table_name, schema)
+            statement = str(CreateTable(table))
+            with _registry_lock:
+                _ddl_cache[key] = statement
+        return statement
+
+    def invalidate_reflection(self, table_name: Optional[str] = None, schema: Optional[str] = None) -> None:
+        """ Drop this database's reflected tables (or one table) so the next call reflects again. """
+        invalidate_reflection_cache(self.connection_string, table_name, schema)
 
     @staticmethod
     def to_dataframe(query_result) -> pd.DataFrame:
@@ -130,7 +312,7 @@ class TimsySqlAlchemyUtil:
 
 # Expose useful SQLAlchemy objects for convenience
 __all__ = [
-    'TimsySqlAlchemyUtil', 'text', 'Engine', 'CursorResult', 'Session', 'Query', 'declarative_base',
+    'TimsySqlAlchemyUtil', 'get_engine', 'reflect_table', 'invalidate_reflection_cache', 'dispose_engines', 'text', 'Engine', 'CursorResult', 'Session', 'Query', 'declarative_base',
     'Column', 'Integer', 'String', 'MetaData', 'Table', 'CreateTable', 'pd', '_IS_DEBUG_PRINT', '_debug_print'
 ]
 
@@ -1,8 +1,35 @@
 import configparser
-from typing import List, Optional, Callable
+from typing import List, Optional, Callable, Iterator, Union
 import pyodbc
 import pandas as pd
 import html
+from pathlib import Path
+from contextlib import contextmanager
+
+from .catalog_cache import SqlCatalogCache
+from .catalog_crawler import CatalogCrawler, ServerCatalog
+from .column_lineage import ColumnLineage, ColumnLineageIndexer
+from .join_planner import JoinGraph
+from .df_chunking import DtypeMap, SpillFormat, iter_optimized_chunks, verify_spill_format
+from .query_result_cache import QueryResultCache
+from .sql_builder import SqlStatement
+from .sql_instrumentation import instrument_connection
+from .sql_models.columnar_catalog import ColumnarCatalog
+from .sql_models.server_model import ServerModel
+from .sql_paging import PageIterator
+from .sql_plan import PlanCapture, capture_plan
+from .sql_pool import SqlConnectionPool, PoolStats, get_pool, new_pool
+from .sql_script_runner import ScriptResult, SqlScriptRunner, split_batches
+
+# Catalog queries for columnar=True: names resolved server side so ColumnarCatalog.filter(schema=, type=) works.
+_COLUMNAR_TABLES_SQL = """
+SELECT SCHEMA_NAME(schema_id) AS schema_name, * FROM sys.tables
+"""
+_COLUMNAR_COLUMNS_SQL = """
+SELECT OBJECT_SCHEMA_NAME(object_id) AS schema_name, OBJECT_NAME(object_id) AS table_name,
+       TYPE_NAME(user_type_id) AS type_name, *
+FROM sys.columns
+"""
 
 # --- PyODBC/Pandas-based SQL Utilities ---
 class TableInfo:
@@ -16,7 +43,10 @@ class TableInfo:
         return f"TableInfo({', '.join(f'{k}={v}' for k, v in self.__dict__.items())})"
 
 class TimsySqlUtil:
-    def __init__(self, config_section: str = 'DEFAULT'):
+    # Default cursor.arraysize / fetchmany batch size for streamed results.
+    DEFAULT_ARRAYSIZE = 5000
+
+    def __init__(self, config_section: str = 'DEFAULT', arraysize: int = DEFAULT_ARRAYSIZE):
         self.config = configparser.ConfigParser()
         self.config_section = config_section
         self.config.read('config.ini')
@@ -24,22 +54,93 @@ class TimsySqlUtil:
         self.database = self.config[self.config_section]['database']
         self.trusted_connection = self.config[self.config_section]['trusted_connection']
         self.conn: Optional[pyodbc.Connection] = None
+        self._conn_pool: Optional[SqlConnectionPool] = None
+        self._raw_conn: Optional[pyodbc.Connection] = None
+        self.arraysize = arraysize
+        self._catalog_caches: dict = {}
+        self._join_graphs: dict = {}
+
+    @property
+    def pool(self) -> SqlConnectionPool:
+        """ Shared connection pool for the current server, database and auth. """
+        return get_pool(self.server, self.database, self.trusted_connection)
+
+    def pool_stats(self) -> PoolStats:
+        return self.pool.stats()
 
     def open_connection(self, database: Optional[str] = None):
+        """
+        Borrow a pooled connection for the given (or current) database. Release it with close_connection.
+        """
+        if self.conn is not None:
+            self.close_connection()
         if database is not None:
             self.database = database
-        self.conn = pyodbc.connect(
-            f'DRIVER=ODBC Driver 17 for SQL Server;'
-            f'SERVER={self.server};'
-            f'DATABASE={self.database};'
-            f'Trusted_Connection={self.trusted_connection}'
-        )
+        self._conn_pool = self.pool
+        self._raw_conn = self._conn_pool.borrow()
+        self.conn = instrument_connection(self._raw_conn, 'TimsySqlUtil')
         return self.conn
 
     def close_connection(self):
         if self.conn:
-            self.conn.close()
+            self._conn_pool.release(self._raw_conn)
             self.conn = None
+            self._raw_conn = None
+            self._conn_pool = None
+
+    def catalog_cache(self, database: Optional[str] = None, cache_path: Optional[str] = None,
+                      ttl_seconds: float = 3600.0) -> SqlCatalogCache:
+        """
+        Persistent local cache of sys.tables/sys.columns/references for a database, refreshed incrementally.
+        Instances are reused per database.
+        """
+        database = database or self.database
+        if database not in self._catalog_caches:
+            self._catalog_caches[database] = SqlCatalogCache(self, database, cache_path, ttl_seconds)
+        return self._catalog_caches[database]
+
+    def crawl_catalog(self, servers: Optional[List[ServerModel]] = None, per_server_connections: int = 4,
+                      max_servers: int = 8, include_system: bool = False) -> ServerCatalog:
+        """
+        Crawl tables, columns, procs and proc references of every database on the given servers (default: the
+        configured server) in parallel into one in-memory ServerCatalog.
+        """
+        if servers is None:
+            servers = [ServerModel(server_name=self.server, environment=self.config_section)]
+        crawler = CatalogCrawler(per_server_connections, max_servers, include_system,
+                                 pool_factory=lambda server, max_size: new_pool(server.server_name, 'master',
+                                                                                self.trusted_connection,
+                                                                                max_size=max_size))
+        return crawler.crawl(servers)
+
+    def column_lineage(self, database: Optional[str] = None, index_path: Optional[str] = None,
+                       max_workers: Optional[int] = None) -> ColumnLineage:
+        """
+        Build the column -> procs / proc -> tables lineage of a database from sys.dm_sql_referenced_entities.
+        With index_path, the index is also saved for memory-mapped lookups via column_lineage.load_lineage_index.
+        """
+        if database is not None:
+            self.database = database
+        lineage = ColumnLineageIndexer(self.pool, max_workers).build()
+        if index_path is not None:
+            lineage.save(index_path)
+        return lineage
+
+    def join_graph(self, database: Optional[str] = None) -> JoinGraph:
+        """ Join graph of the database's foreign keys, reused per database; plan() results are cached on it. """
+        database = database or self.database
+        if database not in self._join_graphs:
+            self.database = database
+            self._join_graphs[database] = JoinGraph.from_foreign_keys(self.pool)
+        return self._join_graphs[database]
+
+    @contextmanager
+    def connection(self, database: Optional[str] = None):
+        """ Borrow a pooled connection for a with block without touching self.conn. """
+        if database is not None:
+            self.database = database
+        with self.pool.connection() as conn:
+            yield instrument_connection(conn, 'TimsySqlUtil')
 
     def update_server(self, server: str):
         self.server = server
@@ -58,119 +159,222 @@ class TimsySqlUtil:
             sql_query = file.read().strip()
         return sql_query
 
-    def read_sql_to_df(self, file_path: str, query_params: Optional[List] = None, database: Optional[str] = None) -> pd.DataFrame:
+    def read_sql_to_df(self, file_path: str, query_params: Optional[List] = None, database: Optional[str] = None,
+                       cache: Optional[QueryResultCache] = None, cache_ttl: Optional[float] = None) -> pd.DataFrame:
+        """
+        Read a SQL file into a DataFrame. With a QueryResultCache, identical (server, database, SQL, params)
+        reads are served from the cache until cache_ttl (or the cache default) expires.
+        """
         sql_query = self.read_sql_file(file_path)
-        conn = self.open_connection(database)
-        try:
-            df = pd.read_sql_query(sql=sql_query, con=conn, params=query_params)
-            return df
-        finally:
-            self.close_connection()
+        if database is not None:
+            self.database = database
+
+        def load() -> pd.DataFrame:
+            conn = self.open_connection()
+            try:
+                return pd.read_sql_query(sql=sql_query, con=conn, params=query_params)
+            finally:
+                self.close_connection()
 
-    def get_all_tables(self, database: Optional[str] = None, store_table_info: bool = False, print_tables_info: bool = False, as_dict: bool = False):
+        if cache is None:
+            return load()
+        return cache.get_or_load(self.server, self.database, sql_query, query_params, load, cache_ttl)
+
+    def iter_query_batches(self, sql_query: str, database: Optional[str] = None, params: Optional[List] = None,
+                           batch_size: Optional[int] = None, as_dict: bool = False,
+                           as_table_info: bool = False) -> Iterator[List]:
+        """
+        Execute a query and yield lists of at most batch_size rows using cursor.fetchmany.
+        Rows are yielded raw, as dicts or as TableInfo objects. The pooled connection is held
+        until the generator is exhausted or closed.
+        """
+        batch_size = batch_size or self.arraysize
+        with self.connection(database) as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.arraysize = batch_size
+                if params:
+                    cursor.execute(sql_query, params)
+                else:
+                    cursor.execute(sql_query)
+                columns = [column[0] for column in cursor.description]
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    if as_table_info:
+                        yield [TableInfo(*row) for row in rows]
+                    elif as_dict:
+                        yield [dict(zip(columns, row)) for row in rows]
+                    else:
+                        yield rows
+            finally:
+                cursor.close()
+
+    def read_columnar(self, sql_query: str, database: Optional[str] = None, params: Optional[List] = None,
+                      batch_size: Optional[int] = None) -> ColumnarCatalog:
+        """ Run a query into a ColumnarCatalog, converting fetchmany batches without keeping row objects. """
+        batch_size = batch_size or self.arraysize
+        with self.connection(database) as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.arraysize = batch_size
+                if params:
+                    cursor.execute(sql_query, params)
+                else:
+                    cursor.execute(sql_query)
+                columns = [column[0] for column in cursor.description]
+                return ColumnarCatalog.from_batches(columns, iter(lambda: cursor.fetchmany(batch_size), []))
+            finally:
+                cursor.close()
+
+    def iter_pages(self, statement: SqlStatement, page_size: int, key_columns: Optional[List[str]] = None,
+                   database: Optional[str] = None, after: Optional[List] = None, prefetch: bool = True,
+                   max_pages: Optional[int] = None) -> PageIterator:
+        """
+        Page through a SqlStatement: keyset paging when key_columns is given, else OFFSET/FETCH over its ORDER BY.
+        The next page is prefetched on a background thread while the current one is consumed.
+        """
+        if database is not None:
+            self.database = database
+        return PageIterator(self.pool, statement, page_size, key_columns=key_columns, after=after,
+                            prefetch=prefetch, max_pages=max_pages)
+
+    def _fetch_catalog(self, sql_query: str, store_attr: str, database: Optional[str] = None,
+                       store_info: bool = False, print_info: bool = False, as_dict: bool = False,
+                       stream: bool = False, batch_size: Optional[int] = None, columnar: bool = False):
+        """
+        Shared body of the sys catalog methods. With stream=True a generator of batches is returned and
+        TableInfo objects are printed batch by batch instead of after a full fetchall; streamed batches are
+        not kept, so stream cannot be combined with store_info.
+        With columnar=True the result is a ColumnarCatalog (stored under store_attr with store_info).
+        """
+        if stream and store_info:
+            raise ValueError('stream=True does not keep the rows it yields; store_info needs stream=False')
+        if columnar:
+            catalog = self.read_columnar(sql_query, database, batch_size=batch_size)
+            if print_info:
+                print(catalog)
+            if store_info:
+                setattr(self, store_attr, catalog)
+            return catalog
+        as_table_info = store_info or print_info
+        if stream:
+            return self._stream_catalog(sql_query, database, print_info, as_dict, batch_size)
+        result = []
+        for batch in self.iter_query_batches(sql_query, database, batch_size=batch_size, as_dict=as_dict,
+                                             as_table_info=as_table_info):
+            result.extend(batch)
+        if as_table_info:
+            if print_info:
+                self.print_all_tables_info(result)
+            if store_info:
+                setattr(self, store_attr, result)
+        return result
+
+    def _stream_catalog(self, sql_query: str, database: Optional[str], print_info: bool, as_dict: bool,
+                        batch_size: Optional[int]) -> Iterator[List]:
+        # Same output as print_all_tables_info, with the count printed once the stream is done.
+        if print_info:
+            print(f"Printing Tables Info")
+        count = 0
+        for batch in self.iter_query_batches(sql_query, database, batch_size=batch_size, as_dict=as_dict,
+                                             as_table_info=print_info):
+            if print_info:
+                for table in batch:
+                    print(table)
+            count += len(batch)
+            yield batch
+        if print_info:
+            print(f"There are {count} tables.")
+
+    def read_sql_chunks(self, sql_query: str, query_params: Optional[List] = None, database: Optional[str] = None,
+                        chunksize: int = 50_000, dtype: Optional[DtypeMap] = None,
+                        category_columns: Optional[List[str]] = None, category_threshold: Optional[float] = None,
+                        downcast: bool = True, spill_dir: Optional[str] = None,
+                        spill_format: SpillFormat = 'parquet') -> Iterator[Union[pd.DataFrame, Path]]:
+        """
+        Yield a query's result as DataFrames of at most chunksize rows.
+        dtype pins column dtypes up front, category_columns/category_threshold convert low cardinality
+        strings to category and downcast shrinks numeric columns. With spill_dir each chunk is written to
+        Parquet/Feather and the file Path is yielded instead, keeping memory flat for any extract size.
+        """
+        if spill_dir is not None:
+            # Checked on the call, not on the first next() of the generator.
+            verify_spill_format(spill_format)
+        return self._read_sql_chunks(sql_query, query_params, database, chunksize, dtype, category_columns,
+                                     category_threshold, downcast, spill_dir, spill_format)
+
+    def _read_sql_chunks(self, sql_query, query_params, database, chunksize, dtype, category_columns,
+                         category_threshold, downcast, spill_dir, spill_format
+                         ) -> Iterator[Union[pd.DataFrame, Path]]:
+        with self.connection(database) as conn:
+            chunks = pd.read_sql_query(sql=sql_query, con=conn, params=query_params, chunksize=chunksize,
+                                       dtype=dtype)
+            yield from iter_optimized_chunks(chunks, category_columns, category_threshold, downcast, spill_dir,
+                                             spill_format, pinned_columns=dtype)
+
+    def read_sql_to_df_chunks(self, file_path: str, query_params: Optional[List] = None,
+                              database: Optional[str] = None, chunksize: int = 50_000, **chunk_kwargs
+                              ) -> Iterator[Union[pd.DataFrame, Path]]:
+        """ Chunked version of read_sql_to_df. See read_sql_chunks for chunk_kwargs. """
+        sql_query = self.read_sql_file(file_path)
+        return self.read_sql_chunks(sql_query, query_params, database, chunksize, **chunk_kwargs)
+
+    def sql_file_to_df_chunks(self, file_path: str, database: Optional[str] = None, chunksize: int = 50_000,
+                              **chunk_kwargs) -> Iterator[Union[pd.DataFrame, Path]]:
+        """ Chunked version of sql_file_to_df. See read_sql_chunks for chunk_kwargs. """
+        return self.read_sql_to_df_chunks(file_path, None, database, chunksize, **chunk_kwargs)
+
+    def get_all_tables(self, database: Optional[str] = None, store_table_info: bool = False,
+                       print_tables_info: bool = False, as_dict: bool = False, stream: bool = False,
+                       batch_size: Optional[int] = None, columnar: bool = False):
         """
         Fetch all tables from sys.tables. Optionally store/print TableInfo objects, or return raw rows/dicts.
+        With stream=True, returns a generator of row batches of at most batch_size (default self.arraysize);
+        streamed rows are not stored, so store_table_info must stay False.
+        With columnar=True, returns a ColumnarCatalog with a leading schema_name column.
         """
         sql_query = """
         SELECT * FROM sys.tables
         """
-        self.open_connection(database)
-        cursor = self.conn.cursor()
-        cursor.execute(sql_query)
-        rows = cursor.fetchall()
-        columns = [column[0] for column in cursor.description]
-        result = None
-        if store_table_info or print_tables_info:
-            all_table_info = [TableInfo(*row) for row in rows]
-            if print_tables_info:
-                self.print_all_tables_info(all_table_info)
-            if store_table_info:
-                self.all_table_info = all_table_info
-            result = all_table_info
-        elif as_dict:
-            result = [dict(zip(columns, row)) for row in rows]
-        else:
-            result = rows
-        self.close_connection()
-        return result
+        if columnar:
+            sql_query = _COLUMNAR_TABLES_SQL
+        return self._fetch_catalog(sql_query, 'all_table_info', database, store_table_info, print_tables_info,
+                                   as_dict, stream, batch_size, columnar)
 
-    def get_all_sql_columns(self, store_column_info=False, print_column_info=False, as_dict=False):
+    def get_all_sql_columns(self, store_column_info=False, print_column_info=False, as_dict=False,
+                            stream: bool = False, batch_size: Optional[int] = None, columnar: bool = False):
         sql_query = """
                     SELECT *
                     FROM sys.columns \
                     """
-        self.open_connection()
-        cursor = self.conn.cursor()
-        cursor.execute(sql_query)
-        rows = cursor.fetchall()
-        columns = [column[0] for column in cursor.description]
-        result = None
-        if store_column_info or print_column_info:
-            all_column_info = [TableInfo(*row) for row in rows]
-            if print_column_info:
-                self.print_all_tables_info(all_column_info)
-            if store_column_info:
-                self.all_column_info = all_column_info
-            result = all_column_info
-        elif as_dict:
-            result = [dict(zip(columns, row)) for row in rows]
-        else:
-            result = rows
-        self.conn.close()
-        return result
+        if columnar:
+            sql_query = _COLUMNAR_COLUMNS_SQL
+        return self._fetch_catalog(sql_query, 'all_column_info', None, store_column_info, print_column_info,
+                                   as_dict, stream, batch_size, columnar)
 
     def get_all_sql_columns_for_table(self, table_name: str, store_column_info=False, print_column_info=False,
-                                      as_dict=False):
+                                      as_dict=False, stream: bool = False, batch_size: Optional[int] = None,
+                                      columnar: bool = False):
         sql_query = f"""
         SELECT *
         FROM sys.columns
         WHERE object_id = OBJECT_ID('{table_name}')
         """
-        self.open_connection()
-        cursor = self.conn.cursor()
-        cursor.execute(sql_query)
-        rows = cursor.fetchall()
-        columns = [column[0] for column in cursor.description]
-        result = None
-        if store_column_info or print_column_info:
-            all_column_info = [TableInfo(*row) for row in rows]
-            if print_column_info:
-                self.print_all_tables_info(all_column_info)
-            if store_column_info:
-                self.all_column_info = all_column_info
-            result = all_column_info
-        elif as_dict:
-            result = [dict(zip(columns, row)) for row in rows]
-        else:
-            result = rows
-        self.conn.close()
-        return result
+        if columnar:
+            sql_query = f"{_COLUMNAR_COLUMNS_SQL} WHERE object_id = OBJECT_ID('{table_name}')"
+        return self._fetch_catalog(sql_query, 'all_column_info', None, store_column_info, print_column_info,
+                                   as_dict, stream, batch_size, columnar)
 
     def get_all_references_for_column(self, column_name: str, store_column_info=False, print_column_info=False,
-                                      as_dict=False):
+                                      as_dict=False, stream: bool = False, batch_size: Optional[int] = None):
         sql_get_referenced_entities = f"""
         SELECT *
         FROM sys.dm_sql_referenced_entities('{column_name}', 'OBJECT')
         """
-        self.open_connection()
-        cursor = self.conn.cursor()
-        cursor.execute(sql_get_referenced_entities)
-        rows = cursor.fetchall()
-        columns = [column[0] for column in cursor.description]
-        result = None
-        if store_column_info or print_column_info:
-            all_column_info = [TableInfo(*row) for row in rows]
-            if print_column_info:
-                self.print_all_tables_info(all_column_info)
-            if store_column_info:
-                self.all_column_info = all_column_info
-            result = all_column_info
-        elif as_dict:
-            result = [dict(zip(columns, row)) for row in rows]
-        else:
-            result = rows
-        self.conn.close()
-        return result
+        return self._fetch_catalog(sql_get_referenced_entities, 'all_column_info', None, store_column_info,
+                                   print_column_info, as_dict, stream, batch_size)
 
     @staticmethod
     def print_all_tables_info(all_tables_info: List['TableInfo']):
@@ -202,6 +406,55 @@ class TimsySqlUtil:
         finally:
             self.close_connection()
 
+    def run_scripts(self, script_paths: Optional[List[str]] = None, script_folder: Optional[str] = None,
+                    database: Optional[str] = None, max_workers: Optional[int] = None,
+                    stop_on_error: bool = True, script_groups: Optional[List[List[str]]] = None
+                    ) -> List[ScriptResult]:
+        """
+        Run .sql files split on GO separators over the pool for database, one script at a time in order.
+        Runs script_paths when given, else script_groups (groups in order, the independent scripts of a group
+        concurrently), otherwise every script in script_folder (default ./scripts) in sorted order.
+        """
+        if database is not None:
+            self.database = database
+        runner = SqlScriptRunner(self.pool, max_workers, stop_on_error)
+        if script_paths is not None:
+            return runner.run_scripts(script_paths)
+        if script_groups is not None:
+            return runner.run_groups(script_groups)
+        return runner.run_folder(script_folder)
+
+    def capture_plan(self, sql_query: Optional[str] = None, file_path: Optional[str] = None,
+                     database: Optional[str] = None, actual: bool = False, statistics: bool = True) -> PlanCapture:
+        """
+        Capture the estimated execution plan of SQL text or a .sql file (split on GO), parsed and with scans,
+        key lookups, implicit conversions and missing indexes flagged. actual=True runs the query with
+        STATISTICS XML, IO and TIME and rolls it back afterwards.
+        """
+        if (sql_query is None) == (file_path is None):
+            raise ValueError('Pass exactly one of sql_query or file_path')
+        if file_path is not None:
+            sql_query = self.read_sql_file(file_path)
+        if database is not None:
+            self.database = database
+        batches = split_batches(sql_query)
+        pool = self.pool
+        conn = pool.borrow()
+        # USE changes the pooled connection's database, so such connections are not reused.
+        discard = any(batch.changes_database for batch in batches)
+        try:
+            cursor = instrument_connection(conn, 'TimsySqlUtil').cursor()
+            try:
+                return capture_plan(cursor, batches, actual, statistics)
+            finally:
+                cursor.close()
+                conn.rollback()
+        except Exception:
+            discard = True
+            raise
+        finally:
+            pool.release(conn, discard=discard)
+
     def sql_file_to_df(self, file_path: str, database: Optional[str] = None) -> pd.DataFrame:
         """
         Reads a SQL file and loads the result into a DataFrame.
@@ -224,15 +477,14 @@ def sanitize_params(params: dict) -> dict:
     sanitized_params = {k: html.escape(str(v)) for k, v in params.items()}
     return sanitized_params
 
-def read_sql_lparams(file_path: str, database: str = None, query_params: List = None) -> pd.DataFrame:
+def read_sql_lparams(file_path: str, database: str = None, query_params: List = None,
+                     cache: Optional[QueryResultCache] = None, cache_ttl: Optional[float] = None) -> pd.DataFrame:
     """
     Standalone function to read a SQL file and return a DataFrame, with error printing (from original utility_sql.py).
+    Pass a QueryResultCache to reuse results of identical reads.
     """
     try:
-        sql_query = TimsySqlUtil.read_sql_file(file_path)
-        conn = TimsySqlUtil().open_connection(database)
-        df = pd.read_sql_query(sql=sql_query, con=conn, params=query_params)
-        return df
+        return TimsySqlUtil().read_sql_to_df(file_path, query_params, database, cache=cache, cache_ttl=cache_ttl)
     except Exception as e:
         print("Failed to Read Sql File")
         print(e)
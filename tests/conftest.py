@@ -0,0 +1,28 @@
+""" Test setup: import timsy_utils subpackages from src without running the package __init__ """
+import sys
+import types
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / 'src'
+
+# timsy_utils/__init__ imports every subpackage eagerly, and timsy_json's absolute JsonService import only
+# resolves with that folder on sys.path; tests load just the subpackages they exercise.
+if 'timsy_utils' not in sys.modules:
+    package = types.ModuleType('timsy_utils')
+    package.__path__ = [str(SRC / 'timsy_utils')]
+    sys.modules['timsy_utils'] = package
+
+try:
+    import pyodbc  # noqa: F401
+except ImportError:
+    # No ODBC driver manager on this machine. The SQL tests pass fake connect functions or sqlite stand-ins
+    # and never call the driver; the names below only satisfy module level references.
+    pyodbc = types.ModuleType('pyodbc')
+    pyodbc.Error = type('Error', (Exception,), {})
+    pyodbc.Connection = pyodbc.Cursor = pyodbc.Row = object
+
+    def _unavailable(*args, **kwargs):
+        raise pyodbc.Error('pyodbc is not available')
+
+    pyodbc.connect = _unavailable
+    sys.modules['pyodbc'] = pyodbc
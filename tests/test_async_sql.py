@@ -0,0 +1,66 @@
+""" AsyncSqlUtil over the sqlite stand-in pool """
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+from timsy_utils.timsy_sql.async_sql import AsyncSqlUtil, sqlite_stand_in_pool
+
+
+class AsyncSqlUtilTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.pool = sqlite_stand_in_pool(Path(temp_dir.name) / 'async.sqlite', max_size=2)
+        self.addCleanup(self.pool.close)
+
+    def run_with_util(self, coroutine_function, **kwargs):
+        async def run():
+            async with AsyncSqlUtil(self.pool, **kwargs) as util:
+                return await coroutine_function(util)
+        return asyncio.run(run())
+
+    def test_gather_keeps_input_order(self):
+        async def gather(util):
+            return await util.gather([f'SELECT sleep_ms({ms}), {index}' for index, ms in enumerate((60, 0, 30))])
+        results = self.run_with_util(gather)
+        self.assertEqual([rows[0][1] for rows in results], [0, 1, 2])
+
+    def test_fetch_df(self):
+        async def fetch(util):
+            return await util.fetch_df('SELECT ? AS a, ? AS b', (1, 'x'))
+        self.assertEqual(self.run_with_util(fetch).to_dict('records'), [{'a': 1, 'b': 'x'}])
+
+    def test_timeout_holds_slot_until_connection_returns(self):
+        async def time_out(util):
+            with self.assertRaises(asyncio.TimeoutError):
+                await util.fetch_all('SELECT sleep_ms(300)', timeout=0.05)
+            slots = util._loop_slots()
+            # The abandoned statement still holds its connection, and so its slot.
+            held = slots._value
+            await asyncio.sleep(0.5)
+            return held, slots._value
+        held, freed = self.run_with_util(time_out)
+        self.assertEqual((held, freed), (1, 2))
+        stats = self.pool.stats()
+        self.assertEqual((stats.in_use_connections, stats.live_connections), (0, 0))
+
+    def test_cancelled_borrow_returns_connection(self):
+        held = [self.pool.borrow(), self.pool.borrow()]
+
+        async def cancel_waiter(util):
+            waiter = asyncio.ensure_future(util.fetch_all('SELECT 1'))
+            await asyncio.sleep(0.05)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            # The borrow is still waiting on its worker thread; it completes once a connection comes back.
+            for conn in held:
+                self.pool.release(conn)
+            await asyncio.sleep(0.1)
+            return util._loop_slots()._value
+        self.assertEqual(self.run_with_util(cancel_waiter), 2)
+        self.assertEqual(self.pool.stats().in_use_connections, 0)
+
+if __name__ == '__main__':
+    unittest.main()
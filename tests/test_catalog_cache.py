@@ -0,0 +1,140 @@
+""" SqlCatalogCache over a fake sys catalog served through the shared pool registry """
+import re
+import tempfile
+import types
+import unittest
+from pathlib import Path
+
+from timsy_utils.timsy_sql.catalog_cache import SqlCatalogCache
+from timsy_utils.timsy_sql.sql_pool import close_all_pools, get_pool
+
+_OBJECT_IDS = re.compile(r'IN \(([\d, ]+)\)')
+
+
+class FakeCatalog:
+    def __init__(self):
+        self.tables = {1: ('dbo', 'Order', '2024-01-01T00:00:00'), 2: ('Sales', 'Customer', '2024-01-01T00:00:00')}
+        self.columns = {1: [(1, 1, 'ID', 'int', 4, 10, 0, 0), (1, 2, 'CustomerID', 'int', 4, 10, 0, 1)],
+                        2: [(2, 1, 'ID', 'int', 4, 10, 0, 0), (2, 2, 'Name', 'nvarchar', 100, 0, 0, 1)]}
+        self.proc_modify_date = '2024-01-01T00:00:00'
+        self.references = [('dbo', 'Order', 'ID')]
+        self.queries = []
+
+    def connect(self, server, database, trusted_connection):
+        catalog = self
+
+        class Cursor:
+            description = (('value',),)
+
+            def execute(self, sql_query, params=None):
+                catalog.queries.append(sql_query)
+                if 'FROM sys.tables' in sql_query:
+                    self.rows = [(object_id, *table) for object_id, table in catalog.tables.items()]
+                elif 'FROM sys.columns' in sql_query:
+                    ids = [int(i) for i in _OBJECT_IDS.search(sql_query).group(1).split(',')]
+                    self.rows = [column for i in ids for column in catalog.columns.get(i, [])]
+                elif 'OBJECT_ID' in sql_query:
+                    self.rows = [(catalog.proc_modify_date,)]
+                else:
+                    self.rows = list(catalog.references)
+
+            def fetchall(self):
+                return self.rows
+
+            def close(self):
+                pass
+
+        class Connection:
+            def cursor(self):
+                return Cursor()
+
+            def rollback(self):
+                pass
+
+            def close(self):
+                pass
+
+        return Connection()
+
+    def column_reads(self):
+        return [query for query in self.queries if 'FROM sys.columns' in query]
+
+
+class SqlCatalogCacheTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache_path = Path(temp_dir.name) / 'catalog.sqlite'
+        self.catalog = FakeCatalog()
+        get_pool('fake-server', 'Sales', 'yes', connect_func=self.catalog.connect)
+        self.addCleanup(close_all_pools)
+        self.sql_util = types.SimpleNamespace(server='fake-server', database='Sales', trusted_connection='yes')
+
+    def open_cache(self, **kwargs):
+        cache = SqlCatalogCache(self.sql_util, cache_path=self.cache_path, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_lookups(self):
+        cache = self.open_cache()
+        self.assertEqual(len(cache.tables()), 2)
+        self.assertEqual(cache.table('sales.customer').object_id, 2)
+        self.assertEqual(cache.table('Order', schema='[dbo]').full_name, 'dbo.Order')
+        self.assertIsNone(cache.table('Order', schema='Sales'))
+        self.assertEqual([column.name for column in cache.columns('Sales.Customer')], ['ID', 'Name'])
+        self.assertEqual([column.is_nullable for column in cache.columns(1)], [False, True])
+        self.assertEqual(len(cache.find_columns('id')), 2)
+        self.assertEqual([table.name for table in cache.tables_in_schema('SALES')], ['Customer'])
+
+    def test_refresh_only_rereads_changed_tables(self):
+        cache = self.open_cache()
+        self.assertEqual(cache.refresh().changed, 2)
+        self.catalog.tables[2] = ('Sales', 'Customer', '2024-02-01T00:00:00')
+        self.catalog.columns[2].append((2, 3, 'Email', 'nvarchar', 200, 0, 0, 1))
+        del self.catalog.tables[1]
+        self.catalog.tables[3] = ('dbo', 'Region', '2024-02-01T00:00:00')
+        self.catalog.columns[3] = [(3, 1, 'ID', 'int', 4, 10, 0, 0)]
+        result = cache.refresh()
+        self.assertEqual((result.changed, result.dropped, result.unchanged), (2, 1, 0))
+        self.assertIn('IN (2, 3)', self.catalog.column_reads()[-1])
+        self.assertEqual(len(cache.columns('Customer')), 3)
+        self.assertIsNone(cache.table_by_id(1))
+        self.assertEqual(cache.refresh().unchanged, 2)
+        self.assertEqual(len(self.catalog.column_reads()), 2)
+
+    def test_persists_between_instances(self):
+        self.open_cache().refresh()
+        reopened = self.open_cache()
+        self.assertFalse(reopened.is_stale())
+        queries = len(self.catalog.queries)
+        self.assertEqual(len(reopened.columns('Order')), 2)
+        self.assertEqual(len(self.catalog.queries), queries)
+
+    def test_ttl_triggers_refresh(self):
+        cache = self.open_cache(ttl_seconds=0)
+        cache.tables()
+        cache.tables()
+        self.assertEqual(sum('FROM sys.tables' in query for query in self.catalog.queries), 2)
+
+    def test_references_cached_until_object_changes(self):
+        cache = self.open_cache(ttl_seconds=0)
+        self.assertEqual(cache.references('dbo.GetOrders')[0].referenced_minor_name, 'ID')
+        self.catalog.references = []
+        self.assertEqual(len(cache.references('dbo.GetOrders')), 1)
+        self.catalog.proc_modify_date = '2024-03-01T00:00:00'
+        self.assertEqual(cache.references('dbo.GetOrders'), [])
+        self.assertEqual(cache.references('dbo.GetOrders'), [])
+
+    def test_invalidate(self):
+        cache = self.open_cache()
+        cache.refresh()
+        cache.invalidate([2])
+        self.assertTrue(cache.is_stale())
+        self.assertEqual(len(cache.columns('Customer')), 2)
+        self.assertIn('IN (2)', self.catalog.column_reads()[-1])
+        cache.invalidate()
+        self.assertEqual(cache.last_refresh, 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
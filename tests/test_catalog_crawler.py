@@ -0,0 +1,171 @@
+""" CatalogCrawler and ServerCatalog over fake per server pools, plus the sql_models they build """
+import re
+import unittest
+
+from timsy_utils.timsy_sql.catalog_crawler import CatalogCrawler, ServerCatalog, format_type
+from timsy_utils.timsy_sql.sql_models.database_model import DatabaseModel
+from timsy_utils.timsy_sql.sql_models.on_clause import on_clause
+from timsy_utils.timsy_sql.sql_models.server_model import ServerModel
+from timsy_utils.timsy_sql.sql_models.sql_column_type import SQLColumnType
+from timsy_utils.timsy_sql.sql_models.sql_model_helpers import format_from, qualified_name
+from timsy_utils.timsy_sql.sql_pool import SqlConnectionPool
+
+CATALOG = {
+    'Sales': {
+        'sys.tables': [('dbo', 'Order'), ('dbo', 'Customer')],
+        'sys.columns': [('dbo', 'Order', 'ID', 'int', 4, 10, 0, False),
+                        ('dbo', 'Order', 'Note', 'nvarchar', 100, 0, 0, True),
+                        ('dbo', 'Customer', 'ID', 'int', 4, 10, 0, False)],
+        'sys.procedures': [(11, 'dbo', 'GetOrders')],
+        'sys.parameters': [(11, '@from', 'datetime2', 8, 27, 7, False), (11, '@total', 'decimal', 9, 19, 4, True)],
+        'sys.sql_expression_dependencies': [(11, None, 'dbo', 'Order'), (11, 'Archive', None, 'OldOrder')],
+    },
+    'Archive': {
+        'sys.tables': [('dbo', 'OldOrder')],
+        'sys.columns': [('dbo', 'OldOrder', 'ID', 'bigint', 8, 19, 0, False)],
+        'sys.procedures': [],
+        'sys.parameters': [],
+        'sys.sql_expression_dependencies': [],
+    },
+}
+_FROM = re.compile(r'FROM \[(\w+)\]\.(sys\.\w+)')
+
+
+class CatalogCursor:
+    description = (('value',),)
+
+    def __init__(self, server):
+        self.server = server
+        self.rows = []
+
+    def execute(self, sql_query):
+        self.server.active += 1
+        self.server.max_active = max(self.server.max_active, self.server.active)
+        try:
+            if 'sys.databases' in sql_query:
+                self.rows = [(5, 'Archive'), (6, 'Sales')]
+                return
+            database, view = _FROM.search(sql_query).groups()
+            if self.server.broken_database == database:
+                raise RuntimeError(f'cannot read {database}')
+            self.rows = CATALOG[database][view]
+        finally:
+            self.server.active -= 1
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def close(self):
+        pass
+
+
+class FakeServer:
+    def __init__(self, broken_database=None):
+        self.broken_database = broken_database
+        self.active = self.max_active = 0
+        self.pools = []
+
+    def connect(self, server, database, trusted_connection):
+        server_self = self
+
+        class Connection:
+            def cursor(self):
+                return CatalogCursor(server_self)
+
+            def rollback(self):
+                pass
+
+            def close(self):
+                pass
+
+        return Connection()
+
+
+class CatalogCrawlerTest(unittest.TestCase):
+    def setUp(self):
+        self.servers = {'alpha': FakeServer(), 'beta': FakeServer(broken_database='Archive')}
+
+        def pool_factory(server, max_connections):
+            fake = self.servers[server.server_name]
+            pool = SqlConnectionPool(server.server_name, 'master', max_size=max_connections,
+                                     connect_func=fake.connect)
+            fake.pools.append(pool)
+            return pool
+
+        self.crawler = CatalogCrawler(per_server_connections=2, pool_factory=pool_factory)
+
+    def test_crawl_builds_models_and_indexes(self):
+        catalog = self.crawler.crawl([ServerModel('alpha', 'test'), ServerModel('beta', 'test')])
+        self.assertEqual([database.name for database in catalog.databases('alpha')], ['Archive', 'Sales'])
+        self.assertEqual([(error.server, error.database) for error in catalog.errors], [('beta', 'Archive')])
+        self.assertIn('2 servers, 3 databases', catalog.summary())
+
+        sales = catalog.servers['alpha'].database('sales')
+        self.assertEqual(sales.full_name, '[alpha].[Sales]')
+        note = next(column for column in sales.columns if column.alias == 'Note')
+        self.assertEqual((note.declared_type, note.sql_column_type), ('nvarchar(50)', SQLColumnType.VARCHAR))
+        proc = sales.procs[0]
+        self.assertEqual(proc.parameters, '@from datetime2(7), @total decimal(19,4) OUTPUT')
+        self.assertEqual((proc.database_refs, proc.table_list), (['Archive', 'Sales'], ['dbo.OldOrder', 'dbo.Order']))
+
+        self.assertEqual(len(catalog.find_tables('order')), 2)
+        self.assertEqual(len(catalog.find_tables('[dbo].[OldOrder]')), 1)
+        self.assertEqual(len(catalog.find_columns('id')), 5)
+        self.assertEqual([p.name for p in catalog.procs_referencing('dbo.OldOrder')], ['dbo.GetOrders'] * 2)
+
+    def test_connections_are_bounded_and_pools_closed(self):
+        self.crawler.crawl([ServerModel('alpha', 'test')])
+        fake = self.servers['alpha']
+        self.assertLessEqual(fake.max_active, 2)
+        self.assertTrue(all(pool.stats().live_connections == 0 for pool in fake.pools))
+        with self.assertRaises(RuntimeError):
+            fake.pools[0].borrow()
+
+    def test_recrawl_replaces_database(self):
+        catalog = ServerCatalog()
+        self.crawler.crawl([ServerModel('alpha', 'test')], catalog)
+        self.crawler.crawl([ServerModel('alpha', 'test')], catalog)
+        self.assertEqual(len(catalog.databases('alpha')), 2)
+        self.assertEqual(len(catalog.find_tables('Customer')), 1)
+        self.assertEqual(len(catalog.procs_referencing('Order')), 1)
+
+    def test_pool_factory_errors_are_recorded(self):
+        def failing_factory(server, max_connections):
+            raise ConnectionError('unreachable')
+
+        catalog = CatalogCrawler(pool_factory=failing_factory).crawl([ServerModel('gamma', 'test')])
+        self.assertEqual(catalog.errors[0].error, 'ConnectionError: unreachable')
+
+
+class SqlModelsTest(unittest.TestCase):
+    def test_format_type(self):
+        self.assertEqual([format_type('NVARCHAR', 40, 0, 0), format_type('varchar', -1, 0, 0),
+                          format_type('numeric', 9, 10, 2), format_type('time', 5, 16, 7),
+                          format_type('int', 4, 10, 0)],
+                         ['nvarchar(20)', 'varchar(max)', 'numeric(10,2)', 'time(7)', 'int'])
+
+    def test_column_types(self):
+        self.assertEqual(SQLColumnType.from_sql_server('BIT'), SQLColumnType.BOOLEAN)
+        self.assertEqual(SQLColumnType.from_sql_server('geography'), SQLColumnType.TEXT)
+
+    def test_server_and_database_models(self):
+        server = ServerModel('sql01', 'prod')
+        self.assertEqual((server.name, server.env), ('[sql01]', '[prod]'))
+        server.add_common_name('reporting')
+        with self.assertRaises(ValueError):
+            server.add_common_name('reporting')
+        server.databases.append(DatabaseModel(5, 'Sales'))
+        self.assertIs(server.database('[SALES]'), server.databases[0])
+        self.assertIsNone(server.database('Other'))
+        self.assertEqual(DatabaseModel(5, 'Sales').full_name, '[Sales]')
+
+    def test_bracketed_names(self):
+        self.assertEqual(qualified_name(None, 'Order'), '[dbo].[Order]')
+        self.assertEqual(format_from('Sales', '[Order]', 'o'), 'FROM [Sales].[Order] AS [o]')
+        clause = on_clause('Sales', 'Order', 'ID', ['ID', 'Region'], alias='o')
+        self.assertEqual((clause.join_to(), clause.qualify('[ID]')), ('[Sales].[Order] AS [o]', '[o].[ID]'))
+        self.assertTrue(clause.has_on_join_multiple_columns)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+""" ColumnLineageIndexer over a fake pool, and the saved, memory-mapped LineageIndex """
+import tempfile
+import unittest
+from pathlib import Path
+
+from timsy_utils.timsy_sql.column_lineage import ColumnLineageIndexer, load_lineage_index
+from timsy_utils.timsy_sql.sql_models.sql_column_type import SQLColumnType
+from timsy_utils.timsy_sql.sql_pool import SqlConnectionPool
+
+COLUMNS = [('dbo', 'Order', 'ID', 'int', 4, 10, 0, False), ('dbo', 'Order', 'Total', 'money', 8, 19, 4, True),
+           ('dbo', 'Customer', 'ID', 'int', 4, 10, 0, False)]
+PROCS = [('dbo', 'GetOrders'), ('dbo', 'Broken'), ('rpt', 'Totals')]
+REFERENCES = {
+    'dbo.GetOrders': [(None, 'dbo', 'Order', None), (None, 'dbo', 'Order', 'ID'), (None, 'dbo', 'Order', 'Total'),
+                      (None, 'dbo', 'Customer', 'ID')],
+    'rpt.Totals': [(None, 'dbo', 'Order', 'Total'), ('Archive', 'dbo', 'OldOrder', 'Total')],
+}
+
+
+class LineageCursor:
+    description = (('value',),)
+
+    def execute(self, sql_query, params=None):
+        if params:
+            if params[0] not in REFERENCES:
+                raise RuntimeError(f'Invalid object name {params[0]}')
+            self.rows = REFERENCES[params[0]]
+        else:
+            self.rows = COLUMNS if 'sys.columns' in sql_query else PROCS
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def close(self):
+        pass
+
+
+class LineageConnection:
+    def cursor(self):
+        return LineageCursor()
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ColumnLineageTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        pool = SqlConnectionPool('server', 'Sales', max_size=2, connect_func=lambda *args: LineageConnection())
+        cls.lineage = ColumnLineageIndexer(pool).build()
+        pool.close()
+
+    def test_columns_and_procs(self):
+        self.assertEqual(self.lineage.procs_using_column('total'), ['dbo.GetOrders', 'rpt.Totals'])
+        self.assertEqual(self.lineage.procs_using_column('[dbo].[Customer].[ID]'), ['dbo.GetOrders'])
+        self.assertEqual(self.lineage.procs_using_column('dbo.OldOrder.Total'), ['rpt.Totals'])
+        self.assertEqual(self.lineage.tables_for_proc('RPT.Totals'), ['dbo.Order', 'dbo.OldOrder'])
+        self.assertEqual(self.lineage.procs['rpt.totals'].database_refs, ['Archive', 'Sales'])
+        self.assertEqual(self.lineage.procs_using_column('missing'), [])
+
+    def test_column_entries(self):
+        total = self.lineage.entries['total']
+        self.assertEqual(total.sql_column_type, SQLColumnType.DECIMAL)
+        self.assertEqual([instance.table for instance in total.column_instance], ['dbo.Order', 'dbo.OldOrder'])
+        self.assertEqual(total.column_instance[0].declared_type, 'money')
+        self.assertEqual(len(self.lineage.entries['id'].column_instance), 2)
+
+    def test_errors_are_recorded(self):
+        self.assertIn('Invalid object name', self.lineage.errors['dbo.Broken'])
+        self.assertEqual(self.lineage.tables_for_proc('dbo.Broken'), [])
+
+    def test_saved_index_answers_the_same(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = self.lineage.save(Path(temp_dir) / 'sales.lineage')
+            with load_lineage_index(path) as index:
+                for column in ('total', 'ID', 'dbo.Order.ID', 'dbo.oldorder.total', 'missing'):
+                    with self.subTest(column=column):
+                        self.assertEqual(index.procs_using_column(column), self.lineage.procs_using_column(column))
+                self.assertEqual(index.tables_for_proc('dbo.GetOrders'), ['dbo.Order', 'dbo.Customer'])
+                self.assertEqual(list(index.proc_names()), ['dbo.Broken', 'dbo.GetOrders', 'rpt.Totals'])
+                self.assertIn('dbo.customer.id', list(index.column_keys()))
+
+    def test_rejects_other_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'not.lineage'
+            path.write_bytes(b'\0' * 64)
+            with self.assertRaises(ValueError):
+                load_lineage_index(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+""" ColumnarCatalog and its batch builder """
+import copy
+import pickle
+import unittest
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+
+from timsy_utils.timsy_sql.sql_models.columnar_catalog import ColumnarCatalog
+
+COLUMNS = ['schema_name', 'name', 'object_id', 'modify_date', 'is_ms_shipped', 'history_table_id']
+ROWS = [
+    ('dbo', 'Customer', 101, datetime(2024, 1, 5), False, None),
+    ('Sales', 'Order', 102, datetime(2024, 3, 1), False, 7),
+    ('sales', 'OrderLine', 103, datetime(2023, 12, 31), True, None),
+]
+
+
+class ColumnarCatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.catalog = ColumnarCatalog.from_batches(COLUMNS, [ROWS[:2], ROWS[2:]])
+
+    def test_round_trips_rows(self):
+        self.assertEqual([tuple(row.as_dict().values()) for row in self.catalog], ROWS)
+        self.assertEqual(self.catalog.column('object_id').dtype, np.int8)
+        self.assertEqual(self.catalog.column('name').dtype, np.int32)
+
+    def test_row_attributes(self):
+        row = self.catalog[1]
+        self.assertEqual((row.name, row.col0, row['object_id'], row.history_table_id), ('Order', 'Sales', 102, 7))
+        self.assertIsNone(self.catalog[0].history_table_id)
+        with self.assertRaises(AttributeError):
+            row.missing
+
+    def test_rows_copy_and_pickle(self):
+        row = self.catalog[2]
+        self.assertEqual(copy.copy(row).name, 'OrderLine')
+        self.assertEqual(pickle.loads(pickle.dumps(row)).as_dict(), row.as_dict())
+
+    def test_filter(self):
+        self.assertEqual(list(self.catalog.filter(schema='SALES').values('name')), ['Order', 'OrderLine'])
+        self.assertEqual(list(self.catalog.filter(modified_after=datetime(2024, 1, 1)).values('object_id')),
+                         [101, 102])
+        self.assertEqual(list(self.catalog.filter(history_table_id=None).values('name')),
+                         ['Customer', 'OrderLine'])
+        self.assertEqual(len(self.catalog.filter(object_id=[101, 103], is_ms_shipped=True)), 1)
+
+    def test_batches_with_different_types(self):
+        catalog = ColumnarCatalog.from_batches(['a', 'b', 'c', 'd'], [
+            [(None, 1, 'x', None)],
+            [('p', 2.5, 'y', None)],
+            [('q', Decimal('3'), 3, None)],
+        ])
+        self.assertEqual(list(catalog.values('a')), [None, 'p', 'q'])
+        self.assertEqual(catalog.column('b').dtype, np.float64)
+        self.assertEqual(list(catalog.values('b')), [1.0, 2.5, 3.0])
+        self.assertEqual(list(catalog.values('c')), ['x', 'y', 3])
+        self.assertEqual(list(catalog.values('d')), [None, None, None])
+
+    def test_empty(self):
+        catalog = ColumnarCatalog.from_batches(COLUMNS, [])
+        self.assertEqual(len(catalog), 0)
+        self.assertEqual(len(catalog.filter(schema='dbo')), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+""" Record boundaries and the sequential and chunked quote rewriters """
+import tempfile
+import unittest
+from pathlib import Path
+
+from timsy_utils.timsy_csv.csv_chunked import count_records, header_end, quote_csv_chunked, record_boundaries
+from timsy_utils.timsy_csv.timsy_csv_misc import csv_add_quotes
+
+CSV_TEXT = 'id,note,amount\n' + ''.join(
+    f'{i},"line one\nline two, with ""quotes""",{i * 2}\n' if i % 7 == 0 else f'{i},plain {i},\n'
+    for i in range(300))
+
+
+class CsvChunkedTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = Path(temp_dir.name)
+        self.input = self.dir / 'input.csv'
+        self.input.write_text(CSV_TEXT)
+
+    def test_count_records_ignores_quoted_newlines(self):
+        self.assertEqual(count_records(str(self.input)), 301)
+        unterminated = self.dir / 'unterminated.csv'
+        unterminated.write_text('a,b\n1,2')
+        self.assertEqual(count_records(str(unterminated)), 2)
+
+    def test_boundaries_are_record_starts(self):
+        data = self.input.read_bytes()
+        start = header_end(str(self.input))
+        self.assertEqual(data[:start], b'id,note,amount\n')
+        boundaries = record_boundaries(str(self.input), chunk_size=97, start=start)
+        self.assertEqual((boundaries[0], boundaries[-1]), (start, len(data)))
+        self.assertGreater(len(boundaries), 10)
+        for boundary in boundaries[1:-1]:
+            self.assertEqual(data[boundary - 1:boundary], b'\n')
+            self.assertEqual(data[:boundary].count(b'"') % 2, 0)
+
+    def test_chunked_matches_sequential(self):
+        sequential, chunked = self.dir / 'sequential.csv', self.dir / 'chunked.csv'
+        self.assertEqual(csv_add_quotes(str(self.input), str(sequential)), 300)
+        reports = []
+        status = quote_csv_chunked(str(self.input), str(chunked), processes=2, chunk_size=200, encoding='utf-8',
+                                   progress=reports.append)
+        self.assertEqual(chunked.read_bytes(), sequential.read_bytes())
+        self.assertEqual((status.rows, status.bytes_done, status.fraction), (300, len(CSV_TEXT), 1.0))
+        self.assertEqual(reports[-1].chunks_done, status.chunks)
+        self.assertTrue(sequential.read_text().startswith('id,note,amount\n"0","line one\nline two'))
+
+    def test_csv_add_quotes_parallel_and_empty(self):
+        output = self.dir / 'output.csv'
+        self.assertEqual(csv_add_quotes(str(self.input), str(output), processes=2, chunk_size=500), 300)
+        empty = self.dir / 'empty.csv'
+        empty.write_text('')
+        self.assertEqual(csv_add_quotes(str(empty), str(output)), 0)
+        self.assertEqual(output.read_text(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
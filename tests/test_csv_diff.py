@@ -0,0 +1,86 @@
+""" CsvDiff: keyed comparison in memory, spilled to disk and across processes """
+import csv
+import tempfile
+import unittest
+from pathlib import Path
+
+from timsy_utils.timsy_csv.csv_diff import CsvDiff, diff_csv_files
+
+LEFT_ROWS = [['id', 'region', 'name', 'score', 'left_only']] + \
+            [[str(i), str(i % 3), f'name{i}', str(i * 10), 'x'] for i in range(200)] + \
+            [['5', '2', 'duplicate', '0', 'x']]
+RIGHT_ROWS = [['id', 'region', 'name', 'score', 'right_only']] + \
+             [[str(i), str(i % 3), f'name{i}', str(i * 10 + (i % 50 == 0)), 'y'] for i in range(10, 220)]
+
+
+class CsvDiffTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = Path(temp_dir.name)
+        self.left = self.write('left.csv', LEFT_ROWS)
+        self.right = self.write('right.csv', RIGHT_ROWS)
+
+    def write(self, name, rows):
+        path = self.dir / name
+        with open(path, 'w', newline='') as csv_file:
+            csv.writer(csv_file).writerows(rows)
+        return str(path)
+
+    def assert_expected(self, result):
+        self.assertEqual(sorted(int(row[0]) for row in result.removed), list(range(10)))
+        self.assertEqual(sorted(int(row[0]) for row in result.added), list(range(200, 220)))
+        self.assertEqual(sorted(change.key for change in result.changed), [('100',), ('150',), ('50',)])
+        self.assertEqual(result.changed[0].changes['score'][1], str(int(result.changed[0].key[0]) * 10 + 1))
+        self.assertEqual(result.unchanged, 187)
+        self.assertEqual(result.column_changes, {'score': 3})
+        self.assertEqual(result.duplicate_keys, [1, 0])
+        self.assertEqual((result.left_only_columns, result.right_only_columns), (['left_only'], ['right_only']))
+        self.assertEqual(result.compare_columns, ['region', 'name', 'score'])
+
+    def test_in_memory(self):
+        result = diff_csv_files(self.left, self.right, 'id', processes=1, batch_size=64)
+        self.assert_expected(result)
+        self.assertFalse(result.spilled)
+        self.assertTrue(result.has_differences)
+
+    def test_spills_past_memory_budget(self):
+        result = diff_csv_files(self.left, self.right, 'id', processes=1, batch_size=16, memory_budget=2048,
+                                partitions=8, spill_dir=str(self.dir))
+        self.assert_expected(result)
+        self.assertTrue(result.spilled)
+        self.assertEqual(list(self.dir.glob('csv_diff_*')), [])
+
+    def test_process_pool(self):
+        result = diff_csv_files(self.left, self.right, 'id', processes=2, partitions=4, batch_size=32)
+        self.assert_expected(result)
+        self.assertEqual((result.processes, result.partitions), (2, 4))
+
+    def test_composite_key_and_compare_columns(self):
+        result = CsvDiff(['region', 'id'], compare_columns=['name'], processes=1).compare(self.left, self.right)
+        self.assertEqual(result.changed, [])
+        self.assertEqual(result.columns, ['region', 'id', 'name'])
+        self.assertEqual(len(result.removed), 10)
+
+    def test_missing_key_column(self):
+        with self.assertRaises(KeyError):
+            diff_csv_files(self.left, self.right, 'left_only')
+
+    def test_identical_files(self):
+        result = diff_csv_files(self.left, self.left, 'id', processes=1)
+        self.assertFalse(result.has_differences)
+        self.assertEqual(result.duplicate_keys, [1, 1])
+
+    def test_write_report(self):
+        result = diff_csv_files(self.left, self.right, 'id', processes=1)
+        report_path = self.dir / 'report.csv'
+        result.write_report(str(report_path))
+        with open(report_path, newline='') as report:
+            rows = list(csv.reader(report))
+        self.assertEqual(rows[0], ['STATUS', 'id', 'COLUMN', 'LEFT', 'RIGHT'])
+        self.assertEqual(len(rows), 1 + 10 + 20 + 3)
+        self.assertIn(['CHANGED', '50', 'score', '500', '501'], rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
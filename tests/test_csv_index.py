@@ -0,0 +1,74 @@
+""" CsvOffsetIndex: checkpoints, paging, key lookups and rebuilding stale indexes """
+import csv
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from timsy_utils.timsy_csv.csv_index import CsvOffsetIndex, build_csv_index, index_path_for, record_offsets
+
+ROWS = [['id', 'group', 'note']] + [[str(i), f'g{i % 4}', 'multi\nline' if i % 5 == 0 else f'row {i}']
+                                   for i in range(57)]
+
+
+class CsvOffsetIndexTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = str(Path(temp_dir.name) / 'input.csv')
+        self.write(ROWS)
+
+    def write(self, rows):
+        with open(self.path, 'w', newline='') as csv_file:
+            csv.writer(csv_file, lineterminator='\n').writerows(rows)
+
+    def open_index(self, **kwargs):
+        index = CsvOffsetIndex.open(self.path, **kwargs)
+        self.addCleanup(index.close)
+        return index
+
+    def test_record_offsets_skip_quoted_newlines(self):
+        data = Path(self.path).read_bytes()
+        offsets = record_offsets(self.path, data.index(b'\n') + 1)
+        self.assertEqual(len(offsets), 57)
+        self.assertTrue(data[int(offsets[5]):].startswith(b'5,g1,"multi\nline"'))
+
+    def test_rows_and_pages(self):
+        index = self.open_index(step=10)
+        self.assertEqual((len(index), index.fieldnames), (57, ['id', 'group', 'note']))
+        self.assertEqual(index.row(25), ROWS[26])
+        self.assertEqual(index.row(-1), ROWS[-1])
+        self.assertEqual(index.page(8, 4), ROWS[9:13])
+        self.assertEqual(index.page(55, 10), ROWS[56:])
+        self.assertEqual([len(page) for page in index.iter_pages(20)], [20, 20, 17])
+        with self.assertRaises(IndexError):
+            index.row(57)
+
+    def test_find_by_key(self):
+        index = self.open_index(step=7, key_columns=['group', 'id'])
+        self.assertEqual(index.find('g2', '10'), [ROWS[11]])
+        self.assertEqual(index.find('g1', '10'), [])
+        group_index = self.open_index(step=7, key_columns='group', index_path=self.path + '.group.idx')
+        self.assertEqual(len(group_index.find('g0')), 15)
+        with self.assertRaises(ValueError):
+            group_index.find('g0', 'extra')
+
+    def test_open_rebuilds_stale_index(self):
+        self.open_index().close()
+        self.write(ROWS[:11])
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        index = self.open_index()
+        self.assertFalse(index.stale)
+        self.assertEqual(len(index), 10)
+
+    def test_index_without_keys_cannot_find(self):
+        build_csv_index(self.path)
+        with CsvOffsetIndex(self.path) as index:
+            self.assertEqual(index.index_path, index_path_for(self.path))
+            with self.assertRaises(ValueError):
+                index.find('1')
+
+
+if __name__ == '__main__':
+    unittest.main()
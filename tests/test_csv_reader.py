@@ -0,0 +1,62 @@
+""" CsvBatchReader batches as tuples, NumPy arrays and DataFrames """
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from timsy_utils.timsy_csv.csv_reader import CsvBatchReader, iter_csv_batches
+from timsy_utils.timsy_csv.timsy_csv_misc import get_csv_data
+
+CSV_TEXT = 'id,name,amount\n1,Ann,1.5\n2,"Bob, Jr",\n3,Cy\n4,Di,4,extra\n5,Ed,5\n'
+
+
+class CsvBatchReaderTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = str(Path(temp_dir.name) / 'input.csv')
+        Path(self.path).write_text(CSV_TEXT)
+
+    def test_tuple_batches_fit_ragged_rows(self):
+        batches = list(CsvBatchReader(self.path, batch_size=2).iter_tuples())
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(batches[1], [('3', 'Cy', ''), ('4', 'Di', '4')])
+
+    def test_column_projection(self):
+        reader = CsvBatchReader(self.path, columns=['amount', 0])
+        self.assertEqual(reader.columns, ['amount', 'id'])
+        self.assertEqual(next(reader.iter_rows()), ('1.5', '1'))
+        self.assertEqual(list(CsvBatchReader(self.path, columns=['name']).iter_rows())[1], ('Bob, Jr',))
+        with self.assertRaises(KeyError):
+            CsvBatchReader(self.path, columns=['missing'])
+        with self.assertRaises(IndexError):
+            CsvBatchReader(self.path, columns=[3])
+
+    def test_numpy_batches(self):
+        batch = next(CsvBatchReader(self.path, columns=['id', 'name']).iter_arrays({'id': 'i8'}))
+        self.assertEqual(batch.dtype['id'], np.int64)
+        self.assertEqual(list(batch['id']), [1, 2, 3, 4, 5])
+
+    def test_dataframes_match_get_csv_data(self):
+        frame = next(iter_csv_batches(self.path, output='pandas'))
+        _, rows = get_csv_data(self.path)
+        self.assertEqual(frame['amount'].tolist(), ['1.5', '', '', '4', '5'])
+        self.assertEqual(frame[['id', 'name']].to_dict('records'),
+                         [{'id': row['id'], 'name': row['name']} for row in rows])
+        typed = next(CsvBatchReader(self.path, columns=['amount']).iter_dataframes({'amount': 'float64'}))
+        self.assertTrue(np.isnan(typed['amount'][1]))
+
+    def test_empty_file_and_bad_arguments(self):
+        Path(self.path).write_text('')
+        reader = CsvBatchReader(self.path)
+        self.assertEqual((reader.fieldnames, list(reader.iter_tuples()), list(reader.iter_dataframes())),
+                         ([], [], []))
+        with self.assertRaises(ValueError):
+            CsvBatchReader(self.path, batch_size=0)
+        with self.assertRaises(ValueError):
+            iter_csv_batches(self.path, output='json')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+""" Typed CSV reading: inference, the schema cache and widening """
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from timsy_utils.timsy_csv.csv_typed import BOOL, DATE, FLOAT, INT, STR, SchemaCache, TypedCsvReader, \
+    default_schema_cache, infer_column, pattern_for, read_typed_csv
+
+CSV_TEXT = ('id,code,price,active,joined,name\n'
+            '1,007,1.5,yes,2024-01-05,Ann\n'
+            '2,010,,no,2024-02-29,Bob\n'
+            '3,123,3,Y,,\n')
+
+
+class InferColumnTest(unittest.TestCase):
+    def test_types(self):
+        cases = [(['1', '2', ''], INT, True), (['1.5', '2'], FLOAT, False), (['007', '12'], STR, False),
+                 (['yes', 'N'], BOOL, False), (['2024-01-05', '2023-12-31'], DATE, False), (['', ' '], STR, True),
+                 (['x', '1'], STR, False)]
+        for values, expected_type, nullable in cases:
+            with self.subTest(values=values):
+                spec = infer_column(pd.Series(values))
+                self.assertEqual((spec.type, spec.nullable), (expected_type, nullable))
+
+    def test_pattern_for(self):
+        self.assertEqual(pattern_for('/data/members_20240105_2.csv'), 'members_*_*.csv')
+
+
+class TypedCsvReaderTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = Path(temp_dir.name)
+
+    def write(self, name, text=CSV_TEXT):
+        path = self.dir / name
+        path.write_text(text)
+        return str(path)
+
+    def test_read_types(self):
+        frame = TypedCsvReader(SchemaCache()).read(self.write('members_1.csv'))
+        self.assertEqual(str(frame['id'].dtype), 'Int64')
+        self.assertEqual(list(frame['code']), ['007', '010', '123'])
+        self.assertTrue(np.isnan(frame['price'][1]))
+        self.assertEqual(list(frame['active']), [True, False, True])
+        self.assertEqual(frame['joined'][1], pd.Timestamp('2024-02-29'))
+        self.assertTrue(pd.isna(frame['joined'][2]))
+        self.assertEqual(frame['name'][2], '')
+
+    def test_cache_shared_by_pattern_and_persisted(self):
+        cache_path = str(self.dir / 'schemas.json')
+        cache = SchemaCache(cache_path)
+        reader = TypedCsvReader(cache)
+        reader.read(self.write('members_1.csv'))
+        reader.read(self.write('members_2.csv'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        reloaded = SchemaCache(cache_path)
+        self.assertEqual(reloaded.schemas['members_*.csv'].columns['id'].type, INT)
+
+    def test_changed_header_is_a_miss(self):
+        cache = SchemaCache()
+        reader = TypedCsvReader(cache)
+        reader.read(self.write('members_1.csv'))
+        reader.read(self.write('members_2.csv', 'id,other\n1,x\n'))
+        self.assertEqual(cache.misses, 2)
+
+    def test_values_past_sample_widen_column(self):
+        cache = SchemaCache()
+        path = self.write('wide_1.csv', 'id,amount\n1,5\n2,x\n')
+        frame = TypedCsvReader(cache, sample_rows=1).read(path)
+        self.assertEqual(list(frame['amount']), ['5', 'x'])
+        self.assertEqual(cache.schemas['wide_*.csv'].columns['amount'].type, STR)
+
+    def test_read_typed_csv_uses_default_cache(self):
+        path = self.write('default_cache_1.csv')
+        hits = default_schema_cache.hits
+        read_typed_csv(path)
+        read_typed_csv(path)
+        self.assertEqual(default_schema_cache.hits, hits + 1)
+
+    def test_batches_and_numpy(self):
+        reader = TypedCsvReader(SchemaCache())
+        path = self.write('members_1.csv')
+        self.assertEqual([len(batch) for batch in reader.iter_batches(path, batch_size=2)], [2, 1])
+        arrays = reader.read_numpy(path, columns=['id', 'price'])
+        self.assertEqual(arrays['id'].dtype, np.int64)
+        self.assertEqual(arrays['price'].dtype, np.float64)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+""" DailyFolderIndex: incremental refresh, persistence and queries """
+import os
+import tempfile
+import threading
+import unittest
+from datetime import date
+from pathlib import Path
+
+from timsy_utils.timsy_csv.daily_index import DailyFolderIndex, DateFolderEntry
+from timsy_utils.timsy_csv.timsy_csv_misc import list_available_dates
+
+
+class DailyFolderIndexTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.daily = Path(temp_dir.name) / 'daily'
+        self.write('2024-02-11', 'members_20240211.csv', 'id\n1\n2\n')
+        self.write('2024-02-12', 'members_20240212.csv', 'id\n1\n"2\n3"\n')
+        self.write('2024-02-12', 'orders_20240212.csv', 'id\n')
+        self.write('2024-02-12', 'notes.txt', 'not a csv')
+        (self.daily / 'empty').mkdir()
+
+    def write(self, folder, name, text):
+        path = self.daily / folder / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+        return path
+
+    def test_refresh_and_queries(self):
+        index = DailyFolderIndex(str(self.daily))
+        changes = index.refresh()
+        self.assertEqual(sorted(changes.added_dates), ['2024-02-11', '2024-02-12', 'empty'])
+        self.assertEqual(len(changes.changed_files), 3)
+        self.assertEqual(index.dates(), ['2024-02-11', '2024-02-12'])
+        self.assertEqual(index.latest(), ['2024-02-12'])
+        self.assertEqual([file.rows for file in index.files('2024-02-12')], [2, 0])
+        self.assertEqual(index.total_rows('2024-02-12'), 2)
+        self.assertEqual([(date_name, file.name) for date_name, file in index.find('MEMBERS_*')],
+                         [('2024-02-11', 'members_20240211.csv'), ('2024-02-12', 'members_20240212.csv')])
+        self.assertEqual(list_available_dates(index), {'2024-02-11', '2024-02-12'})
+        self.assertFalse(index.refresh())
+
+    def test_saved_index_is_reused(self):
+        DailyFolderIndex(str(self.daily)).refresh()
+        self.assertTrue(os.path.exists(str(self.daily) + '.index.json'))
+        reloaded = DailyFolderIndex(str(self.daily))
+        self.assertEqual(reloaded.dates(), ['2024-02-11', '2024-02-12'])
+        self.write('2024-02-13', 'members_20240213.csv', 'id\n1\n')
+        changes = reloaded.refresh()
+        self.assertEqual((changes.added_dates, changes.changed_files),
+                         (['2024-02-13'], [('2024-02-13', 'members_20240213.csv')]))
+
+    def test_deep_refresh_sees_rewritten_files(self):
+        index = DailyFolderIndex(str(self.daily), auto_save=False)
+        index.refresh()
+        path = self.write('2024-02-11', 'members_20240211.csv', 'id\n1\n2\n3\n')
+        folder = path.parent
+        stat = folder.stat()
+        os.utime(folder, ns=(stat.st_atime_ns, index.folders['2024-02-11'].mtime_ns))
+        self.assertFalse(index.refresh())
+        changes = index.refresh(deep=True)
+        self.assertEqual(changes.changed_files, [('2024-02-11', 'members_20240211.csv')])
+        self.assertEqual(index.total_rows('2024-02-11'), 3)
+        path.unlink()
+        changes = index.refresh()
+        self.assertEqual(changes.removed_files, [('2024-02-11', 'members_20240211.csv')])
+        self.assertEqual(index.dates(), ['2024-02-12'])
+
+    def test_watch_reports_changes(self):
+        index = DailyFolderIndex(str(self.daily), auto_save=False)
+        index.refresh()
+        seen = threading.Event()
+        index.watch(interval=0.02, on_change=lambda changes: seen.set())
+        self.addCleanup(index.stop_watching, 1)
+        self.write('2024-02-14', 'members_20240214.csv', 'id\n')
+        self.assertTrue(seen.wait(2))
+
+    def test_month_day_folder_dates(self):
+        mtime_ns = int(1707955200 * 1e9)  # 2024-02-15
+        self.assertEqual(DateFolderEntry('2-11', mtime_ns).sort_date, date(2024, 2, 11))
+        self.assertEqual(DateFolderEntry('12-30', mtime_ns).sort_date, date(2023, 12, 30))
+        self.assertEqual(DateFolderEntry('20240105', mtime_ns).sort_date, date(2024, 1, 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
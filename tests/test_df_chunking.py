@@ -0,0 +1,71 @@
+""" DtypePlan and iter_optimized_chunks: consistent dtypes across chunks and spilling """
+import importlib.util
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from timsy_utils.timsy_sql.df_chunking import DtypePlan, iter_optimized_chunks, optimize_dtypes, \
+    read_spilled_chunks, verify_spill_format
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+
+def chunks():
+    yield pd.DataFrame({'id': [1, 2, 3], 'price': [1.5, 2.5, 3.5], 'state': ['NY', 'NY', 'CA']})
+    yield pd.DataFrame({'id': [70_000, 5, 6], 'price': [1.0, 2.0, 3.0], 'state': ['TX', 'NY', 'CA']})
+    yield pd.DataFrame({'id': [7.0, np.nan, 9.0], 'price': [1.0, 2.0, 3.0], 'state': ['NY', None, 'CA']})
+
+
+class DtypePlanTest(unittest.TestCase):
+    def test_first_chunk_decides(self):
+        df = pd.DataFrame({'id': [1, 2, 3, 4], 'price': [1.5, 2.5, 3.5, 4.5], 'state': ['NY'] * 3 + ['CA'],
+                           'name': list('abcd')})
+        plan = DtypePlan.from_chunk(df, category_threshold=0.5, pinned_columns=['price'])
+        self.assertEqual(plan.dtypes['id'], np.int8)
+        self.assertEqual(list(plan.dtypes['state'].categories), ['NY', 'CA'])
+        self.assertNotIn('name', plan.dtypes)
+        self.assertNotIn('price', plan.dtypes)
+        self.assertEqual(optimize_dtypes(df.copy(), category_columns=['name'])['name'].dtype, 'category')
+
+    def test_later_chunks_widen_the_plan(self):
+        optimized = list(iter_optimized_chunks(chunks(), category_columns=['state']))
+        self.assertEqual([chunk['id'].dtype for chunk in optimized], [np.int8, np.int32, np.float64])
+        self.assertEqual(optimized[0]['price'].dtype, np.float32)
+        self.assertEqual(list(optimized[2]['state'].cat.categories), ['NY', 'CA', 'TX'])
+        combined = pd.concat(optimized, ignore_index=True)
+        self.assertEqual(combined['id'].iloc[3], 70_000)
+        self.assertTrue(pd.isna(combined['state'].iloc[7]))
+
+    def test_unknown_spill_format_fails_early(self):
+        with self.assertRaises(ValueError):
+            verify_spill_format('csv')
+        with self.assertRaises(ValueError):
+            iter_optimized_chunks(chunks(), spill_dir='unused', spill_format='csv')
+
+    @unittest.skipUnless(HAS_PYARROW, 'pyarrow is not installed')
+    def test_spilled_chunks_round_trip(self):
+        with tempfile.TemporaryDirectory() as spill_dir:
+            paths = list(iter_optimized_chunks(chunks(), category_columns=['state'], spill_dir=spill_dir,
+                                               spill_format='feather'))
+            self.assertEqual([path.name for path in paths],
+                             ['chunk_000000.feather', 'chunk_000001.feather', 'chunk_000002.feather'])
+            restored = list(read_spilled_chunks(paths, columns=['id']))
+            self.assertEqual(restored[1]['id'].tolist(), [70_000, 5, 6])
+
+    @unittest.skipIf(HAS_PYARROW, 'pyarrow is installed')
+    def test_missing_spill_engine_fails_before_reading(self):
+        read = []
+
+        def tracked_chunks():
+            read.append(True)
+            yield from chunks()
+
+        with self.assertRaises(ImportError):
+            iter_optimized_chunks(tracked_chunks(), spill_dir='unused', spill_format='feather')
+        self.assertEqual(read, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+""" JoinGraph planning, aliases and the plan cache """
+import unittest
+
+from timsy_utils.timsy_sql.join_planner import JoinGraph
+from timsy_utils.timsy_sql.sql_models.table_relationship import TableRelationship
+
+
+class JoinGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.graph = JoinGraph(max_cached_plans=2)
+        self.graph.add_join('Sales', 'Order', ['CustomerID'], 'dbo', 'Customer', ['ID'])
+        self.graph.add_join('Sales', 'OrderLine', ['OrderID'], 'Sales', 'Order', ['ID'])
+        self.graph.add_foreign_key_rows([(7, 'Sales', 'OrderLine', 'ProductID', 'Production', 'Product', 'ID')])
+
+    def test_plan_follows_cheapest_path(self):
+        plan = self.graph.plan(['Customer', 'Product'])
+        self.assertEqual(plan.tables, ['dbo.Customer', 'Sales.Order', 'Sales.OrderLine', 'Production.Product'])
+        self.assertEqual(plan.cost, 3.0)
+        self.assertTrue(plan.sql().startswith('FROM [dbo].[Customer]'))
+
+    def test_table_cost_avoids_bridge(self):
+        self.graph.add_join('dbo', 'Customer', ['FavouriteProductID'], 'Production', 'Product', ['ID'], cost=2.5)
+        self.assertEqual(len(self.graph.plan(['Customer', 'Product']).joins), 1)
+        self.graph.set_table_cost('Production.Product', 5)
+        self.assertEqual(self.graph.plan(['Customer', 'Product']).cost, 7.5)
+
+    def test_unknown_and_disconnected_tables(self):
+        with self.assertRaises(KeyError):
+            self.graph.plan(['Customer', 'Missing'])
+        self.graph.add_join('hr', 'Employee', ['ManagerID'], 'hr', 'Manager', ['ID'])
+        with self.assertRaises(ValueError):
+            self.graph.plan(['Customer', 'Employee'])
+
+    def test_relationship_aliases_are_defaults(self):
+        self.graph.add_relationship(TableRelationship(None, None, 'Sales', 'Sales', table_a='Order',
+                                                      table_b='Return', column_a='ID', column_b='OrderID',
+                                                      alias_a='o', alias_b='r'))
+        sql = self.graph.plan(['Order', 'Return']).sql()
+        self.assertIn('FROM [Sales].[Order] AS [o]', sql)
+        self.assertIn('ON [o].[ID] = [r].[OrderID]', sql)
+        self.assertIn('AS [ord]', self.graph.plan(['Order', 'Return'], aliases={'Order': 'ord'}).sql())
+        with self.assertRaises(ValueError):
+            self.graph.set_table_alias('Sales.Order', 'x')
+
+    def test_cache_is_bounded_and_returns_copies(self):
+        plan = self.graph.plan(['Customer', 'OrderLine'])
+        plan.tables.append('changed')
+        plan.joins.clear()
+        again = self.graph.plan(['Customer', 'OrderLine'])
+        self.assertEqual(again.tables, ['dbo.Customer', 'Sales.Order', 'Sales.OrderLine'])
+        self.assertEqual(len(again.joins), 2)
+        self.graph.plan(['Customer', 'Order'])
+        self.graph.plan(['Order', 'Product'])
+        self.assertEqual(self.graph.cache_size(), 2)
+        self.graph.add_join('dbo', 'Customer', ['RegionID'], 'dbo', 'Region', ['ID'])
+        self.assertEqual(self.graph.cache_size(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+""" QueryResultCache: table extraction, invalidation and the disk tier """
+import tempfile
+import unittest
+
+import pandas as pd
+
+from timsy_utils.timsy_sql.query_result_cache import UNKNOWN_TABLES, QueryResultCache, make_cache_key, \
+    referenced_tables
+
+
+class ReferencedTablesTest(unittest.TestCase):
+    def test_from_and_join(self):
+        self.assertEqual(referenced_tables('SELECT * FROM [Production].[Product] p '
+                                           'JOIN Sales.SalesOrderDetail d ON d.ProductID = p.ProductID'),
+                         {'production.product', 'sales.salesorderdetail'})
+
+    def test_comma_separated_from_list(self):
+        self.assertEqual(referenced_tables('SELECT * FROM a x, dbo.b AS y, c WHERE x.id = y.id'),
+                         {'a', 'dbo.b', 'c'})
+
+    def test_table_hints_in_from_list(self):
+        self.assertEqual(referenced_tables('SELECT * FROM a WITH (NOLOCK), b'), {'a', 'b'})
+        self.assertEqual(referenced_tables('SELECT * FROM a x WITH (NOLOCK, INDEX(ix_a)), b y'), {'a', 'b'})
+
+    def test_unsure_queries_are_unknown(self):
+        for sql_query in ('SELECT * FROM a CROSS APPLY dbo.f(a.id) f',
+                          'SELECT * FROM a OUTER APPLY (SELECT TOP 1 * FROM b WHERE b.id = a.id) b',
+                          'SELECT * FROM a, (SELECT id FROM b) d, c',
+                          'SELECT * FROM (SELECT id FROM b) d',
+                          'SELECT * FROM dbo.f(1)',
+                          'EXEC dbo.refresh',
+                          'SELECT 1'):
+            with self.subTest(sql_query=sql_query):
+                self.assertEqual(referenced_tables(sql_query), {UNKNOWN_TABLES})
+
+
+class QueryResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.frame = pd.DataFrame({'id': [1, 2], 'name': ['a', 'b']})
+
+    def load(self, cache, sql_query, frame=None):
+        return cache.get_or_load('server', 'db', sql_query, None, lambda: self.frame if frame is None else frame)
+
+    def test_qualified_invalidation_drops_unqualified_entries(self):
+        for table_name in ('dbo.Product', 'Production.Product', 'db.Production.Product', 'product'):
+            with self.subTest(table_name=table_name):
+                cache = QueryResultCache()
+                self.load(cache, 'SELECT * FROM Product')
+                self.assertEqual(cache.invalidate_table(table_name), 1)
+                self.assertEqual(cache.keys(), [])
+
+    def test_invalidation_keeps_other_schemas(self):
+        cache = QueryResultCache()
+        self.load(cache, 'SELECT * FROM Sales.Product')
+        self.assertEqual(cache.invalidate_table('Production.Product'), 0)
+        self.assertEqual(cache.invalidate_table('Product'), 1)
+
+    def test_unknown_entries_dropped_by_any_invalidation(self):
+        cache = QueryResultCache()
+        self.load(cache, 'EXEC dbo.report')
+        self.assertEqual(cache.invalidate_table('anything'), 1)
+
+    def test_get_returns_copies(self):
+        cache = QueryResultCache()
+        self.load(cache, 'SELECT * FROM a')
+        key = make_cache_key('server', 'db', 'SELECT * FROM a')
+        frame = cache.get(key)
+        frame.loc[0, 'name'] = 'changed'
+        self.assertEqual(cache.get(key).loc[0, 'name'], 'a')
+
+    def test_disk_tier_survives_restart(self):
+        with tempfile.TemporaryDirectory() as disk_dir:
+            cache = QueryResultCache(disk_dir=disk_dir)
+            self.load(cache, 'SELECT * FROM a')
+            key = make_cache_key('server', 'db', 'SELECT * FROM a')
+            reopened = QueryResultCache(disk_dir=disk_dir)
+            pd.testing.assert_frame_equal(reopened.get(key), self.frame)
+            stats = reopened.stats()
+            self.assertEqual((stats.disk_hits, stats.memory_entries), (1, 1))
+            self.assertEqual(reopened.invalidate_table('a'), 1)
+            self.assertIsNone(QueryResultCache(disk_dir=disk_dir).get(key))
+
+    def test_memory_budget_evicts_to_disk(self):
+        with tempfile.TemporaryDirectory() as disk_dir:
+            cache = QueryResultCache(max_memory_bytes=1, disk_dir=disk_dir)
+            self.load(cache, 'SELECT * FROM a')
+            key = make_cache_key('server', 'db', 'SELECT * FROM a')
+            self.assertEqual(cache.stats().memory_entries, 0)
+            pd.testing.assert_frame_equal(cache.get(key), self.frame)
+
+
+if __name__ == '__main__':
+    unittest.main()
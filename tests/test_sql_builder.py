@@ -0,0 +1,83 @@
+""" SqlStatement and SqlWhereClause """
+import unittest
+
+from timsy_utils.timsy_sql.sql_builder import OrderByEnum, SqlStatement, SqlWhereClause, \
+    compile_simple_sql_select_statement
+
+
+def statement() -> SqlStatement:
+    return SqlStatement(None, 'db', 'dbo', 'Orders', ['id', 'status'])
+
+
+class SqlWhereClauseTest(unittest.TestCase):
+    def test_in_list_rendering_and_params(self):
+        values = ['a', "o'b"]
+        clause = SqlWhereClause('status', values, 'IN')
+        values.append('c')
+        self.assertEqual(str(clause), "status IN ('a', 'o''b')")
+        self.assertEqual(clause.params, ('a', "o'b"))
+
+    def test_in_rejects_strings_and_empty_lists(self):
+        with self.assertRaises(TypeError):
+            SqlWhereClause('status', 'abc', 'IN')
+        with self.assertRaises(ValueError):
+            SqlWhereClause('status', [], 'NOT IN')
+
+    def test_clauses_are_immutable(self):
+        clause = SqlWhereClause('id', 1)
+        with self.assertRaises(AttributeError):
+            clause.value = 2
+        self.assertEqual(clause.with_value(2).value, 2)
+        self.assertEqual(clause.value, 1)
+        with self.assertRaises(TypeError):
+            clause.with_value('2')
+
+
+class SqlStatementTest(unittest.TestCase):
+    def test_builders_return_new_statements(self):
+        base = statement()
+        filtered = base.add_where_clause('id', 5, '>')
+        self.assertIsNone(base.where_clause)
+        self.assertIn('WHERE id > 5', filtered.build_sql())
+        with self.assertRaises(AttributeError):
+            base.top = 10
+
+    def test_copies_do_not_share_values(self):
+        first = statement().add_where_clause('id', 5)
+        second = first.with_where_value(0, 6)
+        self.assertEqual((first.compile().params, second.compile().params), ((5,), (6,)))
+
+    def test_top_and_offset_fetch_replace_each_other(self):
+        ordered = statement().add_order_by('id')
+        top_last = ordered.set_offset_fetch(20, 10).set_top(5)
+        self.assertEqual((top_last.top, top_last.offset), (5, None))
+        self.assertNotIn('OFFSET', top_last.build_sql())
+        offset_last = ordered.set_top(5).set_offset_fetch(20, 10)
+        self.assertNotIn('TOP', offset_last.build_sql())
+        self.assertEqual(offset_last.compile().params, (20, 10))
+
+    def test_offset_fetch_needs_order_by(self):
+        with self.assertRaises(ValueError):
+            statement().set_offset_fetch(0, 10).compile()
+
+    def test_compiled_sql_is_shared_per_shape(self):
+        first = statement().add_where_clause('id', 1).compile()
+        second = statement().add_where_clause('id', 2).compile()
+        self.assertIs(first.sql, second.sql)
+        self.assertEqual(second.bind(3).params, (3,))
+
+    def test_keyset_page(self):
+        page = statement().set_keyset(['status', 'id'], 50, after=('open', 10))
+        compiled = page.compile()
+        self.assertIn('ORDER BY status ASC, id ASC', compiled.sql)
+        self.assertEqual(compiled.params, (50, 'open', 'open', 'open', 10))
+
+    def test_compile_simple_statement(self):
+        compiled = compile_simple_sql_select_statement(['id'], 'Orders', {'status': 'open'}, order_by='id',
+                                                       order_direction=OrderByEnum.DESC, top=3)
+        self.assertEqual(compiled.params, (3, 'open'))
+        self.assertTrue(compiled.sql.endswith('ORDER BY id DESC'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+""" bulk_load against sqlite: DataFrames, CSV files, tuples and staged merges """
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from timsy_utils.timsy_sql.sql_bulk_load import normalize_bulk_data, sqlite_bulk_load
+
+
+class SqliteBulkLoadTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = Path(temp_dir.name)
+        self.db_path = self.dir / 'bulk.db'
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('CREATE TABLE product (id INTEGER PRIMARY KEY, name TEXT, price REAL)')
+
+    def rows(self):
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute('SELECT id, name, price FROM product ORDER BY id').fetchall()
+
+    def test_dataframe_in_batches(self):
+        df = pd.DataFrame({'id': range(5), 'name': list('abcde'), 'price': [1.0, None, 3.0, 4.0, 5.0]})
+        stats = sqlite_bulk_load(self.db_path, 'product', df, batch_size=2)
+        self.assertEqual((stats.rows, len(stats.batches)), (5, 3))
+        self.assertEqual(self.rows()[1], (1, 'b', None))
+
+    def test_csv_file_with_column_subset(self):
+        csv_path = self.dir / 'product.csv'
+        csv_path.write_text('name,id,price\nx,1,2.5\ny,2,\n')
+        sqlite_bulk_load(self.db_path, 'product', csv_path, columns=['id', 'name'])
+        self.assertEqual(self.rows(), [(1, 'x', None), (2, 'y', None)])
+
+    def test_tuples_need_columns(self):
+        with self.assertRaises(ValueError):
+            normalize_bulk_data([(1, 'a')])
+        sqlite_bulk_load(self.db_path, 'product', [(1, 'a', 1.5)], columns=['id', 'name', 'price'])
+        self.assertEqual(self.rows(), [(1, 'a', 1.5)])
+
+    def test_merge_updates_and_inserts(self):
+        sqlite_bulk_load(self.db_path, 'product', [(1, 'a', 1.0), (2, 'b', 2.0)], columns=['id', 'name', 'price'])
+        stats = sqlite_bulk_load(self.db_path, 'product', [(2, 'B', 20.0), (3, 'c', 3.0)],
+                                 columns=['id', 'name', 'price'], merge_keys=['id'])
+        self.assertIsNotNone(stats.merge_seconds)
+        self.assertEqual(self.rows(), [(1, 'a', 1.0), (2, 'B', 20.0), (3, 'c', 3.0)])
+
+    def test_empty_csv_raises(self):
+        csv_path = self.dir / 'empty.csv'
+        csv_path.write_text('')
+        with self.assertRaises(ValueError):
+            normalize_bulk_data(csv_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
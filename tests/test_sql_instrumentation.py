@@ -0,0 +1,84 @@
+""" Statement timing through InstrumentedCursor and instrument_engine """
+import sqlite3
+import unittest
+
+from sqlalchemy import create_engine, text
+
+from timsy_utils.timsy_sql.sql_instrumentation import Histogram, SqlMetricsRegistry, instrument_engine, \
+    InstrumentedConnection, metrics, normalize_sql
+
+
+class NormalizeSqlTest(unittest.TestCase):
+    def test_literals_and_in_lists(self):
+        self.assertEqual(normalize_sql("SELECT * FROM t -- note\nWHERE a = 'x' AND b IN (1, 2, 3) AND c = 1.5"),
+                         'SELECT * FROM t WHERE a = ? AND b IN (?...) AND c = ?')
+
+
+class HistogramTest(unittest.TestCase):
+    def test_percentile_is_bucket_upper_bound(self):
+        histogram = Histogram((1, 10, 100))
+        for value in (0.5, 5, 5, 50):
+            histogram.observe(value)
+        self.assertEqual((histogram.percentile(0.5), histogram.percentile(1.0)), (10, 100))
+        self.assertEqual((histogram.count, histogram.max_ms), (4, 50))
+
+
+class InstrumentedConnectionTest(unittest.TestCase):
+    def test_records_rows_bytes_and_connect_time(self):
+        registry = SqlMetricsRegistry(slow_query_threshold_ms=None, measure_bytes=True)
+        raw = sqlite3.connect(':memory:')
+        self.addCleanup(raw.close)
+        conn = InstrumentedConnection(raw, registry, connect_seconds=0.25)
+        cursor = conn.cursor()
+        cursor.execute("SELECT 'abc' UNION ALL SELECT 'de'")
+        self.assertEqual(cursor.fetchall(), [('abc',), ('de',)])
+        cursor.close()
+        [stats] = registry.snapshot()
+        self.assertEqual((stats.rows, stats.bytes), (2, 5))
+        self.assertGreaterEqual(stats.total.max_ms, 250)
+
+    def test_attributes_are_set_on_the_driver_connection(self):
+        raw = sqlite3.connect(':memory:')
+        self.addCleanup(raw.close)
+        InstrumentedConnection(raw).isolation_level = None
+        self.assertIsNone(raw.isolation_level)
+
+
+class InstrumentEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.measure_bytes = metrics.measure_bytes
+        metrics.reset()
+        metrics.measure_bytes = True
+        self.addCleanup(setattr, metrics, 'measure_bytes', self.measure_bytes)
+        self.engine = create_engine('sqlite://')
+        instrument_engine(self.engine)
+        self.addCleanup(self.engine.dispose)
+
+    def stats_for(self, shape):
+        return next(stats for stats in metrics.snapshot() if stats.shape == shape)
+
+    def test_select_records_fetch_rows_bytes_and_connect(self):
+        with self.engine.connect() as conn:
+            conn.execute(text("CREATE TABLE t (name TEXT)"))
+            conn.execute(text("INSERT INTO t VALUES ('abc'), ('de'), ('f')"))
+            self.assertEqual(len(conn.execute(text('SELECT name FROM t')).fetchall()), 3)
+        stats = self.stats_for('SELECT name FROM t')
+        self.assertEqual((stats.total.count, stats.rows, stats.bytes), (1, 3, 6))
+        self.assertEqual(stats.fetch.count, 1)
+        self.assertEqual(self.stats_for('INSERT INTO t VALUES (?), (?), (?)').rows, 3)
+        self.assertEqual(metrics.connect.count, 1)
+
+    def test_failed_statement_is_recorded(self):
+        with self.engine.connect() as conn:
+            with self.assertRaises(Exception):
+                conn.execute(text('SELECT * FROM missing'))
+            conn.execute(text('SELECT 1'))
+        self.assertEqual(self.stats_for('SELECT * FROM missing').total.count, 1)
+
+    def test_autocommit_isolation_level(self):
+        with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            self.assertEqual(conn.execute(text('SELECT 1')).scalar(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
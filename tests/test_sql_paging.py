@@ -0,0 +1,96 @@
+""" PageIterator over sqlite, with TOP and OFFSET/FETCH rewritten to LIMIT """
+import re
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from timsy_utils.timsy_sql.sql_builder import SqlStatement
+from timsy_utils.timsy_sql.sql_paging import PageIterator
+from timsy_utils.timsy_sql.sql_pool import SqlConnectionPool
+
+_TOP = re.compile(r'SELECT TOP\(\?\)')
+_OFFSET_FETCH = re.compile(r'OFFSET \? ROWS FETCH NEXT \? ROWS ONLY')
+
+
+class TSqlCursor:
+    """ Runs the paging statements SqlStatement compiles for SQL Server on a sqlite cursor. """
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, sql, params=()):
+        params = tuple(params)
+        if _TOP.search(sql):
+            sql, params = _TOP.sub('SELECT', sql) + ' LIMIT ?', params[1:] + params[:1]
+        elif _OFFSET_FETCH.search(sql):
+            sql, params = _OFFSET_FETCH.sub('LIMIT ? OFFSET ?', sql), params[:-2] + (params[-1], params[-2])
+        return self._cursor.execute(sql, params)
+
+
+class TSqlConnection:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self):
+        return TSqlCursor(self._conn.cursor())
+
+
+class PageIteratorTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        path = str(Path(temp_dir.name) / 'paging.db')
+        with sqlite3.connect(path) as conn:
+            conn.execute('CREATE TABLE Orders (id INTEGER PRIMARY KEY, status TEXT)')
+            conn.executemany('INSERT INTO Orders VALUES (?, ?)', [(i, 'open' if i % 2 else 'closed')
+                                                                 for i in range(1, 24)])
+        self.pool = SqlConnectionPool('sqlite', path, 'no', max_size=2,
+                                      connect_func=lambda server, database, trusted: TSqlConnection(database))
+        self.addCleanup(self.pool.close)
+        self.statement = SqlStatement(None, 'db', 'dbo', 'Orders', ['id', 'status'])
+
+    def test_keyset_pages(self):
+        pages = list(PageIterator(self.pool, self.statement, 10, key_columns='id'))
+        self.assertEqual([len(page.rows) for page in pages], [10, 10, 3])
+        self.assertEqual([page.last_key for page in pages], [(10,), (20,), (23,)])
+        self.assertEqual([page.number for page in pages], [0, 1, 2])
+
+    def test_keyset_with_filter_and_start(self):
+        statement = self.statement.add_where_clause('status', 'open')
+        ids = [row[0] for row in PageIterator(self.pool, statement, 4, key_columns=['id'], after=[10],
+                                             prefetch=False).rows()]
+        self.assertEqual(ids, [11, 13, 15, 17, 19, 21, 23])
+
+    def test_offset_fetch_pages(self):
+        statement = self.statement.add_order_by('id')
+        pages = list(PageIterator(self.pool, statement, 5, prefetch=False, start_page=1, max_pages=2))
+        self.assertEqual([[row[0] for row in page.rows] for page in pages],
+                         [[6, 7, 8, 9, 10], [11, 12, 13, 14, 15]])
+
+    def test_exact_multiple_ends_on_empty_page(self):
+        pages = list(PageIterator(self.pool, self.statement, 23, key_columns='id'))
+        self.assertEqual([len(page.rows) for page in pages], [23])
+        self.assertEqual(self.pool.stats().in_use_connections, 0)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            PageIterator(self.pool, self.statement, 10)
+        with self.assertRaises(ValueError):
+            PageIterator(self.pool, self.statement, 0, key_columns='id')
+        with self.assertRaises(ValueError):
+            list(PageIterator(self.pool, SqlStatement(None, 'db', 'dbo', 'Orders', ['status']), 5,
+                              key_columns='id', prefetch=False))
+
+    def test_compile_page(self):
+        compiled = PageIterator(self.pool, self.statement.add_order_by('id'), 10).compile_page(3)
+        self.assertEqual(compiled.params, (30, 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+""" SqlConnectionPool against a fake DBAPI driver passed as connect_func """
+import threading
+import time
+import unittest
+
+from timsy_utils.timsy_sql.sql_pool import SqlConnectionPool
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query):
+        self.conn.queries.append(query)
+        if self.conn.broken:
+            raise ConnectionError('connection is broken')
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.queries = []
+        self.broken = False
+        self.closed = False
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDriver:
+    def __init__(self):
+        self.connections = []
+
+    def connect(self, server, database, trusted_connection):
+        conn = FakeConnection()
+        self.connections.append(conn)
+        return conn
+
+
+class SqlConnectionPoolTest(unittest.TestCase):
+    def make_pool(self, **kwargs):
+        self.driver = FakeDriver()
+        pool = SqlConnectionPool('server', 'database', connect_func=self.driver.connect, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_borrow_and_release_reuses_connection(self):
+        pool = self.make_pool()
+        conn = pool.borrow()
+        pool.release(conn)
+        self.assertIs(pool.borrow(), conn)
+        self.assertEqual(len(self.driver.connections), 1)
+        self.assertEqual(conn.rollbacks, 1)
+        stats = pool.stats()
+        self.assertEqual((stats.borrows, stats.hits, stats.misses, stats.in_use_connections), (2, 1, 1, 1))
+
+    def test_release_unknown_connection_raises(self):
+        pool = self.make_pool()
+        with self.assertRaises(ValueError):
+            pool.release(FakeConnection())
+
+    def test_discard_closes_connection(self):
+        pool = self.make_pool()
+        conn = pool.borrow()
+        pool.release(conn, discard=True)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats().live_connections, 0)
+
+    def test_max_size_blocks_until_release(self):
+        pool = self.make_pool(max_size=2, borrow_timeout=5)
+        first, second = pool.borrow(), pool.borrow()
+        borrowed = []
+        waiter = threading.Thread(target=lambda: borrowed.append(pool.borrow()))
+        waiter.start()
+        time.sleep(0.05)
+        self.assertEqual(borrowed, [])
+        pool.release(first)
+        waiter.join(1)
+        self.assertEqual(borrowed, [first])
+        self.assertEqual(len(self.driver.connections), 2)
+        pool.release(second)
+        pool.release(first)
+
+    def test_max_size_times_out(self):
+        pool = self.make_pool(max_size=1, borrow_timeout=0.05)
+        conn = pool.borrow()
+        with self.assertRaises(TimeoutError):
+            pool.borrow()
+        pool.release(conn)
+
+    def test_idle_eviction_keeps_min_size(self):
+        pool = self.make_pool(min_size=1, max_size=3, idle_timeout=0.05)
+        conns = [pool.borrow() for _ in range(3)]
+        for conn in conns:
+            pool.release(conn)
+        time.sleep(0.1)
+        pool.release(pool.borrow())
+        stats = pool.stats()
+        self.assertEqual(stats.idle_evictions, 2)
+        self.assertEqual(stats.live_connections, 1)
+        self.assertEqual(sum(conn.closed for conn in conns), 2)
+
+    def test_health_check_only_after_idle_threshold(self):
+        pool = self.make_pool(health_check_after=0.05)
+        conn = pool.borrow()
+        pool.release(conn)
+        self.assertIs(pool.borrow(), conn)
+        self.assertEqual(conn.queries, [])
+        pool.release(conn)
+        time.sleep(0.1)
+        self.assertIs(pool.borrow(), conn)
+        self.assertEqual(conn.queries, ['SELECT 1'])
+        pool.release(conn)
+
+    def test_failed_health_check_replaces_connection(self):
+        pool = self.make_pool(health_check_after=0)
+        conn = pool.borrow()
+        pool.release(conn)
+        conn.broken = True
+        replacement = pool.borrow()
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats().health_check_failures, 1)
+        pool.release(replacement)
+
+    def test_close_wakes_waiting_borrower(self):
+        pool = self.make_pool(max_size=1, borrow_timeout=5)
+        conn = pool.borrow()
+        errors = []
+
+        def wait_for_connection():
+            try:
+                pool.borrow()
+            except RuntimeError as e:
+                errors.append(e)
+
+        waiter = threading.Thread(target=wait_for_connection)
+        waiter.start()
+        time.sleep(0.05)
+        pool.close()
+        waiter.join(1)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(len(self.driver.connections), 1)
+        pool.release(conn)
+        self.assertTrue(conn.closed)
+
+    def test_closed_pool_refuses_borrow(self):
+        pool = self.make_pool()
+        pool.release(pool.borrow())
+        pool.close()
+        self.assertTrue(self.driver.connections[0].closed)
+        with self.assertRaises(RuntimeError):
+            pool.borrow()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+""" GO batch splitting and SqlScriptRunner over a sqlite stand-in pool """
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from timsy_utils.timsy_sql.async_sql import sqlite_stand_in_pool
+from timsy_utils.timsy_sql.sql_script_runner import SqlBatch, SqlScriptRunner, load_batches, split_batches
+
+
+class FakeMultiSetCursor:
+    """ Cursor whose batch returns an update count, then a result set, then another update count. """
+    def __init__(self):
+        self.sets = [(2, None, []), (-1, [('id',)], [(1,), (2,)]), (3, None, [])]
+
+    def execute(self, sql):
+        self.position = 0
+
+    @property
+    def rowcount(self):
+        return self.sets[self.position][0]
+
+    @property
+    def description(self):
+        return self.sets[self.position][1]
+
+    def fetchall(self):
+        return self.sets[self.position][2]
+
+    def nextset(self):
+        self.position += 1
+        return self.position < len(self.sets)
+
+
+class SplitBatchesTest(unittest.TestCase):
+    def test_go_lines(self):
+        batches = split_batches('CREATE TABLE a (id INT)\nGO\n\nGO\ngo 3 -- repeat\nINSERT INTO a VALUES (1)\n'
+                                'GO 2\nSELECT * FROM a -- GO here is not a separator')
+        self.assertEqual([(batch.sql, batch.repeat) for batch in batches],
+                         [('CREATE TABLE a (id INT)', 1), ('INSERT INTO a VALUES (1)', 2),
+                          ('SELECT * FROM a -- GO here is not a separator', 1)])
+        self.assertEqual([batch.index for batch in batches], [0, 1, 2])
+
+    def test_use_marks_database_change(self):
+        self.assertTrue(SqlBatch(0, 'USE other;').changes_database)
+        self.assertFalse(SqlBatch(0, 'SELECT used FROM a').changes_database)
+
+
+class SqlScriptRunnerTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = Path(temp_dir.name)
+        self.db_path = self.dir / 'scripts.db'
+        self.pool = sqlite_stand_in_pool(self.db_path, max_size=2)
+        self.addCleanup(self.pool.close)
+        self.runner = SqlScriptRunner(self.pool, keep_rows=True)
+
+    def script(self, name, sql):
+        path = self.dir / name
+        path.write_text(sql)
+        return path
+
+    def test_runs_batches_and_commits(self):
+        result = self.runner.run_script(self.script('a.sql', 'CREATE TABLE a (id INTEGER)\nGO\n'
+                                                               'INSERT INTO a VALUES (1)\nGO 3\nSELECT id FROM a'))
+        self.assertTrue(result.ok)
+        self.assertEqual(result.batches[1].rowcount, 3)
+        self.assertEqual((result.batches[2].rows_returned, len(result.batches[2].rows[0])), (3, 3))
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM a').fetchone(), (3,))
+
+    def test_error_rolls_back_and_stops(self):
+        self.runner.run_script(self.script('a.sql', 'CREATE TABLE a (id INTEGER)'))
+        bad = self.script('b.sql', 'INSERT INTO a VALUES (1)\nGO\nINSERT INTO missing VALUES (1)\nGO\nSELECT 1')
+        after = self.script('c.sql', 'INSERT INTO a VALUES (2)')
+        results = self.runner.run_scripts([bad, after])
+        self.assertEqual(len(results), 1)
+        self.assertFalse(results[0].ok)
+        self.assertEqual(len(results[0].batches), 2)
+        self.assertIn('OperationalError', results[0].batches[1].error)
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM a').fetchone(), (0,))
+
+    def test_groups_run_in_order(self):
+        setup = self.script('0_setup.sql', 'CREATE TABLE a (id INTEGER)\nGO\nCREATE TABLE b (id INTEGER)')
+        fill_a = self.script('1_a.sql', 'INSERT INTO a VALUES (1)')
+        fill_b = self.script('1_b.sql', 'INSERT INTO b VALUES (1)')
+        results = self.runner.run_groups([[setup], [fill_a, fill_b]])
+        self.assertEqual([result.script for result in results], [setup, fill_a, fill_b])
+        self.assertTrue(all(result.ok for result in results))
+
+    def test_rowcount_sums_every_result_set(self):
+        result = self.runner._run_batch(FakeMultiSetCursor(), 'multi.sql', SqlBatch(0, 'EXEC multi', repeat=2))
+        self.assertEqual((result.rowcount, result.rows_returned), (10, 4))
+
+    def test_load_batches_reparses_changed_file(self):
+        path = self.script('a.sql', 'SELECT 1')
+        self.assertIs(load_batches(path), load_batches(path))
+        path.write_text('SELECT 1\nGO\nSELECT 2')
+        self.assertEqual(len(load_batches(path)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()